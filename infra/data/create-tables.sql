@@ -45,4 +45,36 @@ CREATE TABLE public.orders
     brand character varying(50) COLLATE pg_catalog."default",
     product_description text COLLATE pg_catalog."default",
     return_status BOOLEAN DEFAULT FALSE
-);
\ No newline at end of file
+);
+-- To partition orders by month instead, end the statement above with
+--     ) PARTITION BY RANGE (order_date);
+-- create one partition per month plus a default partition, e.g.
+--     CREATE TABLE public.orders_p2024_01 PARTITION OF public.orders FOR VALUES FROM ('2024-01-01') TO ('2024-02-01');
+--     CREATE TABLE public.orders_default PARTITION OF public.orders DEFAULT;
+-- and use PRIMARY KEY (id, order_date) and foreign keys without NOT VALID / VALIDATE below.
+-- data_prep_python/partition_maintenance.py keeps the partitions up to date.
+
+-- Primary keys, foreign keys and query-path indexes.
+-- For large initial loads, load the data first and run this section afterwards,
+-- so the rows are indexed and checked once instead of one at a time.
+ALTER TABLE public.products ADD CONSTRAINT products_pkey PRIMARY KEY (id);
+ALTER TABLE public.customers ADD CONSTRAINT customers_pkey PRIMARY KEY (id);
+ALTER TABLE public.orders ADD CONSTRAINT orders_pkey PRIMARY KEY (id);
+
+CREATE INDEX IF NOT EXISTS orders_customer_id_idx ON public.orders USING btree (customer_id);
+CREATE INDEX IF NOT EXISTS orders_product_id_idx ON public.orders USING btree (product_id);
+CREATE INDEX IF NOT EXISTS products_category_brand_idx ON public.products USING btree (category, brand);
+CREATE INDEX IF NOT EXISTS orders_order_date_brin_idx ON public.orders USING brin (order_date);
+
+ALTER TABLE public.orders ADD CONSTRAINT orders_customer_id_fkey FOREIGN KEY (customer_id) REFERENCES public.customers (id) NOT VALID;
+ALTER TABLE public.orders VALIDATE CONSTRAINT orders_customer_id_fkey;
+ALTER TABLE public.orders ADD CONSTRAINT orders_product_id_fkey FOREIGN KEY (product_id) REFERENCES public.products (id) NOT VALID;
+ALTER TABLE public.orders VALIDATE CONSTRAINT orders_product_id_fkey;
+
+-- Full-text search over products (data_prep_python/hybrid_query.py)
+ALTER TABLE public.products ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(product_name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(brand, '') || ' ' || coalesce(category, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(product_description, '')), 'C')
+) STORED;
+CREATE INDEX IF NOT EXISTS products_search_tsv_idx ON public.products USING gin (search_tsv);
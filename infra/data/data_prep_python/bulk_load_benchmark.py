@@ -0,0 +1,110 @@
+"""
+Benchmarks the bulk-load strategies on synthetic products, customers and orders.
+
+Generates the data sets with generate_dataset.py (kept under --data-dir and reused by later runs
+with the same row counts and seed), loads every file with every --strategy into separate
+load_benchmark_<table> tables (the real tables are not touched), and reports rows/sec, client CPU,
+peak RSS and WAL bytes per run, plus each strategy's speed relative to the fastest one.
+--output writes the results as JSON; --baseline compares against an earlier JSON file and exits
+with status 1 when a strategy got more than --tolerance slower. The connection comes from the
+same options and PG* environment variables as table_loader.py; use a local, otherwise idle server.
+
+Examples:
+    python bulk_load_benchmark.py --rows 1000 10000 100000
+    python bulk_load_benchmark.py --rows 1000000 --tables orders --strategy execute_values copy binary_copy copy_csv --output load.json
+    python bulk_load_benchmark.py --rows 1000000 --tables orders --baseline load.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from load_benchmark import find_regressions, load_strategies, run_benchmark
+from generate_dataset import generate_dataset
+from table_loader import connection_options
+
+logger = logging.getLogger(__name__)
+
+benchmark_tables = ["products", "customers", "orders"]
+
+def prepare_datasets(data_dir, sizes, tables, seed):
+    """
+    Generates (or reuses) one data set per size, with that many rows in each benchmarked table
+    and at most 1000 rows in the others. Returns [{table: (CSV path, rows)}].
+    """
+    datasets = []
+    for size in sizes:
+        counts = {table: size if table in tables else min(size, 1000) for table in benchmark_tables}
+        # The counts depend on --tables, so they all go into the name of the reused directory
+        output_dir = os.path.join(data_dir, "{}_seed_{}".format(
+            "_".join("{}_{}".format(table, counts[table]) for table in benchmark_tables), seed))
+        paths = {table: os.path.join(output_dir, table + ".csv") for table in benchmark_tables}
+        if not all(os.path.exists(path) for path in paths.values()):
+            paths = generate_dataset(output_dir, counts["products"], counts["customers"], counts["orders"], seed,
+                                     chunk_rows=min(size, 1000000))
+        datasets.append({table: (paths[table], counts[table]) for table in tables})
+    return datasets
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the bulk-load strategies on synthetic data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="rows per table, one data set per value")
+    parser.add_argument("--tables", nargs="+", choices=benchmark_tables, default=benchmark_tables)
+    parser.add_argument("--strategy", nargs="+", choices=sorted(load_strategies), help="default: all")
+    parser.add_argument("--batch-rows", type=int, default=10000, help="rows per batch for the batch writers")
+    parser.add_argument("--no-row-limits", action="store_true", help="also run the per-row strategies on large files")
+    parser.add_argument("--data-dir", default="load_benchmark_data", help="where generated data sets are kept")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-table", action="store_true", help="keep the load_benchmark_<table> tables of the last runs")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed rows/sec drop against the baseline, as a fraction")
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    try:
+        datasets = prepare_datasets(args.data_dir, args.rows, args.tables, args.seed)
+        report = run_benchmark(connection_options(args), datasets, args.strategy, args.batch_rows,
+                               not args.no_row_limits, args.keep_table)
+    except Exception as e:
+        logger.error("An error occurred while benchmarking the loaders: %s", e)
+        sys.exit(1)
+
+    fastest = {}
+    for result in report["results"]:
+        key = (result["table"], result["rows"])
+        fastest[key] = max(fastest.get(key, 0), result["rows_per_sec"])
+    print("{:<10} {:>9} {:<15} {:>9} {:>12} {:>8} {:>7} {:>9} {:>10} {:>10}".format(
+        "table", "rows", "strategy", "seconds", "rows/sec", "vs best", "CPU s", "RSS MB", "WAL MB", "WAL B/row"))
+    for result in report["results"]:
+        print("{:<10} {:>9} {:<15} {:>9.2f} {:>12.0f} {:>7.2f}x {:>7.2f} {:>9.0f} {:>10.1f} {:>10.0f}".format(
+            result["table"], result["rows"], result["strategy"], result["seconds"], result["rows_per_sec"],
+            result["rows_per_sec"] / fastest[(result["table"], result["rows"])], result["cpu_seconds"],
+            result["peak_rss_mb"], result["wal_bytes"] / 1048576.0, result["wal_bytes_per_row"]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info("Results written to %s", args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(report, baseline, args.tolerance)
+        for result, baseline_rate in regressions:
+            logger.error("Regression: %s %d rows with %s at %.0f rows/sec, baseline %.0f rows/sec.",
+                         result["table"], result["rows"], result["strategy"], result["rows_per_sec"], baseline_rate)
+        if regressions:
+            sys.exit(1)
+        logger.info("No strategy is more than %.0f%% slower than %s.", args.tolerance * 100, args.baseline)
+
+if __name__ == "__main__":
+    main()
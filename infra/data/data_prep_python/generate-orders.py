@@ -1,15 +1,29 @@
 import psycopg2
+import argparse
 import random
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
 import sys
 import getpass
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from date_partitions import ensure_partitions, is_partitioned
+from orders_storage import storage_columns, storage_table
+from sales_rollups import apply_rollup_deltas
+
 # Adjust these with your own DB connection info
 dbhost = "yourpostgresqlserver.postgres.database.azure.com"
 dbname = "yourdbname"
 sslmode = "prefer"
 
+parser = argparse.ArgumentParser(description="Generate random orders from the customers and products tables.")
+parser.add_argument("--mode", choices=["client", "server"], default="client",
+                    help="client: build each order in Python; server: one set-based INSERT ... SELECT inside PostgreSQL")
+parser.add_argument("--rows", type=int, default=300, help="number of orders to generate")
+parser.add_argument("--seed", type=int, default=None, help="random seed, for repeatable data sets")
+parser.add_argument("--batch-rows", type=int, default=1000000, help="orders per INSERT ... SELECT statement in server mode")
+args = parser.parse_args()
+
 dbuser = input('Enter your PostgreSQL DB username: ')
 password = getpass.getpass(prompt='Enter your PostgreSQL password: ')
 
@@ -23,12 +37,98 @@ def get_random_date(start_year=2023, end_year=2024):
     random_days = random.randint(0, delta)
     return start_date + timedelta(days=random_days)
 
-try:
-    # Connect to the database
-    conn = psycopg2.connect(conn_string)
-    cursor = conn.cursor()
-    print("Connection established")
+# Columns written for each order, with their value in the server-side SELECT below.
+# With narrow orders storage only the order_lines columns among them are written.
+order_columns = [
+    ("id", "picks.order_id"),
+    ("customer_id", "c.id"),
+    ("product_id", "p.id"),
+    ("quantity", "picks.quantity"),
+    ("total", "p.price * picks.quantity"),
+    ("order_date", "picks.order_date"),
+    ("customer_first_name", "c.first_name"),
+    ("customer_last_name", "c.last_name"),
+    ("unit_price", "p.price"),
+    ("category", "p.category"),
+    ("brand", "p.brand"),
+    ("product_description", "p.product_description"),
+]
+
+def orders_insert_target(cursor):
+    """
+    Returns the table that stores the orders and the columns of order_columns it has.
+    """
+    table_name = storage_table(cursor, "orders")
+    return table_name, storage_columns(table_name, [column for column, _ in order_columns])
+
+# Set-based order generation: customers and products are numbered 1..n, and every generated
+# order picks a random row number of each, so no order rows are built on or sent from the client.
+server_side_orders_sql = """
+WITH numbered_customers AS (
+    SELECT row_number() OVER (ORDER BY id) AS rn, id, first_name, last_name
+    FROM public.customers
+),
+numbered_products AS (
+    SELECT row_number() OVER (ORDER BY id) AS rn, id, price, category, brand, product_description
+    FROM public.products
+),
+picks AS (
+    SELECT
+        g.n AS order_id,
+        1 + floor(random() * %(customer_count)s)::bigint AS customer_rn,
+        1 + floor(random() * %(product_count)s)::bigint AS product_rn,
+        1 + floor(random() * 5)::integer AS quantity,
+        DATE '2023-01-01' + floor(random() * (DATE '2024-12-31' - DATE '2023-01-01' + 1))::integer AS order_date
+    FROM generate_series(%(first_id)s, %(last_id)s) AS g(n)
+)
+INSERT INTO public.{table}
+(
+    {columns}
+)
+SELECT
+    {values}
+FROM picks
+JOIN numbered_customers c ON c.rn = picks.customer_rn
+JOIN numbered_products p ON p.rn = picks.product_rn
+"""
+
+def generate_orders_server_side(cursor, orders_to_generate, seed=None, batch_rows=1000000):
+    """
+    Generates orders inside PostgreSQL with INSERT ... SELECT over generate_series.
+    Order ids run from 1 to orders_to_generate, as in the client mode.
+    """
+    if seed is not None:
+        # setseed() expects a value in [-1, 1]
+        cursor.execute("SELECT setseed(%s)", (random.Random(seed).uniform(-1, 1),))
+
+    cursor.execute("SELECT (SELECT count(*) FROM public.customers), (SELECT count(*) FROM public.products)")
+    customer_count, product_count = cursor.fetchone()
+    if not customer_count or not product_count:
+        return 0
+
+    table_name, columns = orders_insert_target(cursor)
+    expressions = dict(order_columns)
+    insert_sql = server_side_orders_sql.format(
+        table=table_name,
+        columns=",\n    ".join(columns),
+        values=",\n    ".join(expressions[column] for column in columns),
+    )
 
+    for first_id in range(1, orders_to_generate + 1, batch_rows):
+        last_id = min(first_id + batch_rows - 1, orders_to_generate)
+        cursor.execute(insert_sql, {
+            "customer_count": customer_count,
+            "product_count": product_count,
+            "first_id": first_id,
+            "last_id": last_id,
+        })
+        print(f"Generated orders {first_id} to {last_id}")
+    return orders_to_generate
+
+def generate_orders_client_side(cursor, orders_to_generate, seed=None):
+    """
+    Picks random customers and products on the client and inserts one order per statement.
+    """
     # Get all customers
     cursor.execute("SELECT id, first_name, last_name FROM public.customers")
     customers = cursor.fetchall()  # List of (id, first_name, last_name)
@@ -41,7 +141,12 @@ try:
         print("No data found in customers or products table. Please ensure they have rows.")
         sys.exit(0)
 
-    orders_to_generate = 300
+    table_name, columns = orders_insert_target(cursor)
+    insert_sql = "INSERT INTO public.{} ({}) VALUES ({})".format(
+        table_name, ", ".join(columns), ", ".join(["%s"] * len(columns)))
+
+    random.seed(seed)
+
     for i in range(orders_to_generate):
         random_customer = random.choice(customers)
         random_product = random.choice(products)
@@ -58,41 +163,43 @@ try:
         total = price * quantity
         
         order_id = i + 1  # Order ID can be the loop index + 1
+        order = {
+            "id": order_id,
+            "customer_id": customer_id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "total": total,
+            "order_date": order_date,
+            "customer_first_name": customer_first_name,
+            "customer_last_name": customer_last_name,
+            "unit_price": price,
+            "category": category,
+            "brand": brand,
+            "product_description": product_description,
+        }
         # Insert into orders table
-        cursor.execute(
-            """
-            INSERT INTO public.orders
-            ( 
-                id,
-                customer_id,
-                product_id,
-                quantity,
-                total,
-                order_date,
-                customer_first_name,
-                customer_last_name,
-                unit_price,
-                category,
-                brand,
-                product_description
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                order_id,
-                customer_id,
-                product_id,
-                quantity,
-                total,
-                order_date,
-                customer_first_name,
-                customer_last_name,
-                price,
-                category,
-                brand,
-                product_description
-            )
-        )
+        cursor.execute(insert_sql, [order[column] for column in columns])
+
+try:
+    # Connect to the database
+    conn = psycopg2.connect(conn_string)
+    cursor = conn.cursor()
+    print("Connection established")
+
+    # A range-partitioned orders table gets the partitions for the generated order dates up front,
+    # so no order lands in the default partition
+    orders_table = storage_table(cursor, "orders")
+    if is_partitioned(cursor, orders_table):
+        ensure_partitions(cursor, orders_table, date(2023, 1, 1), date(2024, 12, 31))
+
+    orders_to_generate = args.rows
+    if args.mode == "server":
+        if not generate_orders_server_side(cursor, orders_to_generate, args.seed, args.batch_rows):
+            print("No data found in customers or products table. Please ensure they have rows.")
+            sys.exit(0)
+    else:
+        generate_orders_client_side(cursor, orders_to_generate, args.seed)
+    apply_rollup_deltas(cursor)
     conn.commit()
     print(f"Successfully inserted {orders_to_generate} random orders.")
 except (Exception, psycopg2.DatabaseError) as error:
@@ -0,0 +1,251 @@
+"""
+Offline synthetic data generator for the products, customers and orders tables.
+
+Builds referentially consistent files with NumPy vectorized sampling, without a database
+connection, and writes them chunk by chunk so tens of millions of rows fit in bounded memory.
+The CSV output has the same file names and column order that run_psql_load_tables_script.py loads.
+
+Example:
+    python generate_dataset.py --output-dir ./out --products 5000 --customers 1000000 --orders 50000000 --seed 42
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pa_parquet
+except ImportError:  # Optional: CSV falls back to pandas (much slower), Parquet needs pyarrow
+    pa = None
+
+sample_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data")
+
+# Column order expected by run_psql_load_tables_script.py, so COPY can stream the files as they are
+product_columns = ['id', 'product_name', 'price', 'category', 'brand', 'product_description']
+customer_columns = ['id', 'first_name', 'last_name', 'gender', 'date_of_birth', 'age', 'email', 'phone', 'post_address', 'membership']
+order_columns = ['id', 'customer_id', 'product_id', 'quantity', 'total', 'order_date', 'customer_first_name', 'customer_last_name', 'unit_price', 'category', 'brand', 'product_description', 'return_status']
+
+memberships = np.array(["Base", "Gold", "Platinum"], dtype=object)
+membership_weights = [0.5, 0.3, 0.2]
+cities = np.array(["Buffalo,NY 99999", "Seattle,WA 98101", "Austin,TX 73301", "Denver,CO 80201", "Boston,MA 02101"], dtype=object)
+product_editions = np.array(["", " Lite", " Pro", " Max", " Plus", " Trail", " Summit", " Classic"], dtype=object)
+
+order_start_date = np.datetime64("2023-01-01")
+order_end_date = np.datetime64("2024-12-31")
+reference_date = np.datetime64("2025-01-01")
+
+def zipf_weights(count, exponent):
+    """
+    Finite Zipf weights over `count` ranks; exponent 0 gives a uniform distribution.
+    """
+    weights = 1.0 / np.arange(1, count + 1, dtype=np.float64) ** exponent
+    return weights / weights.sum()
+
+def seasonal_day_weights(seasonality, peak_day_of_year=340):
+    """
+    Weights for each day between order_start_date and order_end_date.
+    A cosine around peak_day_of_year (early December by default) scaled by `seasonality` in [0, 1].
+    """
+    days = np.arange(order_start_date, order_end_date + 1)
+    day_of_year = (days - days.astype("datetime64[Y]")).astype(np.int64)
+    weights = 1.0 + seasonality * np.cos(2 * np.pi * (day_of_year - peak_day_of_year) / 365.0)
+    return days, weights / weights.sum()
+
+def load_name_pool():
+    """
+    First names with their gender, and last names, from the fictitious names list.
+    """
+    names = pd.read_csv(os.path.join(sample_data_dir, "data-generation", "fictitious_names.csv"), encoding="utf-8-sig")
+    names.columns = names.columns.str.strip()
+    first = names[["first_name", "gender"]].drop_duplicates()
+    return (
+        first["first_name"].to_numpy(dtype=object),
+        first["gender"].to_numpy(dtype=object),
+        names["last_name"].drop_duplicates().to_numpy(dtype=object),
+    )
+
+def generate_products(rng, product_count):
+    """
+    Variants of the sample products: same category, brand and description, a new name and a price near the original.
+    """
+    base = pd.read_csv(os.path.join(sample_data_dir, "products.csv"), encoding="utf-8-sig")
+    base.columns = base.columns.str.strip()
+    ids = np.arange(1, product_count + 1)
+    base_index = (ids - 1) % len(base)
+    generation = (ids - 1) // len(base)
+
+    names = base["product_name"].to_numpy(dtype=object)[base_index] + product_editions[generation % len(product_editions)]
+    suffix = np.where(generation >= len(product_editions), " " + (generation // len(product_editions) + 1).astype(str), "")
+    price = base["price"].to_numpy(dtype=np.float64)[base_index]
+    price = np.where(generation > 0, np.round(price * rng.uniform(0.8, 1.3, product_count), 2), price)
+
+    return pd.DataFrame({
+        "id": ids,
+        "product_name": names + suffix.astype(object),
+        "price": price,
+        "category": base["category"].to_numpy(dtype=object)[base_index],
+        "brand": base["brand"].to_numpy(dtype=object)[base_index],
+        "product_description": base["product_description"].to_numpy(dtype=object)[base_index],
+    }, columns=product_columns)
+
+def generate_customer_chunk(rng, first_id, count, name_pool, first_name_index, last_name_index):
+    """
+    Customers first_id .. first_id + count - 1. Name choices are passed in so orders can reuse them.
+    """
+    first_names, genders, last_names = name_pool
+    ids = np.arange(first_id, first_id + count)
+    first = first_names[first_name_index]
+    last = last_names[last_name_index]
+
+    age_days = rng.integers(18 * 365, 80 * 365, count)
+    date_of_birth = reference_date - age_days.astype("timedelta64[D]")
+    age = (age_days / 365.25).astype(np.int64)
+    phone_number = pd.Series(1000000 + ids % 9000000)
+
+    return pd.DataFrame({
+        "id": ids,
+        "first_name": first,
+        "last_name": last,
+        "gender": genders[first_name_index],
+        "date_of_birth": date_of_birth,
+        "age": age,
+        "email": first + "." + last + "." + ids.astype(str).astype(object) + "@example.com",
+        "phone": ("555-" + (phone_number // 10000).astype(str) + "-" + (phone_number % 10000).astype(str).str.zfill(4)).to_numpy(),
+        "post_address": (100 + ids % 9900).astype(str).astype(object) + " Main ST, " + cities[ids % len(cities)],
+        "membership": rng.choice(memberships, count, p=membership_weights),
+    }, columns=customer_columns)
+
+def generate_order_chunk(rng, first_id, count, products, product_weights, customer_names, days, day_weights, return_rate):
+    """
+    Orders first_id .. first_id + count - 1, with Zipf product popularity and seasonal order dates.
+    """
+    first_names, last_names = customer_names
+    product_index = rng.choice(len(products), count, p=product_weights)
+    customer_index = rng.integers(0, len(first_names), count)
+    quantity = rng.integers(1, 6, count)
+    unit_price = products["price"].to_numpy()[product_index]
+
+    return pd.DataFrame({
+        "id": np.arange(first_id, first_id + count),
+        "customer_id": customer_index + 1,
+        "product_id": products["id"].to_numpy()[product_index],
+        "quantity": quantity,
+        "total": np.round(unit_price * quantity, 2),
+        "order_date": rng.choice(days, count, p=day_weights),
+        "customer_first_name": first_names[customer_index],
+        "customer_last_name": last_names[customer_index],
+        "unit_price": unit_price,
+        "category": products["category"].to_numpy(dtype=object)[product_index],
+        "brand": products["brand"].to_numpy(dtype=object)[product_index],
+        "product_description": products["product_description"].to_numpy(dtype=object)[product_index],
+        "return_status": rng.random(count) < return_rate,
+    }, columns=order_columns)
+
+class ChunkWriter:
+    """
+    Appends DataFrame chunks to one CSV or Parquet file.
+    Uses pyarrow writers when available, the pandas CSV writer otherwise.
+    """
+    def __init__(self, path, output_format):
+        if output_format == "parquet" and pa is None:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.path = path
+        self.output_format = output_format
+        self.rows = 0
+        self._writer = None
+
+    def write(self, df):
+        if pa is None:
+            df.to_csv(self.path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False, date_format="%Y-%m-%d")
+        else:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # Date columns arrive as timestamps; store them as plain dates
+            table = table.cast(pa.schema([
+                pa.field(field.name, pa.date32()) if pa.types.is_timestamp(field.type) else field
+                for field in table.schema
+            ]))
+            if self._writer is None:
+                if self.output_format == "parquet":
+                    self._writer = pa_parquet.ParquetWriter(self.path, table.schema)
+                else:
+                    self._writer = pa_csv.CSVWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def generate_dataset(output_dir, product_count, customer_count, order_count, seed=None, output_format="csv",
+                     chunk_rows=1000000, product_skew=1.1, seasonality=0.5, return_rate=0.05):
+    """
+    Writes products, customers and orders files into output_dir and returns their paths.
+    Every order references an existing customer and product, and repeats their names, prices and descriptions.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    product_seed, customer_seed, order_seed = np.random.SeedSequence(seed).spawn(3)
+    extension = "parquet" if output_format == "parquet" else "csv"
+    paths = {table: os.path.join(output_dir, "{}.{}".format(table, extension)) for table in ("products", "customers", "orders")}
+
+    products = generate_products(np.random.default_rng(product_seed), product_count)
+    writer = ChunkWriter(paths["products"], output_format)
+    writer.write(products)
+    writer.close()
+    print(f"Wrote {product_count} products to {paths['products']}")
+
+    # Name choices for every customer are kept (two small integer arrays) so orders can repeat them
+    customer_rng = np.random.default_rng(customer_seed)
+    name_pool = load_name_pool()
+    first_name_index = customer_rng.integers(0, len(name_pool[0]), customer_count)
+    last_name_index = customer_rng.integers(0, len(name_pool[2]), customer_count)
+    writer = ChunkWriter(paths["customers"], output_format)
+    for start in range(0, customer_count, chunk_rows):
+        stop = min(start + chunk_rows, customer_count)
+        writer.write(generate_customer_chunk(customer_rng, start + 1, stop - start, name_pool,
+                                             first_name_index[start:stop], last_name_index[start:stop]))
+    writer.close()
+    print(f"Wrote {customer_count} customers to {paths['customers']}")
+
+    order_rng = np.random.default_rng(order_seed)
+    # Random popularity ranks, so the best sellers are not simply the lowest product ids
+    product_weights = zipf_weights(product_count, product_skew)[order_rng.permutation(product_count)]
+    days, day_weights = seasonal_day_weights(seasonality)
+    customer_names = (name_pool[0][first_name_index], name_pool[2][last_name_index])
+    writer = ChunkWriter(paths["orders"], output_format)
+    started = time.time()
+    for start in range(0, order_count, chunk_rows):
+        count = min(chunk_rows, order_count - start)
+        writer.write(generate_order_chunk(order_rng, start + 1, count, products, product_weights,
+                                          customer_names, days, day_weights, return_rate))
+        print(f"Wrote {writer.rows} of {order_count} orders ({writer.rows / max(time.time() - started, 1e-9):.0f} rows/sec)")
+    writer.close()
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic products, customers and orders files offline.")
+    parser.add_argument("--output-dir", required=True, help="directory for products/customers/orders files")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--customers", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="csv files load with run_psql_load_tables_script.py; parquet needs pyarrow")
+    parser.add_argument("--chunk-rows", type=int, default=1000000, help="rows generated and written per chunk")
+    parser.add_argument("--product-skew", type=float, default=1.1, help="Zipf exponent of product popularity, 0 for uniform")
+    parser.add_argument("--seasonality", type=float, default=0.5, help="0 for flat order dates, up to 1 for a strong December peak")
+    parser.add_argument("--return-rate", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    if min(args.products, args.customers) < 1 or args.orders < 0:
+        print("At least one product and one customer are required.")
+        sys.exit(1)
+
+    generate_dataset(args.output_dir, args.products, args.customers, args.orders, args.seed, args.format,
+                     args.chunk_rows, args.product_skew, args.seasonality, args.return_rate)
+
+if __name__ == "__main__":
+    main()
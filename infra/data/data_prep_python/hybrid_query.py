@@ -0,0 +1,68 @@
+"""
+Runs a hybrid keyword and vector search over vector_store documents or products.
+
+The query is embedded with the same embedder that loaded vector_store (see vector_loader.py),
+then keyword and vector results are fused in one statement. The connection comes from the same
+options and PG* environment variables as table_loader.py.
+
+Examples:
+    python hybrid_query.py "TrailMaster X4"
+    python hybrid_query.py "waterproof hiking boots" --target products --k 5 --embedder azure_openai
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from embedders import embedders, get_embedder
+from hybrid_search import hybrid_search, search_targets
+from vector_index import vector_column, vector_index_name, vector_storage, vector_table
+from vector_storage import current_vector_storage
+from table_loader import connect
+
+logger = logging.getLogger(__name__)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hybrid keyword and vector search.")
+    parser.add_argument("query")
+    parser.add_argument("--target", choices=sorted(search_targets), default="documents")
+    parser.add_argument("--k", type=int, default=10, help="rows returned")
+    parser.add_argument("--candidates", type=int, default=40, help="rows each retrieval contributes to the fusion")
+    parser.add_argument("--rrf-k", type=int, default=60, help="reciprocal rank fusion constant")
+    parser.add_argument("--embedder", choices=sorted(embedders), default="hash", help="must be the embedder that loaded vector_store")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    conn = connect(args)
+    try:
+        query_vector = get_embedder(args.embedder, dimensions=args.dimensions).embed([args.query])[0]
+        with conn.cursor() as cursor:
+            storage = current_vector_storage(cursor, vector_table, vector_column, vector_index_name) or vector_storage
+            rows, elapsed_ms = hybrid_search(cursor, args.query, query_vector, args.target, args.k, args.candidates,
+                                             args.rrf_k, storage, dimensions=args.dimensions)
+        conn.rollback()
+    except Exception as e:
+        conn.rollback()
+        logger.error("An error occurred while searching: %s", e)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    title_column = "title" if args.target == "documents" else "product_name"
+    print("{:>8} {:>8} {:>8}  {}".format("score", "keyword", "vector", title_column))
+    for row in rows:
+        print("{:>8.4f} {:>8} {:>8}  {}".format(
+            row["score"], row["keyword_rank"] or "-", row["semantic_rank"] or "-", row[title_column]))
+    logger.info("%d rows in %.1f ms.", len(rows), elapsed_ms)
+
+if __name__ == "__main__":
+    main()
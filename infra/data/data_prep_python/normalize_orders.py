@@ -0,0 +1,70 @@
+"""
+Switches an existing database to narrow orders storage: the rows move to order_lines without the
+copied customer and product columns, and orders becomes a view with the columns of the wide table.
+See orders_storage.py. The connection comes from the same options and PG* environment variables
+as table_loader.py.
+
+Examples:
+    python normalize_orders.py
+    python normalize_orders.py --vacuum-full
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from orders_storage import convert_to_narrow, order_lines_table
+from table_loader import connect
+
+logger = logging.getLogger(__name__)
+
+def table_size(cursor, table_name):
+    """
+    Total size of a table with its partitions, indexes and TOAST data, in bytes.
+    """
+    cursor.execute("""
+        SELECT coalesce(sum(pg_total_relation_size(relid)), 0)
+        FROM pg_partition_tree(%s::regclass)
+    """, (table_name,))
+    return cursor.fetchone()[0]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store orders narrowly in order_lines behind an orders view.")
+    parser.add_argument("--vacuum-full", action="store_true",
+                        help="rewrite order_lines afterwards to reclaim the space of the dropped columns (locks the table)")
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    conn = connect(args)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('orders') IS NOT NULL")
+            before = table_size(cursor, "orders") if cursor.fetchone()[0] else 0
+            if not convert_to_narrow(cursor, "narrow"):
+                logger.info("orders is already stored narrowly, or does not exist.")
+                return
+        conn.commit()
+        if args.vacuum_full:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("VACUUM (FULL, ANALYZE) {}".format(order_lines_table))
+        with conn.cursor() as cursor:
+            logger.info("orders: %.1f MB as a table, order_lines: %.1f MB.",
+                        before / 2**20, table_size(cursor, order_lines_table) / 2**20)
+    except Exception as e:
+        conn.rollback()
+        logger.error("An error occurred while converting orders: %s", e)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
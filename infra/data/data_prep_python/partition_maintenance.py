@@ -0,0 +1,74 @@
+"""
+Partition maintenance for the range-partitioned orders table.
+
+Pre-creates the partitions of the coming months or years and detaches, or drops, the ones past the
+retention period. Meant to run from a scheduler; the connection comes from the same options and
+PG* environment variables as table_loader.py.
+
+Examples:
+    python partition_maintenance.py --ahead 3
+    python partition_maintenance.py --retain 24 --drop
+"""
+import argparse
+import logging
+import os
+import sys
+from psycopg2 import sql
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from date_partitions import is_partitioned, maintain_partitions, partition_intervals, split_default_partition
+from table_loader import connect
+from orders_storage import storage_table
+from sales_rollups import apply_rollup_deltas, remove_from_rollups
+
+logger = logging.getLogger(__name__)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create upcoming and retire expired partitions of a range-partitioned table.")
+    parser.add_argument("--table", default="orders", help="orders also finds order_lines with narrow orders storage")
+    parser.add_argument("--interval", choices=partition_intervals, help="default: detected from the existing partitions")
+    parser.add_argument("--ahead", type=int, default=3, help="periods to create past the current one")
+    parser.add_argument("--retain", type=int, help="periods to keep before the current one; older partitions are detached")
+    parser.add_argument("--drop", action="store_true", help="drop expired partitions instead of keeping them as tables")
+    parser.add_argument("--split-default", action="store_true", help="also move rows out of the default partition")
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    conn = connect(args)
+    try:
+        with conn.cursor() as cursor:
+            table_name = storage_table(cursor, args.table)
+            if not is_partitioned(cursor, table_name):
+                logger.error("%s is not a partitioned table", table_name)
+                sys.exit(1)
+            created, expired = maintain_partitions(cursor, table_name, args.interval, args.ahead, args.retain)
+            if table_name == storage_table(cursor, "orders"):
+                # Expired orders leave the sales rollups along with their partition
+                for name in expired:
+                    remove_from_rollups(cursor, name)
+                apply_rollup_deltas(cursor)
+            if args.drop:
+                for name in expired:
+                    cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                if expired:
+                    logger.info("Partitions %s dropped.", ", ".join(expired))
+            if args.split_default:
+                created += split_default_partition(cursor, table_name, args.interval)
+        conn.commit()
+        logger.info("%d partitions created, %d expired.", len(created), len(expired))
+    except Exception as e:
+        conn.rollback()
+        logger.error("An error occurred while maintaining partitions of %s: %s", args.table, e)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
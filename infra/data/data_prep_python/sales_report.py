@@ -0,0 +1,70 @@
+"""
+Sales totals per category, brand, month, customer or product, read from the sales rollups when
+one of them can answer the question (see sales_rollups.py) and from the orders otherwise. The
+connection comes from the same options and PG* environment variables as table_loader.py.
+
+Examples:
+    python sales_report.py --by category,brand,month --from 2024-01-01 --to 2024-07-01
+    python sales_report.py --by customer_id --top 10
+    python sales_report.py --by product_id --compare
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import date
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from sales_rollups import rollup_dimensions, sales_summary
+from table_loader import connect
+
+logger = logging.getLogger(__name__)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Order count, quantity, revenue and return rate per group.")
+    parser.add_argument("--by", default="category", help="comma-separated: " + ", ".join(sorted(rollup_dimensions)))
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="first order date (inclusive)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="last order date (exclusive)")
+    parser.add_argument("--category")
+    parser.add_argument("--brand")
+    parser.add_argument("--top", type=int, help="only the groups with the highest revenue")
+    parser.add_argument("--compare", action="store_true", help="also answer from the orders and compare")
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    group_by = [dimension.strip() for dimension in args.by.split(",") if dimension.strip()]
+    filters = {dimension: getattr(args, dimension) for dimension in ("category", "brand") if getattr(args, dimension)}
+    conn = connect(args)
+    try:
+        with conn.cursor() as cursor:
+            rows, source, elapsed_ms = sales_summary(cursor, group_by, args.start, args.end, filters)
+            if args.compare and source != "orders":
+                scanned, _, scan_ms = sales_summary(cursor, group_by, args.start, args.end, filters, source="orders")
+        conn.rollback()
+    except Exception as e:
+        conn.rollback()
+        logger.error("An error occurred while reading the sales totals: %s", e)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    if args.compare and source != "orders":
+        logger.info("Same question from orders: %d rows in %.1f ms, %s.", len(scanned), scan_ms,
+                    "same results" if scanned == rows else "results differ")
+    if args.top:
+        rows = sorted(rows, key=lambda row: row["revenue"], reverse=True)[:args.top]
+    print("  ".join(group_by + ["orders", "quantity", "revenue", "return_rate"]))
+    for row in rows:
+        print("  ".join([str(row[dimension]) for dimension in group_by] +
+                        [str(row["orders"]), str(row["quantity"]), "{:.2f}".format(row["revenue"]), "{:.3f}".format(row["return_rate"])]))
+    logger.info("%d rows from %s in %.1f ms.", len(rows), source, elapsed_ms)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Non-interactive loader for the products, customers and orders tables from CSV or XLSX files.
+
+Replaces the populate-table-*.py scripts. The input format is detected from the file extension,
+the connection comes from command line options or the standard libpq environment variables
+(PGHOST, PGDATABASE, PGUSER, PGPASSWORD, PGSSLMODE), and rows are written in batches through a
+pluggable strategy from bulk_writers.py.
+
+Examples:
+    python table_loader.py products sample_data/products.csv
+    python table_loader.py customers sample_data/customers-data.xlsx --strategy execute_values --truncate
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import psycopg2
+from psycopg2 import sql
+
+# Shared loader helpers live next to the deployment data scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from dataframe_batches import iter_csv_batches, table_columns, table_column_types
+from bulk_writers import batch_writers, get_batch_writer
+from xlsx_ingest import iter_xlsx_batches
+from date_partitions import is_partitioned, split_default_partition
+from orders_storage import storage_columns, storage_table
+from sales_rollups import apply_rollup_deltas
+
+logger = logging.getLogger(__name__)
+
+csv_extensions = (".csv",)
+xlsx_extensions = (".xlsx", ".xlsm")
+
+def detect_format(file_path):
+    """
+    Returns "csv" or "xlsx" based on the file extension.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in csv_extensions:
+        return "csv"
+    if extension in xlsx_extensions:
+        return "xlsx"
+    raise ValueError("Unsupported file type '{}' for {}".format(extension, file_path))
+
+def read_batches(file_path, table_name, columns, batch_rows, sheet_name=None, xlsx_cache_dir=None):
+    """
+    Yields lists of DB-ready row tuples from a CSV or XLSX file.
+    XLSX files are streamed from the sheet named after the table unless sheet_name is given;
+    see xlsx_ingest.iter_xlsx_batches for the converted-file cache.
+    """
+    column_types = table_column_types.get(table_name)
+    if detect_format(file_path) == "csv":
+        yield from iter_csv_batches(file_path, columns, column_types, batch_rows)
+    else:
+        yield from iter_xlsx_batches(file_path, sheet_name or table_name, columns, column_types, batch_rows, xlsx_cache_dir)
+
+def load_file(conn, table_name, file_path, strategy="copy", batch_rows=10000, sheet_name=None, truncate=False,
+              xlsx_cache_dir=None):
+    """
+    Loads one file into one table in a single transaction.
+    With narrow orders storage, orders rows go to order_lines (see orders_storage.py).
+    Returns the number of rows loaded and the elapsed seconds.
+    """
+    started = time.perf_counter()
+    try:
+        with conn.cursor() as cursor:
+            target_name = storage_table(cursor, table_name)
+            columns = storage_columns(target_name, table_columns[table_name])
+            if truncate:
+                cursor.execute(sql.SQL("TRUNCATE TABLE {}").format(sql.Identifier(target_name)))
+            writer = get_batch_writer(strategy, cursor, target_name, columns)
+            for rows in read_batches(file_path, table_name, columns, batch_rows, sheet_name, xlsx_cache_dir):
+                writer.write(rows)
+                logger.debug("%s: %d rows written", target_name, writer.rows)
+            # Rows of a range-partitioned table without a partition yet went to the default partition
+            if is_partitioned(cursor, target_name):
+                split_default_partition(cursor, target_name)
+            if table_name == "orders":
+                apply_rollup_deltas(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    elapsed = time.perf_counter() - started
+    logger.info("Loaded %d rows into %s with %s in %.2f s (%.0f rows/sec)",
+                writer.rows, table_name, strategy, elapsed, writer.rows / max(elapsed, 1e-9))
+    return writer.rows, elapsed
+
+def connection_options(args):
+    """
+    psycopg2.connect keyword arguments for the given options, leaving out those not given.
+    """
+    options = {
+        "host": args.host,
+        "port": args.port,
+        "dbname": args.dbname,
+        "user": args.user,
+        "password": args.password,
+        "sslmode": args.sslmode,
+    }
+    return {key: value for key, value in options.items() if value}
+
+def connect(args):
+    """
+    Connects with the given options; anything not given falls back to the libpq PG* environment variables.
+    """
+    return psycopg2.connect(**connection_options(args))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a CSV or XLSX file into the products, customers or orders table.")
+    parser.add_argument("table", choices=sorted(table_columns))
+    parser.add_argument("file", help="path to a .csv or .xlsx file")
+    parser.add_argument("--sheet", help="worksheet name for XLSX files (default: the table name)")
+    parser.add_argument("--xlsx-cache-dir", help="where converted copies of XLSX sheets are kept (default: XLSX_CACHE_DIR or ~/.cache)")
+    parser.add_argument("--no-xlsx-cache", action="store_true", help="always parse the workbook")
+    parser.add_argument("--strategy", choices=sorted(batch_writers), default="copy")
+    parser.add_argument("--batch-rows", type=int, default=10000)
+    parser.add_argument("--truncate", action="store_true", help="empty the table before loading")
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    if not os.path.exists(args.file):
+        logger.error("File does not exist: %s", args.file)
+        sys.exit(1)
+
+    conn = connect(args)
+    try:
+        xlsx_cache_dir = False if args.no_xlsx_cache else args.xlsx_cache_dir
+        load_file(conn, args.table, args.file, args.strategy, args.batch_rows, args.sheet, args.truncate, xlsx_cache_dir)
+    except Exception as e:
+        logger.error("An error occurred while loading %s table: %s", args.table, e)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmarks the HNSW index on synthetic 1536-dimensional vectors.
+
+Fills a separate vector_benchmark table (vector_store is not touched), sweeps --m,
+--ef-construction and --ef-search, and reports recall@k against brute-force ground truth,
+p50/p95/p99 latency, QPS from --concurrency connections, index build time and index size.
+--output writes the results as JSON for tracking regressions between runs. The connection comes
+from the same options and PG* environment variables as table_loader.py.
+
+Examples:
+    python vector_index_benchmark.py --rows 20000 --queries 100
+    python vector_index_benchmark.py --rows 200000 --m 16 32 --ef-construction 64 128 --ef-search 40 100 200 --output hnsw.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from vector_benchmark import run_benchmark
+from table_loader import connect
+
+logger = logging.getLogger(__name__)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark recall, latency and build cost of the HNSW vector index.")
+    parser.add_argument("--rows", type=int, default=100000, help="vectors in the benchmark table")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=100, help="cluster centres of the data; 0 for uniform vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10, help="neighbours per query")
+    parser.add_argument("--m", type=int, nargs="+", default=[16])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[40, 100, 200])
+    parser.add_argument("--concurrency", type=int, default=4, help="connections for the QPS run; 0 to skip it")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-table", action="store_true", help="keep vector_benchmark and its last index")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    try:
+        report = run_benchmark(
+            lambda: connect(args),
+            rows=args.rows,
+            dimensions=args.dimensions,
+            clusters=args.clusters,
+            query_count=args.queries,
+            k=args.k,
+            m_values=args.m,
+            ef_construction_values=args.ef_construction,
+            ef_search_values=args.ef_search,
+            concurrency=args.concurrency,
+            seed=args.seed,
+            keep_table=args.keep_table,
+        )
+    except Exception as e:
+        logger.error("An error occurred while benchmarking the vector index: %s", e)
+        sys.exit(1)
+
+    print("{:>4} {:>15} {:>9} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10}".format(
+        "m", "ef_construction", "ef_search", "recall", "p50 ms", "p95 ms", "p99 ms", "QPS", "build s", "index MB"))
+    for result in report["results"]:
+        print("{:>4} {:>15} {:>9} {:>8.3f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9} {:>9.1f} {:>10.1f}".format(
+            result["m"], result["ef_construction"], result["ef_search"], result["recall"],
+            result["p50_ms"], result["p95_ms"], result["p99_ms"],
+            "-" if result["qps"] is None else "{:.0f}".format(result["qps"]),
+            result["build_seconds"], result["index_bytes"] / 1048576.0))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info("Results written to %s", args.output)
+
+if __name__ == "__main__":
+    main()
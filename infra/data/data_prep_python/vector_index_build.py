@@ -0,0 +1,77 @@
+"""
+Drops or builds the HNSW index of vector_store around a bulk vector load.
+
+Drop the index before loading and build it once afterwards; the build logs its progress.
+--storage converts the embeddings to float32 (vector), float16 (halfvec) or binary-quantized
+storage and rebuilds the index to match (pgvector 0.7.0 or later for halfvec and binary).
+The connection comes from the same options and PG* environment variables as table_loader.py.
+
+Examples:
+    python vector_index_build.py --drop
+    python vector_index_build.py --m 16 --ef-construction 128 --maintenance-work-mem 4GB --parallel-workers 8
+    python vector_index_build.py --storage binary
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from vector_index import build_vector_index, drop_vector_index, set_vector_storage
+from vector_storage import vector_storage_modes
+from table_loader import connect
+
+logger = logging.getLogger(__name__)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drop or build the HNSW index of vector_store.")
+    parser.add_argument("--drop", action="store_true", help="drop the index ahead of a bulk load instead of building it")
+    parser.add_argument("--storage", choices=vector_storage_modes, help="convert vector_store to this storage and rebuild the index")
+    parser.add_argument("--m", type=int, help="HNSW connections per node (default: PSQL_HNSW_M or 16)")
+    parser.add_argument("--ef-construction", type=int, help="HNSW build candidate list size (default: PSQL_HNSW_EF_CONSTRUCTION or 64)")
+    parser.add_argument("--maintenance-work-mem", help="e.g. 4GB; ideally large enough for the whole graph")
+    parser.add_argument("--parallel-workers", type=int, help="max_parallel_maintenance_workers for the build")
+    parser.add_argument("--concurrently", action="store_true", help="keep vector_store writable during the build")
+    parser.add_argument("--progress-interval", type=float, default=10, help="seconds between progress reports")
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    conn = connect(args)
+    progress_conn = None
+    try:
+        if args.drop:
+            with conn.cursor() as cursor:
+                drop_vector_index(cursor)
+            conn.commit()
+        elif args.storage:
+            progress_conn = connect(args)
+            set_vector_storage(conn, args.storage, progress_conn)
+        else:
+            progress_conn = connect(args)
+            build_vector_index(
+                conn, progress_conn,
+                m=args.m,
+                ef_construction=args.ef_construction,
+                maintenance_work_mem=args.maintenance_work_mem,
+                parallel_workers=args.parallel_workers,
+                concurrently=args.concurrently,
+                progress_interval=args.progress_interval,
+            )
+    except Exception as e:
+        conn.rollback()
+        logger.error("An error occurred while %s the vector index: %s", "dropping" if args.drop else "building", e)
+        sys.exit(1)
+    finally:
+        conn.close()
+        if progress_conn is not None:
+            progress_conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Fills vector_store with embedded chunks of product descriptions and local text or PDF files.
+
+Documents are split into overlapping chunks, embedded in batches by the selected embedder and
+written with COPY. The connection comes from the same options and PG* environment variables as
+table_loader.py. Embeddings are cached locally by embedder and text hash, and chunks whose stored
+row is unchanged are skipped, so re-running on the same sources is cheap.
+
+When vector_store is empty, or with --rebuild-index, the HNSW index is dropped for the load and built
+once afterwards (also when the load fails). Otherwise it stays in place, so a re-run only pays
+index maintenance for the chunks it writes and no rebuild; --keep-index never drops it.
+
+Examples:
+    python vector_loader.py --products
+    python vector_loader.py docs/manual.pdf notes.txt --embedder azure_openai --workers 8
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from embedders import embedders, get_embedder
+from embedding_cache import CachedEmbedder, EmbeddingCache
+from vector_ingest import file_documents, ingest_documents, product_documents
+from vector_index import build_vector_index, drop_vector_index
+from table_loader import connect
+
+logger = logging.getLogger(__name__)
+
+def vector_store_is_empty(cursor):
+    cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM vector_store)")
+    return cursor.fetchone()[0]
+
+def restore_vector_index(args, storage):
+    """
+    Builds the index dropped for a load that failed, on a new connection in case the old one is
+    gone, so searches do not fall back to sequential scans.
+    """
+    conn = connect(args)
+    try:
+        build_vector_index(conn, storage=storage)
+    except Exception as e:
+        logger.error("Could not rebuild the vector index, run vector_index_build.py: %s", e)
+    finally:
+        conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chunk, embed and load documents into vector_store.")
+    parser.add_argument("files", nargs="*", help=".txt, .md or .pdf files")
+    parser.add_argument("--products", action="store_true", help="also load the product descriptions of the products table")
+    parser.add_argument("--embedder", choices=sorted(embedders), default="hash")
+    parser.add_argument("--dimensions", type=int, default=1536, help="must match vector_store.content_vector")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="characters per chunk")
+    parser.add_argument("--overlap", type=int, default=200, help="characters shared by consecutive chunks")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding call and COPY")
+    parser.add_argument("--workers", type=int, default=4, help="embedding calls in flight")
+    parser.add_argument("--embedding-cache", help="SQLite file of cached embeddings (default: EMBEDDING_CACHE_PATH or ~/.cache)")
+    parser.add_argument("--embedding-cache-size", type=int, help="most embeddings kept in the cache (default: EMBEDDING_CACHE_MAX_ENTRIES or 200000)")
+    parser.add_argument("--no-embedding-cache", action="store_true", help="embed every chunk again")
+    index_mode = parser.add_mutually_exclusive_group()
+    index_mode.add_argument("--keep-index", action="store_true", help="load with the HNSW index in place, even into an empty table")
+    index_mode.add_argument("--rebuild-index", action="store_true",
+                            help="drop the HNSW index and build it after the load, even when vector_store has rows (large loads)")
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    if not args.files and not args.products:
+        parser.error("give files to load, --products, or both")
+    missing = [file_path for file_path in args.files if not os.path.exists(file_path)]
+    if missing:
+        logger.error("Files do not exist: %s", ", ".join(missing))
+        sys.exit(1)
+
+    conn = connect(args)
+    cache = None
+    storage = None
+    index_dropped = False
+    try:
+        embedder = get_embedder(args.embedder, dimensions=args.dimensions)
+        if not args.no_embedding_cache:
+            cache = EmbeddingCache(args.embedding_cache, args.embedding_cache_size)
+            embedder = CachedEmbedder(embedder, cache)
+        if not args.keep_index:
+            with conn.cursor() as cursor:
+                if args.rebuild_index or vector_store_is_empty(cursor):
+                    storage = drop_vector_index(cursor)
+                    index_dropped = True
+            conn.commit()
+
+        started = time.perf_counter()
+        chunks = 0
+        if args.products:
+            chunks += ingest_documents(conn, product_documents(conn), embedder, args.batch_size, args.workers,
+                                       args.chunk_size, args.overlap)
+        if args.files:
+            chunks += ingest_documents(conn, file_documents(args.files), embedder, args.batch_size, args.workers,
+                                       args.chunk_size, args.overlap)
+        elapsed = time.perf_counter() - started
+        logger.info("Loaded %d chunks in %.2f s (%.0f chunks/sec)", chunks, elapsed, chunks / max(elapsed, 1e-9))
+        if cache:
+            logger.info("Embedding cache: %d hits, %d misses (%.1f%% hit rate)",
+                        embedder.hits, embedder.misses, 100.0 * embedder.hit_rate)
+
+        if index_dropped:
+            build_vector_index(conn, storage=storage)
+            index_dropped = False
+    except Exception as e:
+        if not conn.closed:
+            conn.rollback()
+        logger.error("An error occurred while loading vector_store: %s", e)
+        if index_dropped:
+            restore_vector_index(args, storage)
+        sys.exit(1)
+    finally:
+        conn.close()
+        if cache:
+            cache.close()
+
+if __name__ == "__main__":
+    main()
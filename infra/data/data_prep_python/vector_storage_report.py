@@ -0,0 +1,57 @@
+"""
+Compares float32, halfvec and binary-quantized storage of the vector_store embeddings.
+
+Each mode's HNSW index is built on an unlogged copy of the stored vectors. The report shows bytes
+per vector, index size, recall@k against exact float32 search and query time, using stored vectors
+as queries. Binary quantization re-ranks --rerank-factor * k candidates. The connection comes from
+the same options and PG* environment variables as table_loader.py.
+
+Example:
+    python vector_storage_report.py --queries 200 --k 10 --rerank-factor 4
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from vector_storage import compare_storage_modes
+from table_loader import connect
+
+logger = logging.getLogger(__name__)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure memory and recall of the vector_store storage modes.")
+    parser.add_argument("--queries", type=int, default=100, help="stored vectors used as queries")
+    parser.add_argument("--k", type=int, default=10, help="neighbours per query")
+    parser.add_argument("--rerank-factor", type=int, default=4, help="binary candidates per result to re-rank")
+    parser.add_argument("--host")
+    parser.add_argument("--port")
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="prefer the PGPASSWORD environment variable")
+    parser.add_argument("--sslmode")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    conn = connect(args)
+    try:
+        results = compare_storage_modes(conn, args.queries, args.k, args.rerank_factor)
+    except Exception as e:
+        conn.rollback()
+        logger.error("An error occurred while comparing vector storage: %s", e)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    baseline = results[0]
+    print("{:<8} {:>14} {:>12} {:>10} {:>10} {:>12}".format("storage", "bytes/vector", "index MB", "saved", "recall@{}".format(args.k), "ms/query"))
+    for result in results:
+        saved = 1.0 - result["index_bytes"] / float(baseline["index_bytes"]) if baseline["index_bytes"] else 0.0
+        print("{:<8} {:>14.0f} {:>12.1f} {:>9.0f}% {:>10.3f} {:>12.2f}".format(
+            result["storage"], result["bytes_per_vector"], result["index_bytes"] / 1048576.0,
+            100.0 * saved, result["recall"], result["ms_per_query"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Streaming XLSX ingestion for table_loader.py.
+
+Worksheets are read row by row with openpyxl in read-only mode instead of pd.read_excel, and the
+rows are written to a CSV copy on the way through. The copy is cached under a key built from the
+workbook's content hash and the sheet name, so loading an unchanged workbook again skips Excel
+parsing entirely and streams the cached CSV.
+"""
+import csv
+import hashlib
+import logging
+import os
+import sys
+import pandas as pd
+from openpyxl import load_workbook
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_scripts"))
+from dataframe_batches import dataframe_to_rows, iter_csv_batches
+
+logger = logging.getLogger(__name__)
+
+default_cache_dir = os.environ.get(
+    "XLSX_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "pythonapiapp", "xlsx")
+)
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    """
+    SHA-256 of a file's content, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cached_csv_path(xlsx_file_path, sheet_name, cache_dir=None):
+    """
+    Location of the converted CSV copy for this workbook content and sheet.
+    """
+    sheet_key = hashlib.sha256(sheet_name.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir or default_cache_dir, "{}-{}.csv".format(file_sha256(xlsx_file_path), sheet_key))
+
+def iter_xlsx_rows(xlsx_file_path, sheet_name):
+    """
+    Yields the header (stripped column names) and then each data row as a tuple of cell values.
+    """
+    workbook = load_workbook(xlsx_file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        yield tuple("" if name is None else str(name).strip() for name in header)
+        for row in rows:
+            # Read-only sheets may report trailing empty rows
+            if any(value is not None for value in row):
+                yield row
+    finally:
+        workbook.close()
+
+def iter_xlsx_batches(xlsx_file_path, sheet_name, columns, column_types=None, batch_rows=10000, cache_dir=None):
+    """
+    Yields lists of DB-ready row tuples from one worksheet.
+    Uses the cached CSV copy when there is one; otherwise streams the sheet and builds the cache.
+    Pass cache_dir=False to disable the cache.
+    """
+    cache_path = None if cache_dir is False else cached_csv_path(xlsx_file_path, sheet_name, cache_dir)
+    if cache_path and os.path.exists(cache_path):
+        logger.info("Workbook sheet '%s' unchanged, reading cached copy %s", sheet_name, cache_path)
+        yield from iter_csv_batches(cache_path, columns, column_types, batch_rows)
+        return
+
+    rows = iter_xlsx_rows(xlsx_file_path, sheet_name)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    cache_file = None
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        cache_file = open(temp_path, "w", encoding="utf-8", newline="")
+        cache_writer = csv.writer(cache_file)
+        cache_writer.writerow(header)
+
+    completed = False
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                if cache_file:
+                    cache_writer.writerows(batch)
+                yield dataframe_to_rows(pd.DataFrame.from_records(batch, columns=header), columns, column_types)
+                batch = []
+        if batch:
+            if cache_file:
+                cache_writer.writerows(batch)
+            yield dataframe_to_rows(pd.DataFrame.from_records(batch, columns=header), columns, column_types)
+        completed = True
+    finally:
+        if cache_file:
+            cache_file.close()
+            # Only publish the copy once the whole sheet went through
+            if completed:
+                os.replace(temp_path, cache_path)
+            else:
+                os.remove(temp_path)
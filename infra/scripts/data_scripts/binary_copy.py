@@ -0,0 +1,174 @@
+"""
+COPY ... FROM STDIN WITH (FORMAT binary) for row batches.
+
+Values are packed straight into PostgreSQL's binary wire format, so neither side formats or parses
+text: a pgvector value is a small header followed by the big-endian float32 (float16 for halfvec)
+bytes of the NumPy array, a numeric is a list of base-10000 digits, a date a day count. The encoder of each column is
+chosen once from the table's catalog types, because binary COPY requires the exact type.
+"""
+import io
+import struct
+from datetime import date, datetime, timezone
+from decimal import Decimal
+import numpy as np
+from psycopg2 import sql
+
+copy_header = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+copy_trailer = struct.pack(">h", -1)
+null_field = struct.pack(">i", -1)
+
+postgres_epoch_date = date(2000, 1, 1)
+postgres_epoch = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+numeric_positive = 0x0000
+numeric_negative = 0x4000
+numeric_nan = 0xC000
+
+def encode_numeric(value):
+    """
+    numeric: digit count, weight of the first base-10000 digit, sign, display scale, then the digits.
+    """
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    if value.is_nan():
+        return struct.pack(">hhHh", 0, 0, numeric_nan, 0)
+    if not value.is_finite():
+        raise ValueError("Cannot send {} as numeric".format(value))
+    sign, digits, exponent = value.as_tuple()
+    digit_text = "".join(map(str, digits))
+    if exponent > 0:
+        digit_text += "0" * exponent
+        exponent = 0
+    scale = -exponent
+    if len(digit_text) < scale:
+        digit_text = "0" * (scale - len(digit_text)) + digit_text
+    integer_text = digit_text[:len(digit_text) - scale]
+    fraction_text = digit_text[len(digit_text) - scale:]
+    integer_text = "0" * (-len(integer_text) % 4) + integer_text
+    fraction_text = fraction_text + "0" * (-len(fraction_text) % 4)
+
+    groups = [int(integer_text[i:i + 4]) for i in range(0, len(integer_text), 4)]
+    weight = len(groups) - 1
+    groups += [int(fraction_text[i:i + 4]) for i in range(0, len(fraction_text), 4)]
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+    return struct.pack(">hhHh{}H".format(len(groups)), len(groups), weight,
+                       numeric_negative if sign else numeric_positive, scale, *groups)
+
+def encode_date(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    return struct.pack(">i", (value - postgres_epoch_date).days)
+
+def encode_timestamp(value):
+    """
+    timestamp and timestamptz: microseconds since 2000-01-01; naive values are taken as UTC.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - postgres_epoch
+    return struct.pack(">q", (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+def encode_text(value):
+    return str(value).encode("utf-8")
+
+def encode_boolean(value):
+    return b"\x01" if value else b"\x00"
+
+def vector_encoder(dimensions, dtype=">f4"):
+    """
+    pgvector: int16 dimensions, int16 unused, then the values in network byte order,
+    float32 for vector and float16 (dtype ">f2") for halfvec.
+    """
+    def encode_vector(value):
+        values = np.asarray(value, dtype=dtype)
+        if dimensions > 0 and values.shape != (dimensions,):
+            raise ValueError("Expected a vector of {} dimensions, got shape {}".format(dimensions, values.shape))
+        return struct.pack(">hh", values.shape[0], 0) + values.tobytes()
+    return encode_vector
+
+# Encoders by pg_type.typname
+type_encoders = {
+    "int2": lambda value: struct.pack(">h", int(value)),
+    "int4": lambda value: struct.pack(">i", int(value)),
+    "int8": lambda value: struct.pack(">q", int(value)),
+    "float4": lambda value: struct.pack(">f", value),
+    "float8": lambda value: struct.pack(">d", value),
+    "numeric": encode_numeric,
+    "date": encode_date,
+    "timestamp": encode_timestamp,
+    "timestamptz": encode_timestamp,
+    "bool": encode_boolean,
+    "text": encode_text,
+    "varchar": encode_text,
+    "bpchar": encode_text,
+    "json": encode_text,
+    "jsonb": lambda value: b"\x01" + encode_text(value),
+}
+
+def column_encoder(type_name, type_modifier):
+    if type_name == "vector":
+        return vector_encoder(type_modifier)
+    if type_name == "halfvec":
+        return vector_encoder(type_modifier, ">f2")
+    if type_name not in type_encoders:
+        raise ValueError("Binary COPY does not support columns of type {}".format(type_name))
+    return type_encoders[type_name]
+
+def catalog_column_types(cursor, table_name, columns):
+    """
+    Returns (type name, type modifier) for each of the columns, from the catalog.
+    """
+    cursor.execute("""
+        SELECT a.attname, t.typname, a.atttypmod
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    """, (table_name,))
+    types = {name: (type_name, type_modifier) for name, type_name, type_modifier in cursor.fetchall()}
+    missing = [col for col in columns if col not in types]
+    if missing:
+        raise ValueError("Columns {} not found in {}".format(missing, table_name))
+    return [types[col] for col in columns]
+
+class BinaryCopyWriter:
+    """
+    Writes row batches with one binary COPY ... FROM STDIN per batch.
+    Vector columns take NumPy arrays (or any sequence of floats).
+    """
+    name = "binary_copy"
+
+    def __init__(self, cursor, table_name, columns):
+        self.cursor = cursor
+        self.rows = 0
+        self.copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT binary)").format(
+            sql.Identifier(table_name),
+            sql.SQL(', ').join(map(sql.Identifier, columns))
+        )
+        self.encoders = [
+            column_encoder(type_name, type_modifier)
+            for type_name, type_modifier in catalog_column_types(cursor, table_name, columns)
+        ]
+        self.field_count = struct.pack(">h", len(columns))
+
+    def write(self, rows):
+        buffer = io.BytesIO()
+        buffer.write(copy_header)
+        for row in rows:
+            buffer.write(self.field_count)
+            for encode, value in zip(self.encoders, row):
+                if value is None:
+                    buffer.write(null_field)
+                else:
+                    data = encode(value)
+                    buffer.write(struct.pack(">i", len(data)))
+                    buffer.write(data)
+        buffer.write(copy_trailer)
+        buffer.seek(0)
+        self.cursor.copy_expert(self.copy_query, buffer)
+        self.rows += len(rows)
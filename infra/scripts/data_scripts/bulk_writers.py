@@ -0,0 +1,74 @@
+import io
+import psycopg2.extras
+from psycopg2 import sql
+from binary_copy import BinaryCopyWriter
+
+def copy_text_value(value):
+    """
+    Formats one value for COPY ... FROM STDIN in the default text format.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    text = str(value)
+    if "\\" in text or "\t" in text or "\n" in text or "\r" in text:
+        text = text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return text
+
+class ExecuteValuesWriter:
+    """
+    Writes row batches with multi-row INSERT statements built by psycopg2.extras.execute_values.
+    """
+    name = "execute_values"
+
+    def __init__(self, cursor, table_name, columns, page_size=1000):
+        self.cursor = cursor
+        self.page_size = page_size
+        self.rows = 0
+        self.insert_query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+            sql.Identifier(table_name),
+            sql.SQL(', ').join(map(sql.Identifier, columns))
+        )
+
+    def write(self, rows):
+        psycopg2.extras.execute_values(self.cursor, self.insert_query, rows, page_size=self.page_size)
+        self.rows += len(rows)
+
+class CopyWriter:
+    """
+    Writes row batches with one COPY ... FROM STDIN per batch, in the text format.
+    """
+    name = "copy"
+
+    def __init__(self, cursor, table_name, columns):
+        self.cursor = cursor
+        self.rows = 0
+        self.copy_query = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(table_name),
+            sql.SQL(', ').join(map(sql.Identifier, columns))
+        )
+
+    def write(self, rows):
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(map(copy_text_value, row)))
+            buffer.write("\n")
+        buffer.seek(0)
+        self.cursor.copy_expert(self.copy_query, buffer)
+        self.rows += len(rows)
+
+# Strategies selectable by name, e.g. from a --strategy command line option
+batch_writers = {
+    ExecuteValuesWriter.name: ExecuteValuesWriter,
+    CopyWriter.name: CopyWriter,
+    BinaryCopyWriter.name: BinaryCopyWriter,
+}
+
+def get_batch_writer(strategy, cursor, table_name, columns):
+    """
+    Creates the batch writer registered under `strategy`.
+    """
+    if strategy not in batch_writers:
+        raise ValueError("Unknown load strategy '{}', expected one of {}".format(strategy, sorted(batch_writers)))
+    return batch_writers[strategy](cursor, table_name, columns)
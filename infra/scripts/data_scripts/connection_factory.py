@@ -0,0 +1,189 @@
+"""
+Connections to Azure Database for PostgreSQL with Microsoft Entra ID access tokens.
+
+DefaultAzureCredential probes its whole credential chain the first time it is used, which takes
+seconds, so a process shares one credential (default_credential). TokenProvider keeps the current
+database token and fetches the next one ahead of expiry, in a background thread, so new
+connections never wait for a token and long loads do not run into an expired one. Connections that
+are already open are not affected by token expiry; the token is only checked at login.
+ConnectionFactory passes the current token as the password of every new connection, directly or
+through a connection pool.
+
+A credential is anything with get_token(scope) returning an object with .token and .expires_on
+(seconds since the epoch), so a local fake credential and a local PostgreSQL are enough for tests.
+"""
+import logging
+import os
+import threading
+import time
+import psycopg2
+import psycopg2.pool
+
+logger = logging.getLogger(__name__)
+
+postgres_token_scope = "https://ossrdbms-aad.database.windows.net/.default"
+# Fetch the next token this many seconds before the current one expires
+token_refresh_margin = int(os.environ.get("PSQL_TOKEN_REFRESH_MARGIN", "300"))
+# Wait this long before retrying a failed background refresh
+token_retry_interval = int(os.environ.get("PSQL_TOKEN_RETRY_INTERVAL", "30"))
+# Ask the credential again at most this often; it may keep returning its cached token for a while
+token_min_refresh_interval = int(os.environ.get("PSQL_TOKEN_MIN_REFRESH_INTERVAL", "60"))
+# Azure Database for PostgreSQL requires TLS; PGSSLMODE can relax this for a local server
+default_sslmode = os.environ.get("PGSSLMODE", "require")
+
+_credential = None
+_credential_lock = threading.Lock()
+
+def default_credential():
+    """
+    Returns the DefaultAzureCredential shared by this process, created on first use.
+    """
+    global _credential
+    with _credential_lock:
+        if _credential is None:
+            from azure.identity import DefaultAzureCredential
+            _credential = DefaultAzureCredential()
+        return _credential
+
+class TokenProvider:
+    """
+    Caches an access token and refreshes it refresh_margin seconds before it expires, in a
+    background thread once start() is called, otherwise when token() finds it about to expire.
+    A credential with a shorter refresh window of its own (azure-identity) keeps returning its cached
+    token inside the margin; such a token is used until it expires, and the credential is asked
+    again at most every min_refresh_interval seconds.
+    """
+    def __init__(self, credential=None, scope=postgres_token_scope, refresh_margin=None, retry_interval=None,
+                 min_refresh_interval=None):
+        self.credential = credential
+        self.scope = scope
+        self.refresh_margin = token_refresh_margin if refresh_margin is None else refresh_margin
+        self.retry_interval = token_retry_interval if retry_interval is None else retry_interval
+        self.min_refresh_interval = token_min_refresh_interval if min_refresh_interval is None else min_refresh_interval
+        self.refreshes = 0
+        self._access_token = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _refresh(self):
+        credential = self.credential or default_credential()
+        started = time.perf_counter()
+        access_token = credential.get_token(self.scope)
+        self._access_token = access_token
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+        logger.info("Access token acquired in %.2f s, valid until %s.", time.perf_counter() - started,
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(access_token.expires_on)))
+        return access_token
+
+    def _fresh(self, access_token):
+        if access_token is None:
+            return False
+        if access_token.expires_on - self.refresh_margin > time.time():
+            return True
+        # Already inside the margin when it arrived: good until it expires, asked for again after a pause
+        return access_token.expires_on > time.time() and self._next_refresh_delay() > 0
+
+    def _next_refresh_delay(self):
+        """
+        Seconds until the credential may be asked again, after the last refresh.
+        """
+        return self._refreshed_at + self.min_refresh_interval - time.monotonic()
+
+    def token(self):
+        """
+        Returns a token that is valid for at least refresh_margin more seconds, or, when the
+        credential only hands out one that expires sooner, that token until it expires.
+        """
+        access_token = self._access_token
+        if self._fresh(access_token):
+            return access_token.token
+        with self._lock:
+            if not self._fresh(self._access_token):
+                self._refresh()
+            return self._access_token.token
+
+    def _refresh_ahead(self):
+        while True:
+            access_token = self._access_token
+            delay = 0
+            if access_token is not None:
+                delay = max(access_token.expires_on - self.refresh_margin - time.time(), self._next_refresh_delay())
+            if self._stop.wait(max(delay, 0)):
+                return
+            try:
+                with self._lock:
+                    if not self._fresh(self._access_token):
+                        self._refresh()
+            except Exception as e:
+                logger.warning("Refreshing the access token failed, retrying in %d s: %s", self.retry_interval, e)
+                if self._stop.wait(self.retry_interval):
+                    return
+
+    def start(self):
+        """
+        Fetches the first token now and keeps it fresh in a daemon thread until stop().
+        """
+        self.token()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._refresh_ahead, name="token-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+class TokenConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool whose new connections come from a ConnectionFactory, so each one
+    logs in with the token current at that moment.
+    """
+    def __init__(self, factory, minconn, maxconn):
+        self.factory = factory
+        super().__init__(minconn, maxconn)
+
+    def _connect(self, key=None):
+        conn = self.factory.connect()
+        if key is not None:
+            self._used[key] = conn
+            self._rused[id(conn)] = key
+        else:
+            self._pool.append(conn)
+        return conn
+
+class ConnectionFactory:
+    """
+    Opens connections to one database as one user, with the token of token_provider as the
+    password, or a fixed password (e.g. for local testing) when no token provider is given.
+    Further keyword options are passed to psycopg2.connect.
+    """
+    def __init__(self, host, dbname, user, token_provider=None, password=None, sslmode=None, **options):
+        self.token_provider = token_provider
+        self.options = dict(options, host=host, dbname=dbname, user=user, sslmode=sslmode or default_sslmode)
+        if password is not None:
+            self.options["password"] = password
+
+    def connection_options(self):
+        options = dict(self.options)
+        if self.token_provider is not None:
+            options["password"] = self.token_provider.token()
+        return {key: value for key, value in options.items() if value is not None}
+
+    def connect(self):
+        return psycopg2.connect(**self.connection_options())
+
+    def pool(self, minconn, maxconn):
+        return TokenConnectionPool(self, minconn, maxconn)
+
+def entra_connection_factory(host, dbname, user, credential=None, **options):
+    """
+    ConnectionFactory authenticating with Microsoft Entra ID tokens, refreshed in the background.
+    The token provider is stopped with factory.token_provider.stop().
+    """
+    return ConnectionFactory(host, dbname, user, TokenProvider(credential).start(), **options)
@@ -0,0 +1,82 @@
+from decimal import Decimal
+import pandas as pd
+
+# Columns of the sample tables, in table order
+table_columns = {
+    "products": ['id', 'product_name', 'price', 'category', 'brand', 'product_description'],
+    "customers": ['id', 'first_name', 'last_name', 'gender', 'date_of_birth', 'age', 'email', 'phone', 'post_address', 'membership'],
+    "orders": ['id', 'customer_id', 'product_id', 'quantity', 'total', 'order_date', 'customer_first_name', 'customer_last_name', 'unit_price', 'category', 'brand', 'product_description', 'return_status'],
+}
+
+# Column conversions for the sample tables. Columns that are not listed keep their
+# pandas values (text, int, float), with NaN turned into NULL.
+table_column_types = {
+    "products": {"id": "integer", "price": "numeric"},
+    "customers": {"id": "integer", "date_of_birth": "date", "age": "integer"},
+    "orders": {
+        "id": "integer",
+        "customer_id": "integer",
+        "product_id": "integer",
+        "quantity": "integer",
+        "total": "numeric",
+        "unit_price": "numeric",
+        "order_date": "date",
+        "return_status": "boolean",
+    },
+}
+
+boolean_values = {"true": True, "t": True, "1": True, "false": False, "f": False, "0": False}
+
+def column_values(series, column_type=None):
+    """
+    Converts one DataFrame column into a list of plain Python values ready for psycopg2.
+    The conversion is decided once for the whole column: NaN/NaT become None,
+    numpy scalars become int/float/bool, and dates and numerics are coerced as requested.
+    """
+    missing = series.isna().to_numpy()
+
+    if column_type == "integer":
+        values = pd.to_numeric(series).astype("Int64").to_numpy(dtype=object, na_value=None)
+    elif column_type == "numeric":
+        # Go through the decimal string form so 0.1 stays 0.1 instead of its binary expansion
+        values = [Decimal(text) for text in series.astype(str)]
+    elif column_type == "date":
+        values = pd.to_datetime(series).dt.date.to_numpy(dtype=object)
+    elif column_type == "boolean" and series.dtype == object:
+        values = series.astype(str).str.strip().str.lower().map(boolean_values).to_numpy(dtype=object)
+    elif series.dtype == object or pd.api.types.is_datetime64_any_dtype(series):
+        # Strings stay as they are, pandas Timestamps are datetime subclasses
+        values = series.to_numpy(dtype=object)
+    else:
+        # numpy scalars (numpy.int64, numpy.float64, numpy.bool_) -> Python scalars
+        values = series.to_numpy().tolist()
+
+    if missing.any():
+        return [None if is_missing else value for value, is_missing in zip(values, missing)]
+    return list(values)
+
+def dataframe_to_rows(df, columns, column_types=None):
+    """
+    Turns the given DataFrame columns into a list of row tuples, one column at a time.
+    """
+    column_types = column_types or {}
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise KeyError("Columns {} not found in the data".format(missing))
+    return list(zip(*(column_values(df[col], column_types.get(col)) for col in columns)))
+
+def iter_dataframe_batches(df, columns, column_types=None, batch_rows=50000):
+    """
+    Yields lists of row tuples of at most `batch_rows` rows from an in-memory DataFrame.
+    """
+    for start in range(0, len(df), batch_rows):
+        yield dataframe_to_rows(df.iloc[start:start + batch_rows], columns, column_types)
+
+def iter_csv_batches(csv_file_path, columns, column_types=None, chunksize=50000):
+    """
+    Reads a CSV file chunk by chunk and yields lists of row tuples of at most `chunksize` rows,
+    so peak memory depends on the chunk size and not on the file size.
+    """
+    for chunk in pd.read_csv(csv_file_path, chunksize=chunksize, encoding="utf-8-sig"):
+        chunk.columns = chunk.columns.str.strip()
+        yield dataframe_to_rows(chunk, columns, column_types)
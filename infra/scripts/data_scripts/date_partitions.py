@@ -0,0 +1,187 @@
+"""
+Monthly or yearly range partitions of a table partitioned by a date column (orders by order_date).
+
+Each partition covers one period and is named <table>_pYYYY_MM (month) or <table>_pYYYY (year).
+A <table>_default partition catches rows outside the existing periods; creating the partition for
+such rows later moves them out of the default partition. maintain_partitions() pre-creates the
+upcoming periods and detaches, or drops, the expired ones.
+"""
+import logging
+import re
+from datetime import date
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+partition_intervals = ("month", "year")
+
+range_bound = re.compile(r"FROM \('([^']*)'\) TO \('([^']*)'\)")
+
+def period_start(day, interval):
+    """
+    First day of the month or year containing day.
+    """
+    if interval == "month":
+        return date(day.year, day.month, 1)
+    if interval == "year":
+        return date(day.year, 1, 1)
+    raise ValueError("Unknown partition interval '{}', expected one of {}".format(interval, partition_intervals))
+
+def add_periods(start, interval, count):
+    """
+    Moves a period start count months or years forward (or backward when count is negative).
+    """
+    if interval == "year":
+        return date(start.year + count, 1, 1)
+    months = start.year * 12 + start.month - 1 + count
+    return date(months // 12, months % 12 + 1, 1)
+
+def partition_name(table_name, start, interval):
+    return "{}_p{}".format(table_name, start.strftime("%Y_%m" if interval == "month" else "%Y"))
+
+def default_partition_name(table_name):
+    return "{}_default".format(table_name)
+
+def is_partitioned(cursor, table_name):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", (table_name,))
+    return cursor.fetchone() is not None
+
+def partition_key_columns(cursor, table_name):
+    """
+    Columns of the partition key, in key order.
+    """
+    cursor.execute("""
+        SELECT a.attname
+        FROM pg_partitioned_table p
+        CROSS JOIN unnest(p.partattrs) WITH ORDINALITY AS k(attnum, position)
+        JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = k.attnum
+        WHERE p.partrelid = %s::regclass
+        ORDER BY k.position
+    """, (table_name,))
+    return [row[0] for row in cursor.fetchall()]
+
+def list_partitions(cursor, table_name):
+    """
+    Returns (partition name, lower bound, upper bound) for the range partitions of a table,
+    ordered by lower bound. The default partition is not included.
+    """
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (table_name,))
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = range_bound.search(bound)
+        if match:
+            partitions.append((name, date.fromisoformat(match.group(1)), date.fromisoformat(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def detect_interval(cursor, table_name):
+    """
+    Guesses month or year from the existing partitions; defaults to month.
+    """
+    partitions = list_partitions(cursor, table_name)
+    if partitions and (partitions[0][2] - partitions[0][1]).days > 31:
+        return "year"
+    return "month"
+
+def create_default_partition(cursor, table_name):
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} DEFAULT").format(
+        sql.Identifier(default_partition_name(table_name)), sql.Identifier(table_name)))
+
+def create_partition(cursor, table_name, start, interval):
+    """
+    Creates the partition for the period starting at start unless it exists.
+    Rows of that period already in the default partition are moved into the new partition.
+    Returns the partition name when it was created, None otherwise.
+    """
+    name = partition_name(table_name, start, interval)
+    end = add_periods(start, interval, 1)
+    cursor.execute("SELECT to_regclass(%s)", (name,))
+    if cursor.fetchone()[0] is not None:
+        return None
+
+    column = sql.Identifier(partition_key_columns(cursor, table_name)[0])
+    default_name = default_partition_name(table_name)
+    cursor.execute("SELECT to_regclass(%s)", (default_name,))
+    stray_rows = False
+    if cursor.fetchone()[0] is not None:
+        cursor.execute(sql.SQL("SELECT 1 FROM {} WHERE {col} >= %s AND {col} < %s LIMIT 1").format(
+            sql.Identifier(default_name), col=column), (start, end))
+        stray_rows = cursor.fetchone() is not None
+
+    if not stray_rows:
+        cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(name), sql.Identifier(table_name)), (start, end))
+    else:
+        # A partition cannot be created over rows in the default partition, so move them first
+        cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+            sql.Identifier(name), sql.Identifier(table_name)))
+        cursor.execute(sql.SQL(
+            "WITH moved AS (DELETE FROM {default} WHERE {col} >= %s AND {col} < %s RETURNING *) "
+            "INSERT INTO {partition} SELECT * FROM moved"
+        ).format(default=sql.Identifier(default_name), partition=sql.Identifier(name), col=column), (start, end))
+        logger.info("Moved %d rows from %s into %s.", cursor.rowcount, default_name, name)
+        cursor.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(table_name), sql.Identifier(name)), (start, end))
+    logger.info("Partition %s created for %s to %s.", name, start, end)
+    return name
+
+def ensure_partitions(cursor, table_name, first_day, last_day, interval=None):
+    """
+    Creates the missing partitions for every period between first_day and last_day, inclusive.
+    Returns the names of the partitions created.
+    """
+    interval = interval or detect_interval(cursor, table_name)
+    created = []
+    start = period_start(first_day, interval)
+    while start <= last_day:
+        name = create_partition(cursor, table_name, start, interval)
+        if name:
+            created.append(name)
+        start = add_periods(start, interval, 1)
+    return created
+
+def split_default_partition(cursor, table_name, interval=None):
+    """
+    Creates partitions for the rows that ended up in the default partition and moves them there.
+    Returns the names of the partitions created.
+    """
+    default_name = default_partition_name(table_name)
+    cursor.execute("SELECT to_regclass(%s)", (default_name,))
+    if cursor.fetchone()[0] is None:
+        return []
+    column = sql.Identifier(partition_key_columns(cursor, table_name)[0])
+    cursor.execute(sql.SQL("SELECT min({col}), max({col}) FROM {}").format(sql.Identifier(default_name), col=column))
+    first_day, last_day = cursor.fetchone()
+    if first_day is None:
+        return []
+    return ensure_partitions(cursor, table_name, first_day, last_day, interval)
+
+def maintain_partitions(cursor, table_name, interval=None, ahead=3, retain=None, drop_expired=False, today=None):
+    """
+    Creates the partitions for the current period and the next `ahead` periods. When retain is
+    given, partitions that ended more than `retain` periods before the current one are detached,
+    and dropped as well with drop_expired=True; detached partitions stay as plain tables.
+    Returns the created and the expired partition names.
+    """
+    interval = interval or detect_interval(cursor, table_name)
+    current = period_start(today or date.today(), interval)
+    created = ensure_partitions(cursor, table_name, current, add_periods(current, interval, ahead), interval)
+
+    expired = []
+    if retain is not None:
+        cutoff = add_periods(current, interval, -retain)
+        for name, _, upper in list_partitions(cursor, table_name):
+            if upper > cutoff:
+                continue
+            cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                sql.Identifier(table_name), sql.Identifier(name)))
+            if drop_expired:
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+            expired.append(name)
+        if expired:
+            logger.info("Partitions %s %s.", ", ".join(expired), "dropped" if drop_expired else "detached")
+    return created, expired
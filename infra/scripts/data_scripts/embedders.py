@@ -0,0 +1,83 @@
+"""
+Embedders for the vector_store ingestion pipeline.
+
+An embedder turns a list of texts into a (len(texts), dimensions) float32 array; its embedder_id
+changes whenever the vectors it produces would. HashEmbedder is deterministic and needs no
+service, which is enough for tests and local runs; AzureOpenAIEmbedder calls an Azure OpenAI
+embedding deployment and is only imported when it is selected.
+"""
+import hashlib
+import os
+import re
+import numpy as np
+
+token_pattern = re.compile(r"\w+", re.UNICODE)
+
+class HashEmbedder:
+    """
+    Feature-hashing embedder: every lower-cased word adds +1 or -1 to one of `dimensions` buckets,
+    chosen by a hash of the word, and the result is L2-normalized. Texts sharing words get similar
+    vectors; the same text always gets the same vector.
+    """
+    name = "hash"
+
+    def __init__(self, dimensions=1536):
+        self.dimensions = dimensions
+        # Identifies the vectors this embedder produces, e.g. in the embedding cache
+        self.embedder_id = "{}-{}".format(self.name, dimensions)
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = token_pattern.findall(text.lower())
+            if not tokens:
+                continue
+            hashes = np.array(
+                [int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little") for token in tokens],
+                dtype=np.uint64,
+            )
+            buckets = (hashes % np.uint64(self.dimensions)).astype(np.int64)
+            signs = np.where((hashes >> np.uint64(63)) == 0, 1.0, -1.0).astype(np.float32)
+            np.add.at(vectors[row], buckets, signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+class AzureOpenAIEmbedder:
+    """
+    Calls an Azure OpenAI embedding deployment with a Microsoft Entra ID token.
+    Needs the openai package, AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_EMBEDDING_DEPLOYMENT.
+    """
+    name = "azure_openai"
+
+    def __init__(self, dimensions=1536, endpoint=None, deployment=None, api_version=None):
+        from openai import AzureOpenAI
+        from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+
+        self.dimensions = dimensions
+        self.deployment = deployment or os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"]
+        self.embedder_id = "{}-{}-{}".format(self.name, self.deployment, dimensions)
+        self.client = AzureOpenAI(
+            azure_endpoint=endpoint or os.environ["AZURE_OPENAI_ENDPOINT"],
+            api_version=api_version or os.environ.get("AZURE_OPENAI_API_VERSION", "2024-06-01"),
+            azure_ad_token_provider=get_bearer_token_provider(
+                DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
+            ),
+        )
+
+    def embed(self, texts):
+        response = self.client.embeddings.create(model=self.deployment, input=list(texts))
+        return np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)], dtype=np.float32)
+
+# Embedders selectable by name, e.g. from an --embedder command line option
+embedders = {
+    HashEmbedder.name: HashEmbedder,
+    AzureOpenAIEmbedder.name: AzureOpenAIEmbedder,
+}
+
+def get_embedder(name, **options):
+    """
+    Creates the embedder registered under `name`.
+    """
+    if name not in embedders:
+        raise ValueError("Unknown embedder '{}', expected one of {}".format(name, sorted(embedders)))
+    return embedders[name](**options)
@@ -0,0 +1,128 @@
+"""
+Local embedding cache for vector_store ingestion.
+
+Embeddings are stored in a SQLite file keyed by (embedder id, SHA-256 of the text), so re-ingesting
+unchanged text costs a lookup instead of an embedding call. The cache holds at most max_entries
+embeddings; the least recently used ones are evicted first.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+default_cache_path = os.environ.get(
+    "EMBEDDING_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "pythonapiapp", "embeddings.sqlite")
+)
+default_max_entries = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Size-bounded SQLite store of float32 embeddings. Safe to share between threads.
+    """
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or default_cache_path
+        self.max_entries = default_max_entries if max_entries is None else max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                embedder_id TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (embedder_id, text_hash)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings (last_used)")
+        self._db.commit()
+        self._entries = self._db.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, embedder_id, hashes):
+        """
+        Returns {text hash: vector} for the hashes found, and marks them as recently used.
+        """
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self._db.execute(
+                    "SELECT text_hash, vector FROM embeddings WHERE embedder_id = ? AND text_hash IN ({})".format(
+                        ", ".join("?" * len(part))),
+                    [embedder_id] + list(part),
+                ).fetchall()
+                found.update((row_hash, np.frombuffer(vector, dtype=np.float32)) for row_hash, vector in rows)
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE embedder_id = ? AND text_hash = ?",
+                    [(now, embedder_id, row_hash) for row_hash in found],
+                )
+                self._db.commit()
+        return found
+
+    def put_many(self, embedder_id, items):
+        """
+        Stores (text hash, vector) pairs, then evicts the least recently used entries beyond max_entries.
+        """
+        now = time.time()
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings (embedder_id, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(embedder_id, row_hash, np.asarray(vector, dtype=np.float32).tobytes(), now) for row_hash, vector in items],
+            )
+            self._entries += self._db.total_changes - before
+            if self._entries > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (self._entries - self.max_entries,),
+                )
+                self._entries = self.max_entries
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class CachedEmbedder:
+    """
+    Wraps an embedder: texts found in the cache are not embedded again, and the misses of each
+    call are embedded together in one batch. Counts hits and misses.
+    """
+    def __init__(self, embedder, cache):
+        self.embedder = embedder
+        self.cache = cache
+        self.dimensions = embedder.dimensions
+        self.embedder_id = embedder.embedder_id
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def embed(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.embedder_id, list(set(hashes)))
+        missing = list(dict.fromkeys(row_hash for row_hash in hashes if row_hash not in vectors))
+        if missing:
+            texts_by_hash = dict(zip(hashes, texts))
+            embedded = self.embedder.embed([texts_by_hash[row_hash] for row_hash in missing])
+            self.cache.put_many(self.embedder_id, zip(missing, embedded))
+            vectors.update(zip(missing, embedded))
+        with self._stats_lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return np.array([vectors[row_hash] for row_hash in hashes], dtype=np.float32)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,103 @@
+"""
+Hybrid keyword and vector search over vector_store and products.
+
+Vector search finds text with a similar meaning but can miss exact names like "TrailMaster X4";
+keyword search over the generated tsvector columns (migration 6, GIN indexed) finds those but
+nothing phrased differently. Both retrievals run in one statement, one round trip, and their
+result lists are merged with reciprocal rank fusion: a row scores 1 / (rrf_k + rank) for each
+list it appears in, so rows found by both rise to the top without comparing ts_rank values with
+cosine distances.
+"""
+import logging
+import time
+from psycopg2 import sql
+from vector_storage import nearest_query, set_candidate_count, vector_text
+
+logger = logging.getLogger(__name__)
+
+# Must match the configuration of the generated tsvector columns
+text_search_config = "english"
+
+# What each search target returns and how its keyword and vector results are keyed.
+# Products have no vectors of their own; their descriptions are embedded into vector_store
+# (source 'products'), and the best chunk of each product counts.
+search_targets = {
+    "documents": {
+        "table": "vector_store",
+        "key": "chunk_id",
+        "tsv": "content_tsv",
+        "columns": ["id", "chunk_id", "title", "page_number", "source", "content"],
+        "vector_key": sql.Identifier("chunk_id"),
+        "vector_filter": None,
+    },
+    "products": {
+        "table": "products",
+        "key": "id",
+        "tsv": "search_tsv",
+        "columns": ["id", "product_name", "brand", "category", "price", "product_description"],
+        "vector_key": sql.SQL("(metadata::jsonb ->> 'product_id')::integer"),
+        "vector_filter": sql.SQL("source = 'products'"),
+    },
+}
+
+def hybrid_query(target, storage="vector", dimensions=1536):
+    settings = search_targets[target]
+    return sql.SQL("""
+        WITH keyword AS (
+            SELECT {key} AS key, row_number() OVER (ORDER BY ts_rank_cd({tsv}, query) DESC) AS rank
+            FROM {table}, websearch_to_tsquery(%(config)s, %(text)s) query
+            WHERE {tsv} @@ query
+            ORDER BY rank
+            LIMIT %(limit)s
+        ), semantic AS (
+            SELECT key, row_number() OVER (ORDER BY min(distance)) AS rank
+            FROM ({nearest}) nearest
+            GROUP BY key
+        ), fused AS (
+            SELECT coalesce(keyword.key, semantic.key) AS key,
+                   coalesce(1.0 / (%(rrf_k)s + keyword.rank), 0) + coalesce(1.0 / (%(rrf_k)s + semantic.rank), 0) AS score,
+                   keyword.rank AS keyword_rank,
+                   semantic.rank AS semantic_rank
+            FROM keyword
+            FULL JOIN semantic ON semantic.key = keyword.key
+        )
+        SELECT {columns}, fused.score, fused.keyword_rank, fused.semantic_rank
+        FROM fused
+        JOIN {table} t ON t.{key} = fused.key
+        ORDER BY fused.score DESC, fused.key
+        LIMIT %(k)s
+    """).format(
+        key=sql.Identifier(settings["key"]),
+        tsv=sql.Identifier(settings["tsv"]),
+        table=sql.Identifier(settings["table"]),
+        nearest=nearest_query(storage, "vector_store", "content_vector", settings["vector_key"], dimensions, settings["vector_filter"]),
+        columns=sql.SQL(", ").join(sql.SQL("t.{}").format(sql.Identifier(column)) for column in settings["columns"]),
+    )
+
+def hybrid_search(cursor, query_text, query_vector, target="documents", k=10, candidates=40, rrf_k=60,
+                  storage="vector", rerank_factor=4, dimensions=1536):
+    """
+    Returns the k best rows of the target for the query, as dicts with the target's columns plus
+    score, keyword_rank and semantic_rank (None when not found by that retrieval), and the elapsed
+    milliseconds. Each retrieval contributes its best `candidates` rows to the fusion.
+    query_vector is the embedding of query_text, with the storage of vector_store.
+    """
+    if target not in search_targets:
+        raise ValueError("Unknown search target '{}', expected one of {}".format(target, sorted(search_targets)))
+    started = time.perf_counter()
+    # The HNSW scan stops at hnsw.ef_search rows, before the products filter and the binary re-ranking
+    set_candidate_count(cursor, candidates * rerank_factor)
+    cursor.execute(hybrid_query(target, storage, dimensions), {
+        "config": text_search_config,
+        "text": query_text,
+        "query": query_vector if isinstance(query_vector, str) else vector_text(query_vector),
+        "limit": candidates,
+        "candidates": candidates * rerank_factor,
+        "rrf_k": rrf_k,
+        "k": k,
+    })
+    names = [column.name for column in cursor.description]
+    rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+    elapsed_ms = 1000.0 * (time.perf_counter() - started)
+    logger.debug("Hybrid search of %s for %r: %d rows in %.1f ms.", target, query_text, len(rows), elapsed_ms)
+    return rows, elapsed_ms
@@ -0,0 +1,83 @@
+import logging
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+def stage_table_name(table_name):
+    return "{}_stage".format(table_name)
+
+def delete_missing_rows(cursor, table_name, key="id"):
+    """
+    Deletes the rows of table_name whose key is not in its stage table, which must have been
+    loaded by incremental_load() earlier in the same transaction. Returns the number of rows deleted.
+    """
+    cursor.execute(sql.SQL(
+        "DELETE FROM {target} t WHERE NOT EXISTS (SELECT 1 FROM {stage} s WHERE s.{key} = t.{key})"
+    ).format(target=sql.Identifier(table_name), stage=sql.Identifier(stage_table_name(table_name)), key=sql.Identifier(key)))
+    return cursor.rowcount
+
+def incremental_load(cursor, table_name, columns, load_stage, key="id", delete_missing=True):
+    """
+    Applies a full snapshot of a table as inserts, updates and deletes instead of TRUNCATE and reload.
+
+    The snapshot is loaded into a temporary stage table by load_stage(cursor, stage_table_name).
+    Rows are matched on `key`; a row is only rewritten when the md5 hash of its loaded columns differs,
+    so untouched rows cause no writes, no WAL and no dead tuples, and the table stays readable
+    with its old content until the transaction commits.
+    With delete_missing=False the rows missing from the snapshot are kept, so a table that other
+    tables reference can be loaded before them and cleaned up with delete_missing_rows() after them.
+    Returns a dict with the inserted, updated, deleted and unchanged row counts.
+    """
+    target = sql.Identifier(table_name)
+    stage = sql.Identifier(stage_table_name(table_name))
+    key_column = sql.Identifier(key)
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+
+    def row_hash(alias):
+        return sql.SQL("md5(ROW({})::text)").format(
+            sql.SQL(', ').join(sql.SQL("{}.{}").format(sql.Identifier(alias), sql.Identifier(col)) for col in columns)
+        )
+
+    cursor.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(stage, target))
+    load_stage(cursor, stage_table_name(table_name))
+    cursor.execute(sql.SQL("ANALYZE {}").format(stage))
+
+    cursor.execute(sql.SQL("SELECT {key} FROM {stage} GROUP BY {key} HAVING count(*) > 1 LIMIT 1").format(
+        key=key_column, stage=stage))
+    duplicate = cursor.fetchone()
+    if duplicate is not None:
+        raise ValueError("Duplicate {} {} in the data loaded for {}".format(key, duplicate[0], table_name))
+
+    deleted = delete_missing_rows(cursor, table_name, key) if delete_missing else 0
+
+    cursor.execute(sql.SQL(
+        "UPDATE {target} t SET ({columns}) = ({stage_columns}) FROM {stage} s "
+        "WHERE s.{key} = t.{key} AND {target_hash} <> {stage_hash}"
+    ).format(
+        target=target,
+        stage=stage,
+        key=key_column,
+        columns=column_list,
+        stage_columns=sql.SQL(', ').join(sql.SQL("s.{}").format(sql.Identifier(col)) for col in columns),
+        target_hash=row_hash("t"),
+        stage_hash=row_hash("s"),
+    ))
+    updated = cursor.rowcount
+
+    cursor.execute(sql.SQL(
+        "INSERT INTO {target} ({columns}) SELECT {columns} FROM {stage} s "
+        "WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE t.{key} = s.{key})"
+    ).format(target=target, stage=stage, key=key_column, columns=column_list))
+    inserted = cursor.rowcount
+
+    cursor.execute(sql.SQL("SELECT count(*) FROM {}").format(stage))
+    staged = cursor.fetchone()[0]
+    changes = {
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": deleted,
+        "unchanged": staged - inserted - updated,
+    }
+    logger.info("Incremental load of %s: %d inserted, %d updated, %d deleted, %d unchanged.",
+                table_name, inserted, updated, deleted, changes["unchanged"])
+    return changes
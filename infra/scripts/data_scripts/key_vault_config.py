@@ -0,0 +1,188 @@
+"""
+Configuration values from Azure Key Vault, fetched concurrently and cached.
+
+All secrets a script needs are requested at once with the async SecretClient, so startup waits for
+the slowest request instead of the sum of all of them. Values are kept in memory for ttl seconds
+and, if a cache path and key are given, in an encrypted file (Fernet), so the next process start
+within the ttl needs no Key Vault round trip at all. start() refreshes the values in the
+background before they expire.
+
+The async client needs aiohttp. client_factory(vault_url, credential) can return any object with an
+async get_secret(name) whose result has .value, e.g. a stand-in for a local test vault.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds a fetched secret is used before it is fetched again
+secret_cache_ttl = int(os.environ.get("KEY_VAULT_CACHE_TTL", "3600"))
+# Encrypted on-disk cache, only used when both are set; the key is a Fernet key
+secret_cache_path = os.environ.get("KEY_VAULT_CACHE_PATH")
+secret_cache_key = os.environ.get("KEY_VAULT_CACHE_KEY")
+
+def key_vault_url(key_vault_name):
+    return "https://{}.vault.azure.net/".format(key_vault_name)
+
+class AsyncCredential:
+    """
+    Lets the async SecretClient use a synchronous credential, e.g. the process-wide
+    DefaultAzureCredential of connection_factory, instead of probing a second credential chain.
+    """
+    def __init__(self, credential):
+        self.credential = credential
+
+    async def get_token(self, *scopes, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: self.credential.get_token(*scopes, **kwargs))
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+def default_client_factory(vault_url, credential):
+    from azure.keyvault.secrets.aio import SecretClient
+    return SecretClient(vault_url=vault_url, credential=AsyncCredential(credential))
+
+class SecretFileCache:
+    """
+    Secrets with their fetch times in a Fernet-encrypted JSON file, readable only by the owner.
+    Entries are kept per vault URL, so processes pointing at different vaults can share the file.
+    """
+    def __init__(self, path, key):
+        from cryptography.fernet import Fernet
+        self.path = path
+        self.fernet = Fernet(key.encode("ascii") if isinstance(key, str) else key)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "rb") as f:
+                return json.loads(self.fernet.decrypt(f.read()))
+        except Exception as e:
+            logger.warning("Ignoring the secret cache %s: %s", self.path, e)
+            return {}
+
+    def load(self, vault_url):
+        return self._read().get(vault_url, {})
+
+    def save(self, vault_url, entries):
+        vaults = self._read()
+        vaults[vault_url] = entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary_path = "{}.{}.tmp".format(self.path, os.getpid())
+        descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(self.fernet.encrypt(json.dumps(vaults).encode("utf-8")))
+        os.replace(temporary_path, self.path)
+
+class KeyVaultConfig:
+    """
+    The named secrets of one vault. get() and values() fetch what is missing or older than ttl;
+    all fetches of one refresh run concurrently.
+    """
+    def __init__(self, vault_url, names, credential=None, ttl=None, cache_path=None, cache_key=None, client_factory=None):
+        self.vault_url = vault_url
+        self.names = list(names)
+        self.credential = credential
+        self.ttl = secret_cache_ttl if ttl is None else ttl
+        self.client_factory = client_factory or default_client_factory
+        cache_path = cache_path or secret_cache_path
+        cache_key = cache_key or secret_cache_key
+        self.file_cache = SecretFileCache(cache_path, cache_key) if cache_path and cache_key else None
+        # name -> {"value": ..., "fetched_at": seconds since the epoch}
+        self._entries = self.file_cache.load(vault_url) if self.file_cache else {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _expired(self, name, now):
+        entry = self._entries.get(name)
+        return entry is None or now - entry["fetched_at"] >= self.ttl
+
+    async def _fetch(self, names):
+        credential = self.credential
+        if credential is None:
+            from connection_factory import default_credential
+            credential = default_credential()
+        client = self.client_factory(self.vault_url, credential)
+        try:
+            secrets = await asyncio.gather(*(client.get_secret(name) for name in names))
+        finally:
+            close = getattr(client, "close", None)
+            if close is not None:
+                await close()
+        return [secret.value for secret in secrets]
+
+    def refresh(self, names=None):
+        """
+        Fetches the given secrets (default: all) concurrently and stores them in the caches.
+        """
+        names = list(names or self.names)
+        started = time.perf_counter()
+        values = asyncio.run(self._fetch(names))
+        now = time.time()
+        with self._lock:
+            for name, value in zip(names, values):
+                self._entries[name] = {"value": value, "fetched_at": now}
+            if self.file_cache:
+                self.file_cache.save(self.vault_url, self._entries)
+        logger.info("Fetched %d secrets from %s in %.2f s.", len(names), self.vault_url, time.perf_counter() - started)
+
+    def values(self):
+        """
+        Returns {name: value} for all secrets, fetching only the missing and expired ones.
+        """
+        now = time.time()
+        expired = [name for name in self.names if self._expired(name, now)]
+        if expired:
+            self.refresh(expired)
+        else:
+            logger.info("Using %d cached secrets of %s.", len(self.names), self.vault_url)
+        with self._lock:
+            return {name: self._entries[name]["value"] for name in self.names}
+
+    def get(self, name):
+        if name not in self.names:
+            self.names.append(name)
+        return self.values()[name]
+
+    def _refresh_ahead(self):
+        while True:
+            with self._lock:
+                oldest = min((self._entries[name]["fetched_at"] for name in self.names if name in self._entries), default=0)
+            # Refresh when the oldest value has used 80% of its ttl
+            if self._stop.wait(max(oldest + 0.8 * self.ttl - time.time(), 0)):
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Refreshing the secrets of %s failed: %s", self.vault_url, e)
+                if self._stop.wait(min(60, self.ttl)):
+                    return
+
+    def start(self):
+        """
+        Loads the secrets now and refreshes them in a daemon thread until stop().
+        """
+        self.values()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._refresh_ahead, name="secret-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,278 @@
+"""
+Benchmark of the bulk-load strategies for the products, customers and orders tables.
+
+Every (file, strategy) run loads one CSV file into a fresh copy of the target table
+(load_benchmark_<table>, created LIKE the table that stores the rows, with its defaults, generated
+columns and indexes but without foreign keys and triggers), in one transaction, as the loaders do.
+Runs happen one at a time in a separate process, so each one reports its own peak RSS and client
+CPU time. WAL bytes are the difference of the server's WAL insert position around the run, so
+other write activity on the server is counted too; use an otherwise idle server.
+
+The strategies are the per-row INSERT of generate-orders.py (client mode), psycopg2's
+execute_batch, the batch writers of bulk_writers.py (execute_values, copy, binary) fed by
+iter_csv_batches, and copy_csv, which streams the file itself as run_psql_load_tables_script.py
+does in copy mode.
+"""
+import logging
+import multiprocessing
+import platform
+import queue
+import resource
+import time
+from datetime import datetime, timezone
+import psycopg2
+import psycopg2.extras
+from psycopg2 import sql
+from bulk_writers import batch_writers
+from dataframe_batches import iter_csv_batches, table_columns, table_column_types
+from orders_storage import storage_columns, storage_table
+
+logger = logging.getLogger(__name__)
+
+benchmark_table_prefix = "load_benchmark_"
+
+class ExecuteWriter:
+    """
+    One INSERT statement and round trip per row, as generate-orders.py does in client mode.
+    """
+    name = "execute"
+
+    def __init__(self, cursor, table_name, columns):
+        self.cursor = cursor
+        self.rows = 0
+        self.insert_query = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+            sql.Identifier(table_name),
+            sql.SQL(', ').join(map(sql.Identifier, columns)),
+            sql.SQL(', ').join(sql.Placeholder() * len(columns)),
+        )
+
+    def write(self, rows):
+        for row in rows:
+            self.cursor.execute(self.insert_query, row)
+        self.rows += len(rows)
+
+class ExecuteBatchWriter(ExecuteWriter):
+    """
+    The per-row INSERT, sent page_size statements per round trip by psycopg2.extras.execute_batch.
+    """
+    name = "execute_batch"
+
+    def __init__(self, cursor, table_name, columns, page_size=1000):
+        super().__init__(cursor, table_name, columns)
+        self.page_size = page_size
+
+    def write(self, rows):
+        psycopg2.extras.execute_batch(self.cursor, self.insert_query, rows, page_size=self.page_size)
+        self.rows += len(rows)
+
+# Strategies by name; None streams the CSV file with COPY instead of writing row batches
+load_strategies = dict(
+    [(ExecuteWriter.name, ExecuteWriter), (ExecuteBatchWriter.name, ExecuteBatchWriter)] +
+    list(batch_writers.items()) +
+    [("copy_csv", None)]
+)
+
+# Files with more rows than this are skipped for the strategy, unless the limits are turned off
+strategy_row_limits = {
+    ExecuteWriter.name: 100000,
+    ExecuteBatchWriter.name: 1000000,
+}
+
+def benchmark_table_name(table_name):
+    return benchmark_table_prefix + table_name
+
+def create_benchmark_table(cursor, table_name):
+    """
+    (Re)creates the benchmark copy of table_name. Returns its name and the columns to load.
+    """
+    target = storage_table(cursor, table_name)
+    bench_name = benchmark_table_name(table_name)
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(bench_name)))
+    cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING ALL)").format(sql.Identifier(bench_name), sql.Identifier(target)))
+    return bench_name, storage_columns(target, table_columns[table_name])
+
+def wal_insert_position(cursor):
+    cursor.execute("SELECT pg_current_wal_insert_lsn()")
+    return cursor.fetchone()[0]
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB. VmHWM is used where /proc has it, because
+    ru_maxrss survives exec on Linux and would report the peak of the parent process.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1048576.0 if platform.system() == "Darwin" else 1024.0)
+
+def run_strategy(connection_options, strategy, table_name, bench_name, csv_path, columns, batch_rows, results):
+    """
+    Loads csv_path into bench_name with one strategy and commits; runs in its own process and
+    puts the measurements on the results queue.
+    """
+    try:
+        # Imported before measuring, and for every strategy, so that all of them start from the same baseline
+        from run_psql_load_tables_script import copy_table_from_csv
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        rss_before = peak_rss_mb()
+        conn = psycopg2.connect(**connection_options)
+        started = time.perf_counter()
+        with conn.cursor() as cursor:
+            if load_strategies[strategy] is None:
+                copy_table_from_csv(cursor, bench_name, csv_path, columns)
+            else:
+                writer = load_strategies[strategy](cursor, bench_name, columns)
+                for rows in iter_csv_batches(csv_path, columns, table_column_types.get(table_name), batch_rows):
+                    writer.write(rows)
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        conn.close()
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        results.put({
+            "seconds": elapsed,
+            "cpu_seconds": (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime),
+            "peak_rss_mb": peak_rss_mb(),
+            "rss_growth_mb": peak_rss_mb() - rss_before,
+        })
+    except Exception as e:
+        results.put({"error": str(e)})
+
+def wait_for_result(process, results, poll_seconds=1):
+    """
+    Waits for the result of a run_strategy process. A process that died without one, e.g. killed
+    by the OOM killer during a large per-row run, raises RuntimeError instead of blocking forever.
+    """
+    while True:
+        try:
+            return results.get(timeout=poll_seconds)
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # The result may have arrived just before the process exited
+        try:
+            return results.get(timeout=poll_seconds)
+        except queue.Empty:
+            raise RuntimeError("Benchmark process exited with code {} without a result".format(process.exitcode))
+
+def benchmark_file(connection_options, strategy, table_name, csv_path, rows, batch_rows=10000, keep_table=False):
+    """
+    One measured run of a strategy over one file. Returns a result dict.
+    """
+    conn = psycopg2.connect(**connection_options)
+    try:
+        with conn.cursor() as cursor:
+            bench_name, columns = create_benchmark_table(cursor, table_name)
+        conn.commit()
+        with conn.cursor() as cursor:
+            wal_before = wal_insert_position(cursor)
+        conn.commit()
+
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(target=run_strategy, args=(
+            connection_options, strategy, table_name, bench_name, csv_path, columns, batch_rows, results))
+        process.start()
+        measured = wait_for_result(process, results)
+        process.join()
+        if "error" in measured:
+            raise RuntimeError("{} load of {} failed: {}".format(strategy, table_name, measured["error"]))
+
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s), pg_total_relation_size(%s)",
+                           (wal_before, bench_name))
+            wal_bytes, table_bytes = cursor.fetchone()
+            wal_bytes = int(wal_bytes)
+            cursor.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(bench_name)))
+            loaded = cursor.fetchone()[0]
+            if not keep_table:
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(bench_name)))
+        conn.commit()
+    finally:
+        conn.close()
+
+    if loaded != rows:
+        raise RuntimeError("{} loaded {} of {} rows into {}".format(strategy, loaded, rows, table_name))
+    result = {
+        "table": table_name,
+        "rows": rows,
+        "strategy": strategy,
+        "seconds": round(measured["seconds"], 3),
+        "rows_per_sec": round(rows / max(measured["seconds"], 1e-9), 1),
+        "cpu_seconds": round(measured["cpu_seconds"], 3),
+        "peak_rss_mb": round(measured["peak_rss_mb"], 1),
+        "rss_growth_mb": round(measured["rss_growth_mb"], 1),
+        "wal_bytes": wal_bytes,
+        "wal_bytes_per_row": round(float(wal_bytes) / max(rows, 1), 1),
+        "table_bytes": table_bytes,
+    }
+    logger.info("%s %d rows with %s: %.2f s (%.0f rows/sec), %.2f s client CPU, %.0f MB peak RSS, %.1f MB WAL.",
+                table_name, rows, strategy, result["seconds"], result["rows_per_sec"], result["cpu_seconds"],
+                result["peak_rss_mb"], wal_bytes / 1048576.0)
+    return result
+
+def run_benchmark(connection_options, datasets, strategies=None, batch_rows=10000, row_limits=True, keep_table=False):
+    """
+    Runs every strategy over every file of datasets, a list of {table: (CSV path, rows)}.
+    Returns a dict of settings, environment, results and skipped runs, ready to be written as JSON.
+    """
+    strategies = list(strategies or load_strategies)
+    unknown = [strategy for strategy in strategies if strategy not in load_strategies]
+    if unknown:
+        raise ValueError("Unknown load strategies {}, expected some of {}".format(unknown, sorted(load_strategies)))
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    conn = psycopg2.connect(**connection_options)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW server_version")
+            server_version = cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+    results = []
+    skipped = []
+    for files in datasets:
+        for table_name, (csv_path, rows) in files.items():
+            for strategy in strategies:
+                limit = strategy_row_limits.get(strategy) if row_limits else None
+                if limit is not None and rows > limit:
+                    logger.info("Skipping %s for %d %s rows (limit %d).", strategy, rows, table_name, limit)
+                    skipped.append({"table": table_name, "rows": rows, "strategy": strategy})
+                    continue
+                results.append(benchmark_file(connection_options, strategy, table_name, csv_path, rows, batch_rows, keep_table))
+
+    return {
+        "started_at": started_at,
+        "settings": {
+            "strategies": strategies,
+            "batch_rows": batch_rows,
+            "row_limits": strategy_row_limits if row_limits else None,
+        },
+        "environment": {
+            "postgres": server_version,
+            "python": platform.python_version(),
+            "psycopg2": psycopg2.__version__.split(" ")[0],
+            "machine": platform.machine(),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+def find_regressions(report, baseline, tolerance=0.2):
+    """
+    Results whose rows/sec fell more than tolerance (a fraction) below the baseline report's
+    result for the same table, rows and strategy. Returns (result, baseline rows/sec) pairs.
+    """
+    expected = {(result["table"], result["rows"], result["strategy"]): result["rows_per_sec"] for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        baseline_rate = expected.get((result["table"], result["rows"], result["strategy"]))
+        if baseline_rate and result["rows_per_sec"] < baseline_rate * (1 - tolerance):
+            regressions.append((result, baseline_rate))
+    return regressions
@@ -0,0 +1,115 @@
+"""
+Narrow storage of orders behind a compatibility view.
+
+The wide orders table copies customer and product attributes, including the full product
+description, into every order row. In narrow storage the rows live in order_lines, which keeps only
+the keys, quantity, prices, order date and return status, and orders becomes a view joining
+order_lines with customers and products in the column order of the wide table, so readers of
+orders keep working. The view shows the current customer and product attributes rather than the
+copies taken when the order was written; unit_price and total stay as they were ordered.
+
+Loaders write to storage_table(cursor, "orders") with storage_columns() of their column list,
+which works for both storages. convert_to_narrow() switches an existing database.
+"""
+import logging
+import os
+from psycopg2 import sql
+from date_partitions import default_partition_name, list_partitions
+
+logger = logging.getLogger(__name__)
+
+# "wide" keeps orders as a table; "narrow" stores order_lines and turns orders into a view
+orders_storage = os.environ.get("PSQL_ORDERS_STORAGE", "wide")
+
+order_lines_table = "order_lines"
+order_lines_columns = ["id", "customer_id", "product_id", "quantity", "unit_price", "total", "order_date", "return_status"]
+
+# Columns of the wide table that the view takes from customers and products
+denormalized_order_columns = [
+    "customer_first_name", "customer_last_name", "customer_gender", "customer_age", "customer_email",
+    "customer_phone", "product_name", "category", "brand", "product_description",
+]
+
+orders_view_sql = """
+CREATE OR REPLACE VIEW orders AS
+SELECT
+    o.id,
+    o.customer_id,
+    c.first_name AS customer_first_name,
+    c.last_name AS customer_last_name,
+    c.gender AS customer_gender,
+    c.age AS customer_age,
+    c.email AS customer_email,
+    c.phone AS customer_phone,
+    o.order_date,
+    o.product_id,
+    p.product_name,
+    o.quantity,
+    o.unit_price,
+    o.total,
+    p.category,
+    p.brand,
+    p.product_description,
+    o.return_status
+FROM order_lines o
+LEFT JOIN customers c ON c.id = o.customer_id
+LEFT JOIN products p ON p.id = o.product_id
+"""
+
+def narrow_orders(cursor):
+    """
+    True when orders is the compatibility view over order_lines.
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('orders')")
+    row = cursor.fetchone()
+    return row is not None and row[0] == "v"
+
+def storage_table(cursor, table_name):
+    """
+    Table that holds the rows of table_name: order_lines for orders in narrow storage, else table_name.
+    """
+    if table_name == "orders" and narrow_orders(cursor):
+        return order_lines_table
+    return table_name
+
+def logical_table_name(table_name):
+    """
+    Inverse of storage_table(): the name readers use for a storage table.
+    """
+    return "orders" if table_name == order_lines_table else table_name
+
+def storage_columns(table_name, columns):
+    """
+    The columns of a load that its storage table has.
+    """
+    if table_name == order_lines_table:
+        return [column for column in columns if column in order_lines_columns]
+    return list(columns)
+
+def convert_to_narrow(cursor, storage=None):
+    """
+    Renames the wide orders table (and its partitions) to order_lines, drops the denormalized
+    columns and creates the orders view, when storage (default: PSQL_ORDERS_STORAGE) is "narrow".
+    Keys, indexes and foreign keys move along with the table. Dropping columns does not rewrite
+    the table; the space is reclaimed by the next full reload or VACUUM FULL.
+    Returns True when the table was converted.
+    """
+    if (storage or orders_storage) != "narrow" or narrow_orders(cursor):
+        return False
+    cursor.execute("SELECT to_regclass('orders') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return False
+
+    cursor.execute(sql.SQL("ALTER TABLE orders RENAME TO {}").format(sql.Identifier(order_lines_table)))
+    partitions = [name for name, _, _ in list_partitions(cursor, order_lines_table)] + [default_partition_name("orders")]
+    for name in partitions:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cursor.fetchone()[0] and name.startswith("orders_"):
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                sql.Identifier(name), sql.Identifier(order_lines_table + name[len("orders"):])))
+    cursor.execute(sql.SQL("ALTER TABLE {} {}").format(
+        sql.Identifier(order_lines_table),
+        sql.SQL(", ").join(sql.SQL("DROP COLUMN IF EXISTS {}").format(sql.Identifier(column)) for column in denormalized_order_columns)))
+    cursor.execute(orders_view_sql)
+    logger.info("orders converted to narrow storage: rows in %s, orders is a view.", order_lines_table)
+    return True
@@ -1,11 +1,23 @@
-from azure.identity import DefaultAzureCredential
-import psycopg2
-import psycopg2.extras
 from psycopg2 import sql
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import io
 import os
-import pandas as pd
 import logging
 import sys  # Added import
+import uuid
+import pandas as pd
+import psycopg2
+from dataframe_batches import iter_csv_batches, table_column_types
+from bulk_writers import ExecuteValuesWriter
+from binary_copy import BinaryCopyWriter
+from incremental_load import delete_missing_rows, incremental_load
+import shadow_load
+from schema_indexes import create_constraints_and_indexes, drop_constraints_and_indexes, foreign_keys
+from date_partitions import ensure_partitions, is_partitioned, partition_key_columns
+from connection_factory import entra_connection_factory
+from orders_storage import logical_table_name, storage_columns, storage_table
+from sales_rollups import apply_rollup_deltas, rebuild_rollups, rollups_installed
 
 # Configuration parameters
 key_vault_name = "key_vault_name_place_holder"
@@ -15,6 +27,38 @@ identity_name = "identity_name_place_holder"
 database_name = "database_name_place_holder"
 basrUrl = "basrUrl_place_holder"
 
+# Loader mode: "copy" streams the CSV files with COPY ... FROM STDIN, "insert" uses execute_values,
+# "binary" converts the rows in Python and sends them with binary COPY, so the server parses no text
+load_mode = os.environ.get("PSQL_LOAD_MODE", "copy")
+# Batch writers of the load modes that convert the CSV rows in Python
+load_mode_writers = {
+    "insert": ExecuteValuesWriter,
+    "binary": BinaryCopyWriter,
+}
+# Number of bytes handed to the server per COPY round trip
+copy_buffer_size = 1024 * 1024
+# How tables are refreshed: "truncate" empties and reloads them, "incremental" stages the files
+# and applies only the inserted, changed and deleted rows (matched on id), "shadow" loads an
+# unlogged copy of each table and swaps it in with a rename, keeping the previous version as <table>_old
+# (shadow loads do not support range-partitioned tables)
+refresh_mode = os.environ.get("PSQL_REFRESH_MODE", "truncate")
+# Number of CSV rows converted and sent per execute_values batch in insert mode
+csv_chunk_rows = int(os.environ.get("PSQL_CSV_CHUNK_ROWS", "50000"))
+# Number of pooled connections loading tables at the same time (1 loads one table after another)
+load_workers = int(os.environ.get("PSQL_LOAD_WORKERS", "4"))
+# Number of file-chunk partitions the orders CSV is split into and loaded in parallel (copy mode only)
+orders_partitions = int(os.environ.get("PSQL_ORDERS_PARTITIONS", str(load_workers)))
+
+# Tables loaded by main(): (table name, CSV path relative to basrUrl, columns)
+table_csv_files = [
+    ('products', 'data/postgresql_db_sample_data/products.csv',
+        ['id', 'product_name', 'price', 'category', 'brand', 'product_description']),
+    ('customers', 'data/postgresql_db_sample_data/customers.csv',
+        ['id', 'first_name', 'last_name', 'gender', 'date_of_birth', 'age', 'email', 'phone', 'post_address', 'membership']),
+    ('orders', 'data/postgresql_db_sample_data/orders.csv',
+        ['id', 'customer_id', 'product_id', 'quantity', 'total', 'order_date', 'customer_first_name', 'customer_last_name', 'unit_price', 'category', 'brand', 'product_description', 'return_status']),
+]
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
 
@@ -28,86 +72,440 @@ def truncate_tables(cursor, tables):
         cursor.execute(sql.SQL("TRUNCATE TABLE {}").format(sql.Identifier(table)))
     logger.info("Tables truncated: %s", ", ".join(tables))
 
-def load_table_from_csv(cursor, table_name, csv_file_path, columns):
+class CsvColumnProjection:
     """
-    Loads data from a CSV file into a specified PostgreSQL table.
+    File-like wrapper that re-emits only the requested CSV columns, in order, for COPY FROM STDIN.
+    Used when the CSV header does not already match the target column list.
+    """
+    def __init__(self, csv_file, positions):
+        self._reader = csv.reader(csv_file)
+        self._positions = positions
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+
+    def read(self, size=-1):
+        while size < 0 or self._buffer.tell() < size:
+            row = next(self._reader, None)
+            if row is None:
+                break
+            self._writer.writerow([row[i] for i in self._positions])
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+class CsvByteRange(io.RawIOBase):
+    """
+    Read-only view of the bytes between two offsets of an open binary file.
     """
-    df = pd.read_csv(csv_file_path)
-    df.columns = df.columns.str.strip()
-    rows = [tuple(row[col] for col in columns) for index, row in df.iterrows()]
-    insert_query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+    def __init__(self, raw_file, start, end=None):
+        self._raw_file = raw_file
+        self._remaining = None if end is None else end - start
+        raw_file.seek(start)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = len(buffer) if self._remaining is None else min(len(buffer), self._remaining)
+        data = self._raw_file.read(size)
+        buffer[:len(data)] = data
+        if self._remaining is not None:
+            self._remaining -= len(data)
+        return len(data)
+
+def csv_file_partitions(csv_file_path, partitions):
+    """
+    Splits a CSV file into byte ranges aligned to line starts, skipping the header.
+    Assumes that quoted values do not contain line breaks, which holds for the generated data files.
+    """
+    file_size = os.path.getsize(csv_file_path)
+    with open(csv_file_path, "rb") as raw_file:
+        raw_file.readline()
+        boundaries = [raw_file.tell()]
+        data_size = file_size - boundaries[0]
+        for index in range(1, max(partitions, 1)):
+            raw_file.seek(boundaries[0] + index * data_size // partitions)
+            raw_file.readline()
+            if boundaries[-1] < raw_file.tell() < file_size:
+                boundaries.append(raw_file.tell())
+    boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def copy_table_from_csv(cursor, table_name, csv_file_path, columns, byte_range=None):
+    """
+    Streams a CSV file into a PostgreSQL table with COPY ... FROM STDIN.
+    Memory use is bounded by copy_buffer_size regardless of the file size.
+    When byte_range is given, only the rows inside (start, end) are copied.
+    """
+    copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
         sql.Identifier(table_name),
         sql.SQL(', ').join(map(sql.Identifier, columns))
     )
-    psycopg2.extras.execute_values(cursor, insert_query, rows)
+    with open(csv_file_path, "rb") as raw_file:
+        header_line = raw_file.readline().decode("utf-8-sig")
+        header = [name.strip() for name in next(csv.reader([header_line]))]
+        missing = [col for col in columns if col not in header]
+        if missing:
+            raise ValueError("Columns {} not found in {}".format(missing, csv_file_path))
+
+        start, end = byte_range or (raw_file.tell(), None)
+        source = io.BufferedReader(CsvByteRange(raw_file, start, end), buffer_size=copy_buffer_size)
+        if header != list(columns):
+            text_source = io.TextIOWrapper(source, encoding="utf-8", newline="")
+            source = CsvColumnProjection(text_source, [header.index(col) for col in columns])
+        cursor.copy_expert(copy_query, source, size=copy_buffer_size)
+    logger.info("Data copied into %s table (%s rows).", table_name, cursor.rowcount)
+
+def source_table_name(table_name):
+    """
+    Name of the table that a stage or shadow table is loaded for, as readers know it
+    (orders for order_lines).
+    """
+    for suffix in ("_stage", shadow_load.shadow_suffix):
+        if table_name.endswith(suffix):
+            table_name = table_name[:-len(suffix)]
+            break
+    return logical_table_name(table_name)
+
+def load_table_from_csv(cursor, table_name, csv_file_path, columns, mode=None, byte_range=None):
+    """
+    Loads data from a CSV file into a specified PostgreSQL table.
+    """
+    if (mode or load_mode) == "copy":
+        copy_table_from_csv(cursor, table_name, csv_file_path, columns, byte_range)
+        return
+    if byte_range is not None:
+        raise ValueError("Partitioned loads require the copy load mode")
+
+    writer = load_mode_writers[mode or load_mode](cursor, table_name, columns)
+    column_types = table_column_types.get(source_table_name(table_name))
+    for rows in iter_csv_batches(csv_file_path, columns, column_types, csv_chunk_rows):
+        writer.write(rows)
     logger.info("Data loaded into %s table.", table_name)
 
-def main():
+def csv_date_range(csv_file_path, column):
+    """
+    Returns the first and last date found in one column of a CSV file, or (None, None) if there are none.
+    """
+    first_day = last_day = None
+    for chunk in pd.read_csv(csv_file_path, usecols=[column], chunksize=csv_chunk_rows * 10, encoding="utf-8-sig"):
+        dates = pd.to_datetime(chunk[column], errors="coerce").dropna()
+        if dates.empty:
+            continue
+        first_day = min(first_day, dates.min().date()) if first_day else dates.min().date()
+        last_day = max(last_day, dates.max().date()) if last_day else dates.max().date()
+    return first_day, last_day
+
+def prepare_table_partitions(cursor, table_name, csv_file_path):
+    """
+    Creates the partitions a range-partitioned table needs for the dates in its CSV file,
+    so COPY routes every row straight into its partition rather than the default one.
+    """
+    if not is_partitioned(cursor, table_name):
+        return
+    first_day, last_day = csv_date_range(csv_file_path, partition_key_columns(cursor, table_name)[0])
+    if first_day is not None:
+        created = ensure_partitions(cursor, table_name, first_day, last_day)
+        logger.info("Partitions of %s table ready for %s to %s (%d created).", table_name, first_day, last_day, len(created))
+
+def analyze_partitioned_table(cursor, table_name):
+    """
+    Autovacuum analyzes the partitions but never the partitioned parent, whose statistics the planner
+    uses for queries spanning several partitions.
+    """
+    if is_partitioned(cursor, table_name):
+        cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table_name)))
+
+def load_partition(pool, table_name, csv_file_path, columns, byte_range, xid=None):
+    """
+    Loads one partition of a table on its own pooled connection.
+    The transaction is left open and the connection returned, so the caller can commit
+    or roll back all partitions of the table together. With an xid the transaction is
+    a two-phase one, see finish_table_load().
+    """
+    conn = pool.getconn()
     try:
-        # Acquire the access token
-        logger.info("Acquiring access token...")
-        cred = DefaultAzureCredential()
-        access_token = cred.get_token("https://ossrdbms-aad.database.windows.net/.default")
-        logger.info("Access token acquired.")
-        #password = access_token.token
-      
-        # Combine the token with the connection string to establish the connection.
-        logger.info("Establishing database connection...")
-        conn_string = (
-            "host={0} user={1} dbname={2} password={3} sslmode=require".format(
-                host_name, identity_name, database_name, access_token.token
-            )
-        )
-        
-        conn = psycopg2.connect(conn_string)
-        cursor = conn.cursor()
-        logger.info("Database connection established.")
+        if xid is not None:
+            conn.tpc_begin(xid)
+        with conn.cursor() as cursor:
+            load_table_from_csv(cursor, table_name, csv_file_path, columns, byte_range=byte_range)
+        return conn
+    except Exception:
+        if xid is not None:
+            conn.tpc_rollback()
+        else:
+            conn.rollback()
+        pool.putconn(conn)
+        raise
 
-        try:
-        # Truncate the tables
-            truncate_tables(cursor, ["products", "customers", "orders"])
-            conn.commit()
-        except Exception as e:
-            logger.error("An error occurred while truncating tables: %s", e)
-            conn.rollback() # Rollback the transaction in case of error
+def run_in_transaction(pool, func, *args):
+    """
+    Runs func(cursor, *args) on a pooled connection and commits, or rolls back and re-raises.
+    """
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            result = func(cursor, *args)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback() # Rollback the transaction in case of error
+        raise
+    finally:
+        pool.putconn(conn)
 
-        try:
-        # Load data into the products table
-            csv_file_path_products = os.path.join(basrUrl, 'data/postgresql_db_sample_data/products.csv')
-            load_table_from_csv(cursor, 'products', csv_file_path_products, 
-                ['id', 'product_name', 'price', 'category', 'brand', 'product_description'])
-            conn.commit()
-        except Exception as e:
-            logger.error("An error occurred while loading products table: %s", e)
-            conn.rollback() # Rollback the transaction in case of error
+def prepared_transaction_slots(cursor):
+    """
+    Number of transactions the server can hold prepared at once (0 disables two-phase commit).
+    """
+    cursor.execute("SHOW max_prepared_transactions")
+    return int(cursor.fetchone()[0])
 
+def partition_xids(table_name, partitions):
+    """
+    Global transaction ids for the two-phase transactions of one partitioned table load.
+    """
+    load_id = uuid.uuid4().hex[:12]
+    return ["{}_load_{}_{}".format(table_name, load_id, index) for index in range(partitions)]
+
+def resolve_prepared(pool, xid, commit):
+    """
+    Commits or rolls back a prepared transaction from a fresh pooled connection, e.g. after
+    the connection that prepared it was lost.
+    """
+    conn = pool.getconn()
+    try:
+        if commit:
+            conn.tpc_commit(xid)
+        else:
+            conn.tpc_rollback(xid)
+    finally:
+        pool.putconn(conn)
+
+def finish_table_load(pool, table_name, futures, xids=None):
+    """
+    Waits for all partitions of a table, then commits them if every partition succeeded
+    and rolls all of them back otherwise. Returns True when the table was committed.
+
+    With xids (one per partition) the partitions are two-phase transactions: all of them are
+    prepared first, and only then committed. A prepared transaction survives a lost connection,
+    so once every partition is prepared the table is committed as a whole, retrying a failed
+    COMMIT PREPARED from another connection. Without xids the partitions commit one after
+    another, and a commit failing part way (e.g. on a dropped connection) leaves the earlier
+    partitions committed and the table partially loaded.
+    """
+    conns = []
+    error = None
+    for future in futures:
         try:
-        # Load data into the customers table
-            csv_file_path_customers = os.path.join(basrUrl, 'data/postgresql_db_sample_data/customers.csv')
-            load_table_from_csv(cursor, 'customers', csv_file_path_customers, 
-                ['id', 'first_name', 'last_name', 'gender', 'date_of_birth', 'age', 'email', 'phone', 'post_address', 'membership'])
-            conn.commit()
+            conns.append(future.result())
         except Exception as e:
-            logger.error("An error occurred while loading customers table: %s", e)
-            conn.rollback() # Rollback the transaction in case of error
-        
+            error = error or e
+    prepared = []
+    try:
+        if error is None and xids:
+            try:
+                for conn, xid in zip(conns, xids):
+                    conn.tpc_prepare()
+                    prepared.append(xid)
+            except Exception as e:
+                error = e
+        if error is None:
+            if xids:
+                for conn, xid in zip(conns, xids):
+                    try:
+                        conn.tpc_commit()
+                    except psycopg2.Error as e:
+                        logger.warning("Committing prepared transaction %s again after: %s", xid, e)
+                        resolve_prepared(pool, xid, commit=True)
+            else:
+                for conn in conns:
+                    conn.commit()
+            logger.info("Committed %s table (%d partitions).", table_name, len(futures))
+        else:
+            logger.error("An error occurred while loading %s table: %s", table_name, error)
+            for conn, xid in zip(conns, xids or [None] * len(conns)):
+                try:
+                    if xid is None:
+                        conn.rollback() # Rollback the transaction in case of error
+                    elif xid in prepared and conn.closed:
+                        resolve_prepared(pool, xid, commit=False)
+                    else:
+                        conn.tpc_rollback()
+                except psycopg2.Error as e:
+                    logger.error("Could not roll back %s, see pg_prepared_xacts: %s", xid or table_name, e)
+    finally:
+        for conn in conns:
+            pool.putconn(conn)
+    return error is None
+
+def load_tables_incrementally(cursor, tables, dependent_tables):
+    """
+    Applies the files of the given (table name, CSV path, columns) entries as incremental loads in
+    one transaction, in the order the foreign keys need: the referenced tables get their inserts and
+    updates first, then the dependent tables (dependent_tables) their full diff, and only then do the
+    referenced tables lose the rows missing from their files, once no order points at them any more.
+    """
+    def load_stage(csv_file_path, columns):
+        return lambda stage_cursor, stage_table: load_table_from_csv(stage_cursor, stage_table, csv_file_path, columns)
+
+    referenced = [table for table in tables if table[0] not in dependent_tables]
+    for table_name, csv_file_path, columns in referenced:
+        incremental_load(cursor, table_name, columns, load_stage(csv_file_path, columns), delete_missing=False)
+    for table_name, csv_file_path, columns in tables:
+        if table_name in dependent_tables:
+            incremental_load(cursor, table_name, columns, load_stage(csv_file_path, columns))
+    for table_name, _, _ in referenced:
+        logger.info("Incremental load of %s: %d deleted.", table_name, delete_missing_rows(cursor, table_name))
+
+def swap_in_shadow_table(pool, table_name):
+    """
+    Indexes, analyzes and logs a loaded shadow table, then swaps it in with a short rename transaction.
+    """
+    try:
+        run_in_transaction(pool, shadow_load.finalize_shadow_table, table_name)
+        foreign_keys = run_in_transaction(pool, shadow_load.swap_in_shadow_table, table_name)
+    except Exception as e:
+        logger.error("An error occurred while swapping in %s table: %s", table_name, e)
+        run_in_transaction(pool, shadow_load.drop_shadow_table, table_name)
+        return
+    try:
+        run_in_transaction(pool, shadow_load.validate_foreign_keys, foreign_keys)
+    except Exception as e:
+        logger.error("Foreign keys referencing %s table are not valid: %s", table_name, e)
+
+def load_tables(pool, tables, workers, partitions_per_table):
+    """
+    Loads the given (table name, CSV path, columns) entries on up to `workers` pooled connections.
+    Tables listed in partitions_per_table are split into that many file-chunk partitions, loaded in
+    two-phase transactions when the server allows enough prepared transactions.
+    Each table is committed or rolled back as a unit, independently of the other tables.
+    In shadow refresh mode the data goes into <table>_shadow, which is swapped in once committed.
+    """
+    slots = None
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        submitted = []
+        for table_name, csv_file_path, columns in tables:
+            target_name = table_name
+            if refresh_mode == "shadow":
+                try:
+                    target_name = run_in_transaction(pool, shadow_load.prepare_shadow_table, table_name)
+                except Exception as e:
+                    logger.error("An error occurred while preparing the shadow of %s table: %s", table_name, e)
+                    continue
+
+            partitions = partitions_per_table.get(table_name, 1)
+            if partitions > 1 and load_mode == "copy":
+                byte_ranges = csv_file_partitions(csv_file_path, partitions)
+            else:
+                byte_ranges = [None]
+            xids = None
+            if len(byte_ranges) > 1:
+                if slots is None:
+                    slots = run_in_transaction(pool, prepared_transaction_slots)
+                if slots >= len(byte_ranges):
+                    xids = partition_xids(target_name, len(byte_ranges))
+                else:
+                    logger.warning("max_prepared_transactions is %d, so the %d partitions of %s table commit one after another.",
+                                   slots, len(byte_ranges), target_name)
+            futures = [
+                executor.submit(load_partition, pool, target_name, csv_file_path, columns, byte_range, xid)
+                for byte_range, xid in zip(byte_ranges, xids or [None] * len(byte_ranges))
+            ]
+            submitted.append((table_name, target_name, futures, xids))
+
+        for table_name, target_name, futures, xids in submitted:
+            committed = finish_table_load(pool, target_name, futures, xids)
+            if refresh_mode == "shadow":
+                if committed:
+                    swap_in_shadow_table(pool, table_name)
+                else:
+                    run_in_transaction(pool, shadow_load.drop_shadow_table, table_name)
+
+def main():
+    pool = None
+    factory = None
+    try:
+        # The token is kept fresh in the background, so connections opened late in a long load still log in
+        logger.info("Acquiring access token...")
+        factory = entra_connection_factory(host_name, database_name, identity_name)
+
+        logger.info("Establishing database connection pool...")
+        # Every loaded table keeps its connections until all tables are submitted and it commits:
+        # one per table, orders_partitions for orders, and one for the main thread's transactions
+        pool = factory.pool(1, len(table_csv_files) - 1 + max(orders_partitions, 1) + 1)
+        logger.info("Database connection pool established.")
+
+        # Load into the tables that hold the rows: order_lines with narrow orders storage
+        storage_names = run_in_transaction(pool, lambda cursor: {
+            table_name: storage_table(cursor, table_name) for table_name, _, _ in table_csv_files
+        })
+        table_names = [storage_names[table_name] for table_name, _, _ in table_csv_files]
+        if refresh_mode == "truncate":
+            conn = pool.getconn()
+            try:
+            # Truncate the tables, and drop their keys and indexes until the data is in
+                with conn.cursor() as cursor:
+                    drop_constraints_and_indexes(cursor, table_names)
+                    truncate_tables(cursor, table_names)
+                conn.commit()
+            except Exception as e:
+                logger.error("An error occurred while truncating tables: %s", e)
+                conn.rollback() # Rollback the transaction in case of error
+            finally:
+                pool.putconn(conn)
+
+        # Load data into the products, customers and orders tables
+        tables = [
+            (storage_names[table_name], os.path.join(basrUrl, relative_path), storage_columns(storage_names[table_name], columns))
+            for table_name, relative_path, columns in table_csv_files
+        ]
+        if refresh_mode != "shadow":
+            for table_name, csv_file_path, _ in tables:
+                try:
+                    run_in_transaction(pool, prepare_table_partitions, table_name, csv_file_path)
+                except Exception as e:
+                    logger.error("An error occurred while creating partitions of %s table: %s", table_name, e)
+
+        if refresh_mode == "incremental":
+            # Foreign keys stay in place, so the tables are diffed together in an order they allow
+            dependent_tables = set(storage_names.get(table_name, table_name) for table_name, _, _, _ in foreign_keys)
+            try:
+                run_in_transaction(pool, load_tables_incrementally, tables, dependent_tables)
+                logger.info("Committed %s tables.", ", ".join(table_names))
+            except Exception as e:
+                logger.error("An error occurred while loading the tables incrementally: %s", e)
+        else:
+            load_tables(pool, tables, load_workers, {storage_names["orders"]: orders_partitions})
+
+        if refresh_mode == "truncate":
+            # Build keys and indexes once over the loaded data, referenced tables first
+            for table_name in table_names:
+                try:
+                    run_in_transaction(pool, create_constraints_and_indexes, [table_name])
+                except Exception as e:
+                    logger.error("An error occurred while creating constraints and indexes on %s table: %s", table_name, e)
+        for table_name in table_names:
+            run_in_transaction(pool, analyze_partitioned_table, table_name)
+
+        # The sales rollups take the loaded orders from the deltas their triggers logged; a
+        # swapped-in shadow table has no triggers yet, so they are rebuilt from it instead
         try:
-        # Load data into the orders table
-            csv_file_path_orders = os.path.join(basrUrl, 'data/postgresql_db_sample_data/orders.csv')
-            load_table_from_csv(cursor, 'orders', csv_file_path_orders, 
-                ['id', 'customer_id', 'product_id', 'quantity', 'total', 'order_date', 'customer_first_name', 'customer_last_name', 'unit_price', 'category', 'brand', 'product_description', 'return_status'])
-            conn.commit()
+            if refresh_mode == "shadow" and run_in_transaction(pool, rollups_installed):
+                run_in_transaction(pool, rebuild_rollups, storage_names["orders"])
+            else:
+                run_in_transaction(pool, apply_rollup_deltas)
         except Exception as e:
-            logger.error("An error occurred while loading orders table: %s", e)
-            conn.rollback() # Rollback the transaction in case of error
+            logger.error("An error occurred while updating the sales rollups: %s", e)
 
     except Exception as e:
         logger.error("An error occurred while executint main program: %s", e)
     finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        if pool:
+            pool.closeall()
+        if factory:
+            factory.token_provider.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
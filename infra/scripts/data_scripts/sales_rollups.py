@@ -0,0 +1,260 @@
+"""
+Sales rollups of the orders table, maintained incrementally.
+
+Each rollup is a summary table of order counts, quantity, revenue and returned orders per key:
+revenue by product per month, customer lifetime totals and product totals. Statement
+level triggers on the table that stores the orders (orders, or order_lines with narrow storage, see
+orders_storage.py) aggregate the rows of every INSERT, UPDATE, DELETE or COPY from their transition
+tables and append the result to the rollup's delta table. Appending never waits for a row lock, so
+the parallel partition loads of run_psql_load_tables_script.py do not block each other on popular
+keys. apply_rollup_deltas() folds the pending deltas into the rollups; the loaders call it after
+loading, and sales_summary() adds the deltas that are still pending, so answers are always exact.
+
+Category and brand come from the products table, as in the narrow orders view. They are joined when
+a rollup is read, not stored in it, so changing a product re-buckets its sales at once and the order
+triggers never depend on which products another transaction has committed. Statement triggers
+only fire for statements on the table itself, not on its partitions; rows that leave with a
+partition are taken out with remove_from_rollups() (partition_maintenance.py does this), and
+rebuild_rollups() recomputes everything from scratch.
+"""
+import logging
+import time
+from psycopg2 import sql
+from orders_storage import storage_table
+
+logger = logging.getLogger(__name__)
+
+# Additive measures kept by every rollup, with their value over a set of order rows o
+rollup_measures = [
+    ("orders", "bigint", "count(*)"),
+    ("quantity", "bigint", "sum(o.quantity)"),
+    ("revenue", "numeric", "sum(o.total)"),
+    ("returned_orders", "bigint", "count(*) FILTER (WHERE o.return_status)"),
+]
+
+# Dimensions a question can group or filter by, over order rows o joined with products p
+# (product_dimensions come from p, so any rollup keyed by product_id covers them)
+rollup_dimensions = {
+    "category": ("text", "coalesce(p.category, '')"),
+    "brand": ("text", "coalesce(p.brand, '')"),
+    "month": ("date", "date_trunc('month', o.order_date)::date"),
+    "customer_id": ("integer", "o.customer_id"),
+    "product_id": ("integer", "o.product_id"),
+}
+
+product_dimensions = ["category", "brand"]
+
+# Rollup table -> its key dimensions; keys are never product_dimensions
+rollups = {
+    "sales_by_product_month": ["product_id", "month"],
+    "customer_sales": ["customer_id"],
+    "product_sales": ["product_id"],
+}
+
+def delta_table(rollup):
+    return rollup + "_delta"
+
+def create_rollup_table_sql(table_name, keys, primary_key):
+    columns = [sql.SQL("{} {} NOT NULL").format(sql.Identifier(key), sql.SQL(rollup_dimensions[key][0])) for key in keys]
+    columns += [sql.SQL("{} {} NOT NULL").format(sql.Identifier(name), sql.SQL(column_type)) for name, column_type, _ in rollup_measures]
+    if primary_key:
+        columns.append(sql.SQL("PRIMARY KEY ({})").format(sql.SQL(", ").join(map(sql.Identifier, keys))))
+    return sql.SQL("CREATE TABLE IF NOT EXISTS {} ({})").format(sql.Identifier(table_name), sql.SQL(", ").join(columns))
+
+def aggregate_sql(target, keys, source, sign=1):
+    """
+    INSERT INTO target of the rows of source (a table or transition table of orders) grouped by keys.
+    """
+    key_expressions = [sql.SQL(rollup_dimensions[key][1]) for key in keys]
+    return sql.SQL(
+        "INSERT INTO {target} ({columns}) SELECT {keys}, {measures} FROM {source} o GROUP BY {keys}"
+    ).format(
+        target=sql.Identifier(target),
+        columns=sql.SQL(", ").join(map(sql.Identifier, keys + [name for name, _, _ in rollup_measures])),
+        keys=sql.SQL(", ").join(key_expressions),
+        measures=sql.SQL(", ").join(
+            sql.SQL(expression if sign > 0 else "-" + expression) for _, _, expression in rollup_measures),
+        source=sql.Identifier(source),
+    )
+
+def trigger_function_sql(function_name, transitions):
+    """
+    Trigger function appending the delta of the given (transition table, sign) pairs to every rollup.
+    """
+    statements = [
+        aggregate_sql(delta_table(rollup), keys, transition, sign)
+        for transition, sign in transitions
+        for rollup, keys in rollups.items()
+    ]
+    return sql.SQL("CREATE OR REPLACE FUNCTION {}() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN {}; RETURN NULL; END $$").format(
+        sql.Identifier(function_name), sql.SQL("; ").join(statements))
+
+truncate_function_sql = sql.SQL(
+    "CREATE OR REPLACE FUNCTION sales_rollups_truncate() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN TRUNCATE {}; RETURN NULL; END $$"
+).format(sql.SQL(", ").join(sql.Identifier(name) for rollup in rollups for name in (rollup, delta_table(rollup))))
+
+# Trigger name -> (event, REFERENCING clause, function transitions)
+rollup_triggers = {
+    "sales_rollups_insert": ("INSERT", "REFERENCING NEW TABLE AS new_rows", [("new_rows", 1)]),
+    "sales_rollups_update": ("UPDATE", "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows", [("old_rows", -1), ("new_rows", 1)]),
+    "sales_rollups_delete": ("DELETE", "REFERENCING OLD TABLE AS old_rows", [("old_rows", -1)]),
+}
+
+def create_rollup_triggers(cursor, table_name=None):
+    """
+    Creates the trigger functions and the statement triggers on the table storing the orders.
+    """
+    table_name = table_name or storage_table(cursor, "orders")
+    for trigger_name, (event, referencing, transitions) in rollup_triggers.items():
+        cursor.execute(trigger_function_sql(trigger_name, transitions))
+        cursor.execute(sql.SQL("DROP TRIGGER IF EXISTS {} ON {}").format(sql.Identifier(trigger_name), sql.Identifier(table_name)))
+        cursor.execute(sql.SQL("CREATE TRIGGER {} AFTER {} ON {} {} FOR EACH STATEMENT EXECUTE FUNCTION {}()").format(
+            sql.Identifier(trigger_name), sql.SQL(event), sql.Identifier(table_name), sql.SQL(referencing), sql.Identifier(trigger_name)))
+    cursor.execute(truncate_function_sql)
+    cursor.execute(sql.SQL("DROP TRIGGER IF EXISTS sales_rollups_truncate ON {}").format(sql.Identifier(table_name)))
+    cursor.execute(sql.SQL("CREATE TRIGGER sales_rollups_truncate AFTER TRUNCATE ON {} FOR EACH STATEMENT EXECUTE FUNCTION sales_rollups_truncate()").format(
+        sql.Identifier(table_name)))
+
+def rebuild_rollups(cursor, table_name=None):
+    """
+    Recomputes every rollup from the orders with one scan each and (re)creates the triggers,
+    e.g. after a shadow swap or after partitions were dropped.
+    """
+    table_name = table_name or storage_table(cursor, "orders")
+    started = time.perf_counter()
+    create_rollup_triggers(cursor, table_name)
+    for rollup, keys in rollups.items():
+        cursor.execute(sql.SQL("TRUNCATE {}, {}").format(sql.Identifier(rollup), sql.Identifier(delta_table(rollup))))
+        cursor.execute(aggregate_sql(rollup, keys, table_name))
+    logger.info("Sales rollups rebuilt from %s in %.2f s.", table_name, time.perf_counter() - started)
+
+def create_sales_rollups(cursor):
+    """
+    Migration step: creates the rollup and delta tables and the triggers, and fills the rollups
+    from the orders already loaded.
+    """
+    for rollup, keys in rollups.items():
+        cursor.execute(create_rollup_table_sql(rollup, keys, primary_key=True))
+        cursor.execute(create_rollup_table_sql(delta_table(rollup), keys, primary_key=False))
+    rebuild_rollups(cursor)
+
+def remove_from_rollups(cursor, table_name):
+    """
+    Logs the rows of table_name, e.g. a detached partition, as removed orders.
+    """
+    if not rollups_installed(cursor):
+        return
+    for rollup, keys in rollups.items():
+        cursor.execute(aggregate_sql(delta_table(rollup), keys, table_name, sign=-1))
+
+def rollups_installed(cursor):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (next(iter(rollups)),))
+    return cursor.fetchone()[0]
+
+def apply_rollup_deltas(cursor):
+    """
+    Moves the pending deltas into the rollups, one statement per rollup, and removes keys whose
+    orders all went away. Returns the number of delta rows applied (0 before the rollups exist).
+    """
+    applied = 0
+    if not rollups_installed(cursor):
+        return applied
+    for rollup, keys in rollups.items():
+        key_columns = sql.SQL(", ").join(map(sql.Identifier, keys))
+        cursor.execute(sql.SQL(
+            "WITH pending AS (DELETE FROM {delta} RETURNING *), "
+            "merged AS (INSERT INTO {rollup} ({keys}, {measures}) "
+            "SELECT {keys}, {sums} FROM pending GROUP BY {keys} ORDER BY {keys} "
+            "ON CONFLICT ({keys}) DO UPDATE SET {updates} RETURNING orders) "
+            "SELECT (SELECT count(*) FROM pending), count(*) FILTER (WHERE orders = 0) FROM merged"
+        ).format(
+            delta=sql.Identifier(delta_table(rollup)),
+            rollup=sql.Identifier(rollup),
+            keys=key_columns,
+            measures=sql.SQL(", ").join(sql.Identifier(name) for name, _, _ in rollup_measures),
+            sums=sql.SQL(", ").join(
+                sql.SQL("sum({})::{}").format(sql.Identifier(name), sql.SQL(column_type)) for name, column_type, _ in rollup_measures),
+            updates=sql.SQL(", ").join(
+                sql.SQL("{0} = {1}.{0} + excluded.{0}").format(sql.Identifier(name), sql.Identifier(rollup))
+                for name, _, _ in rollup_measures),
+        ))
+        pending, emptied = cursor.fetchone()
+        if emptied:
+            cursor.execute(sql.SQL("DELETE FROM {} WHERE orders = 0").format(sql.Identifier(rollup)))
+        applied += pending
+    if applied:
+        logger.info("Applied %d sales rollup delta rows.", applied)
+    return applied
+
+def choose_rollup(dimensions, start=None, end=None):
+    """
+    Returns the smallest rollup whose keys cover the dimensions, or None. Product dimensions need a
+    rollup by product_id, date bounds one by month, and only whole months can be answered from it.
+    """
+    needed = set("product_id" if dimension in product_dimensions else dimension for dimension in dimensions)
+    needed |= {"month"} if start or end else set()
+    if any(bound is not None and bound.day != 1 for bound in (start, end)):
+        return None
+    candidates = [rollup for rollup, keys in rollups.items() if needed <= set(keys)]
+    return min(candidates, key=lambda rollup: len(rollups[rollup])) if candidates else None
+
+def sales_summary(cursor, group_by, start=None, end=None, filters=None, source=None):
+    """
+    Order count, quantity, revenue, returned orders and return rate per group_by dimensions,
+    for order dates in [start, end) and {dimension: value} filters. Answered from a rollup and
+    its pending deltas when one covers the question, otherwise (or with source="orders") from the
+    orders themselves. Returns (rows as dicts, source used, elapsed ms).
+    """
+    filters = filters or {}
+    unknown = [dimension for dimension in list(group_by) + list(filters) if dimension not in rollup_dimensions]
+    if unknown:
+        raise ValueError("Unknown dimensions {}; known are {}".format(unknown, sorted(rollup_dimensions)))
+    source = source or choose_rollup(list(group_by) + list(filters), start, end) or "orders"
+
+    if source == "orders":
+        # The same dimension expressions the rollups are built with, over the stored order rows
+        expression = lambda dimension: sql.SQL(rollup_dimensions[dimension][1])
+        order_date = sql.SQL("o.order_date")
+        from_clause = sql.SQL("{} o LEFT JOIN products p ON p.id = o.product_id").format(
+            sql.Identifier(storage_table(cursor, "orders")))
+        measures = [sql.SQL(expression_sql) for _, _, expression_sql in rollup_measures]
+    else:
+        # Product dimensions with the expressions of the orders scan, over the current products
+        expression = lambda dimension: (sql.SQL(rollup_dimensions[dimension][1]) if dimension in product_dimensions
+                                        else sql.Identifier("r", dimension))
+        order_date = sql.Identifier("r", "month")
+        from_clause = sql.SQL("(SELECT * FROM {} UNION ALL SELECT * FROM {}) r{}").format(
+            sql.Identifier(source), sql.Identifier(delta_table(source)),
+            sql.SQL(" LEFT JOIN products p ON p.id = r.product_id")
+            if any(dimension in product_dimensions for dimension in list(group_by) + list(filters)) else sql.SQL(""))
+        measures = [sql.SQL("sum({})::{}").format(sql.Identifier("r", name), sql.SQL(column_type)) for name, column_type, _ in rollup_measures]
+
+    conditions, params = [], {}
+    for index, (dimension, value) in enumerate(filters.items()):
+        conditions.append(sql.SQL("{} = %(filter_{})s").format(expression(dimension), sql.SQL(str(index))))
+        params["filter_{}".format(index)] = value
+    if start is not None:
+        conditions.append(sql.SQL("{} >= %(start)s").format(order_date))
+        params["start"] = start
+    if end is not None:
+        conditions.append(sql.SQL("{} < %(end)s").format(order_date))
+        params["end"] = end
+
+    query = sql.SQL("SELECT {columns} FROM {source}{where}{group_by} HAVING {orders} <> 0{order_by}").format(
+        columns=sql.SQL(", ").join(
+            [sql.SQL("{} AS {}").format(expression(dimension), sql.Identifier(dimension)) for dimension in group_by] +
+            [sql.SQL("{} AS {}").format(measure, sql.Identifier(name)) for measure, (name, _, _) in zip(measures, rollup_measures)]),
+        source=from_clause,
+        where=sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions) if conditions else sql.SQL(""),
+        group_by=sql.SQL(" GROUP BY ") + sql.SQL(", ").join(map(expression, group_by)) if group_by else sql.SQL(""),
+        orders=measures[0],
+        order_by=sql.SQL(" ORDER BY ") + sql.SQL(", ").join(map(expression, group_by)) if group_by else sql.SQL(""),
+    )
+    started = time.perf_counter()
+    cursor.execute(query, params)
+    names = [column.name for column in cursor.description]
+    rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for row in rows:
+        row["return_rate"] = row["returned_orders"] / row["orders"] if row["orders"] else None
+    return rows, source, elapsed_ms
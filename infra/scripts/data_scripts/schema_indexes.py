@@ -0,0 +1,118 @@
+"""
+Primary keys, foreign keys and query-path indexes of the products, customers and orders tables.
+Tables are listed by the name readers use; with narrow orders storage the orders entries apply to
+order_lines (see orders_storage.py), and either name selects them.
+
+Kept apart from the CREATE TABLE statements so bulk loads can drop them first and build them
+once afterwards, instead of paying index maintenance and foreign key checks for every row.
+infra/data/create-tables.sql carries the same definitions for manual setups.
+"""
+import logging
+from psycopg2 import sql
+from date_partitions import is_partitioned, partition_key_columns
+from orders_storage import storage_table
+
+logger = logging.getLogger(__name__)
+
+# (table, constraint name, key columns); partitioned tables get their partition key appended
+primary_keys = [
+    ("products", "products_pkey", ["id"]),
+    ("customers", "customers_pkey", ["id"]),
+    ("orders", "orders_pkey", ["id"]),
+]
+
+# (table, constraint name, column, referenced table); references go to the id primary key
+foreign_keys = [
+    ("orders", "orders_customer_id_fkey", "customer_id", "customers"),
+    ("orders", "orders_product_id_fkey", "product_id", "products"),
+]
+
+# (table, index name, access method and columns)
+secondary_indexes = [
+    ("orders", "orders_customer_id_idx", "btree (customer_id)"),
+    ("orders", "orders_product_id_idx", "btree (product_id)"),
+    ("products", "products_category_brand_idx", "btree (category, brand)"),
+    # A tiny index that only narrows date range scans when rows are stored roughly in date order;
+    # the generated data sets write random dates in id order, which it cannot skip through
+    ("orders", "orders_order_date_brin_idx", "brin (order_date)"),
+]
+
+def constraint_exists(cursor, table_name, constraint_name):
+    cursor.execute(
+        "SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(%s) AND conname = %s",
+        (table_name, constraint_name),
+    )
+    return cursor.fetchone() is not None
+
+def storage_tables(cursor):
+    """
+    Returns {listed table name: table holding its rows} for the tables of the lists above.
+    """
+    listed = set(table_name for table_name, _, _ in primary_keys) | set(table_name for table_name, _, _ in secondary_indexes)
+    listed |= set(table_name for table_name, _, _, _ in foreign_keys)
+    return {table_name: storage_table(cursor, table_name) for table_name in listed}
+
+def create_constraints_and_indexes(cursor, tables=None, concurrently=False):
+    """
+    Creates the missing primary keys, foreign keys and indexes of the given tables (default: all).
+    Foreign keys are added NOT VALID and then validated, which only takes a light lock on the
+    referenced table. With concurrently=True the secondary indexes are built with
+    CREATE INDEX CONCURRENTLY, which needs a connection in autocommit mode.
+    Partitioned tables support neither, so their indexes and foreign keys are created directly.
+    """
+    stored = storage_tables(cursor)
+    selected = lambda table_name: tables is None or table_name in tables or stored[table_name] in tables
+    partitioned = set(
+        table_name for table_name, _, _ in primary_keys if selected(table_name) and is_partitioned(cursor, stored[table_name])
+    )
+
+    for table_name, constraint_name, key_columns in primary_keys:
+        if selected(table_name) and not constraint_exists(cursor, stored[table_name], constraint_name):
+            if table_name in partitioned:
+                # Unique constraints of a partitioned table must include the partition key
+                key_columns = key_columns + [
+                    column for column in partition_key_columns(cursor, stored[table_name]) if column not in key_columns
+                ]
+            cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} PRIMARY KEY ({})").format(
+                sql.Identifier(stored[table_name]), sql.Identifier(constraint_name),
+                sql.SQL(', ').join(map(sql.Identifier, key_columns))))
+
+    for table_name, index_name, method_and_columns in secondary_indexes:
+        if selected(table_name):
+            cursor.execute(sql.SQL("CREATE INDEX {}IF NOT EXISTS {} ON {} USING {}").format(
+                sql.SQL("CONCURRENTLY ") if concurrently and table_name not in partitioned else sql.SQL(""),
+                sql.Identifier(index_name), sql.Identifier(stored[table_name]), sql.SQL(method_and_columns)))
+
+    for table_name, constraint_name, column, referenced_table in foreign_keys:
+        if selected(table_name) and not constraint_exists(cursor, stored[table_name], constraint_name):
+            cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} FOREIGN KEY ({}) REFERENCES {} (id){}").format(
+                sql.Identifier(stored[table_name]), sql.Identifier(constraint_name),
+                sql.Identifier(column), sql.Identifier(stored[referenced_table]),
+                sql.SQL("") if table_name in partitioned else sql.SQL(" NOT VALID")))
+            if table_name not in partitioned:
+                cursor.execute(sql.SQL("ALTER TABLE {} VALIDATE CONSTRAINT {}").format(
+                    sql.Identifier(stored[table_name]), sql.Identifier(constraint_name)))
+    logger.info("Constraints and indexes created.")
+
+def drop_constraints_and_indexes(cursor, tables=None):
+    """
+    Drops the foreign keys, indexes and primary keys of the given tables (default: all) before a bulk load.
+    Foreign keys pointing at a table are dropped with it, so tables can also be loaded in parallel.
+    """
+    stored = storage_tables(cursor)
+    selected = lambda table_name: tables is None or table_name in tables or stored[table_name] in tables
+
+    for table_name, constraint_name, _, referenced_table in foreign_keys:
+        if selected(table_name) or selected(referenced_table):
+            cursor.execute(sql.SQL("ALTER TABLE IF EXISTS {} DROP CONSTRAINT IF EXISTS {}").format(
+                sql.Identifier(stored[table_name]), sql.Identifier(constraint_name)))
+
+    for table_name, index_name, _ in secondary_indexes:
+        if selected(table_name):
+            cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(index_name)))
+
+    for table_name, constraint_name, _ in primary_keys:
+        if selected(table_name):
+            cursor.execute(sql.SQL("ALTER TABLE IF EXISTS {} DROP CONSTRAINT IF EXISTS {}").format(
+                sql.Identifier(stored[table_name]), sql.Identifier(constraint_name)))
+    logger.info("Constraints and indexes dropped for the bulk load.")
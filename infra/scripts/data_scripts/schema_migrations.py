@@ -0,0 +1,295 @@
+"""
+Versioned schema migrations.
+
+Every schema change is a numbered Migration appended to `migrations`; applied versions are recorded
+in the schema_migrations table, so a deploy only runs the steps the database has not seen yet and
+never drops existing tables or data. Pending migrations run together in one transaction, except
+those marked transactional=False (e.g. CREATE INDEX CONCURRENTLY), which run on their own in
+autocommit mode. Consecutive SQL steps and the version records are sent to the server together
+(StatementBatch), one round trip instead of one per statement. An advisory lock keeps concurrent
+deploys from applying the same steps twice.
+
+Applied migrations must not be edited; add a new version instead. A changed definition is
+reported through its checksum, which covers the SQL of the steps, the source of the function steps
+and the definition lists those functions read (the migration's inputs). Settings from the
+environment are left out, so migrating again with other settings reports no change.
+"""
+import hashlib
+import inspect
+import logging
+import os
+from datetime import date
+from psycopg2 import sql
+from schema_indexes import create_constraints_and_indexes, foreign_keys, primary_keys, secondary_indexes
+from date_partitions import add_periods, create_default_partition, ensure_partitions, period_start
+from statement_batch import StatementBatch
+from orders_storage import convert_to_narrow, order_lines_columns
+from sales_rollups import create_sales_rollups, rollup_dimensions, rollup_measures, rollups
+
+logger = logging.getLogger(__name__)
+
+migrations_table = "schema_migrations"
+# Key of the advisory lock held while migrating
+migration_lock_id = 4711020
+
+# Set to "month" or "year" to create orders as a table range-partitioned by order_date.
+# Partitions are created from orders_partition_start up to orders_partitions_ahead periods past today,
+# plus a default partition for anything outside them.
+orders_partition_interval = os.environ.get("PSQL_ORDERS_PARTITION_INTERVAL", "")
+orders_partition_start = date.fromisoformat(os.environ.get("PSQL_ORDERS_PARTITION_START", "2023-01-01"))
+orders_partitions_ahead = int(os.environ.get("PSQL_ORDERS_PARTITIONS_AHEAD", "3"))
+
+class Migration:
+    """
+    One schema version: a list of steps, each an SQL statement or a function taking a cursor.
+    inputs are the definitions the function steps read besides their own source, such as SQL
+    templates and definition lists, but not settings from the environment; they are part of the checksum.
+    """
+    def __init__(self, version, description, steps, transactional=True, inputs=None):
+        self.version = version
+        self.description = description
+        self.steps = steps
+        self.transactional = transactional
+        self.inputs = inputs or []
+
+    @property
+    def checksum(self):
+        digest = hashlib.sha256()
+        for step in self.steps:
+            digest.update((step if isinstance(step, str) else inspect.getsource(step)).encode("utf-8"))
+        for value in self.inputs:
+            digest.update(repr(value).encode("utf-8"))
+        return digest.hexdigest()
+
+    def apply(self, cursor, batch=None):
+        """
+        Runs the steps. With a StatementBatch, SQL steps are queued, and the queue is sent
+        before each function step and at the caller's batch.execute().
+        """
+        for step in self.steps:
+            if isinstance(step, str):
+                if batch is None:
+                    cursor.execute(step)
+                else:
+                    batch.add(step, description="Migration {} ({})".format(self.version, self.description))
+            else:
+                if batch is not None:
+                    batch.execute()
+                step(cursor)
+
+create_products_sql = """
+CREATE TABLE IF NOT EXISTS products
+(
+    id integer,
+    product_name character varying(100),
+    price numeric(10,2) NOT NULL,
+    category character varying(50),
+    brand character varying(50),
+    product_description text
+);
+"""
+
+create_customers_sql = """
+CREATE TABLE IF NOT EXISTS customers
+(
+    id integer,
+    first_name character varying(50),
+    last_name character varying(50),
+    gender character varying(10),
+    date_of_birth date,
+    age integer,
+    email character varying(100),
+    phone character varying(20),
+    post_address character varying(255),
+    membership character varying(50)
+);
+"""
+
+create_orders_sql = """
+CREATE TABLE IF NOT EXISTS orders
+(
+    id integer,
+    customer_id integer,
+    customer_first_name character varying(50),
+    customer_last_name character varying(50),
+    customer_gender character varying(10),
+    customer_age integer,
+    customer_email character varying(100),
+    customer_phone character varying(20),
+    order_date date,
+    product_id integer,
+    product_name character varying(100),
+    quantity integer,
+    unit_price numeric(10,2),
+    total numeric(10,2),
+    category character varying(50),
+    brand character varying(50),
+    product_description text,
+    return_status BOOLEAN DEFAULT FALSE
+){partition_clause};
+"""
+
+create_vector_store_sql = """
+CREATE TABLE IF NOT EXISTS vector_store(
+    id text,
+    title text,
+    chunk integer,
+    chunk_id text,
+    "offset" integer,
+    page_number integer,
+    content text,
+    source text,
+    metadata text,
+    content_vector public.vector(1536)
+);
+"""
+
+# Full-text search columns; hybrid_search.py queries them with the same text search configuration
+add_vector_store_tsv_sql = """
+ALTER TABLE vector_store ADD COLUMN IF NOT EXISTS content_tsv tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(content, '')), 'B')
+) STORED
+"""
+
+add_products_tsv_sql = """
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(product_name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(brand, '') || ' ' || coalesce(category, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(product_description, '')), 'C')
+) STORED
+"""
+
+def create_orders_table(cursor):
+    cursor.execute(create_orders_sql.format(
+        partition_clause=" PARTITION BY RANGE (order_date)" if orders_partition_interval else ""))
+    if orders_partition_interval:
+        last_period = add_periods(period_start(date.today(), orders_partition_interval), orders_partition_interval, orders_partitions_ahead)
+        ensure_partitions(cursor, "orders", orders_partition_start, last_period, orders_partition_interval)
+        create_default_partition(cursor, "orders")
+
+# Tables created by earlier versions of create_psql_tables.py are kept as they are (IF NOT EXISTS)
+migrations = [
+    Migration(1, "products, customers and orders tables", [
+        create_products_sql,
+        create_customers_sql,
+        create_orders_table,
+    ], inputs=[create_orders_sql]),
+    Migration(2, "primary keys, foreign keys and query-path indexes", [
+        create_constraints_and_indexes,
+    ], inputs=[primary_keys, foreign_keys, secondary_indexes]),
+    Migration(3, "vector extension and vector_store table", [
+        "CREATE EXTENSION IF NOT EXISTS vector CASCADE",
+        create_vector_store_sql,
+    ]),
+    Migration(4, "HNSW index on vector_store", [
+        "CREATE INDEX IF NOT EXISTS vector_store_content_vector_idx ON vector_store USING hnsw (content_vector vector_cosine_ops)",
+    ]),
+    Migration(5, "chunk hashes on vector_store for incremental re-ingestion", [
+        "ALTER TABLE vector_store ADD COLUMN IF NOT EXISTS chunk_hash text",
+        "CREATE INDEX IF NOT EXISTS vector_store_id_idx ON vector_store (id)",
+    ]),
+    Migration(6, "full-text search columns and GIN indexes on vector_store and products", [
+        add_vector_store_tsv_sql,
+        "CREATE INDEX IF NOT EXISTS vector_store_content_tsv_idx ON vector_store USING gin (content_tsv)",
+        add_products_tsv_sql,
+        "CREATE INDEX IF NOT EXISTS products_search_tsv_idx ON products USING gin (search_tsv)",
+    ]),
+    # Only converts when PSQL_ORDERS_STORAGE=narrow; later switches go through normalize_orders.py
+    Migration(7, "narrow orders storage in order_lines behind an orders view", [
+        convert_to_narrow,
+    ], inputs=[order_lines_columns]),
+    Migration(8, "sales rollups maintained by statement triggers on the orders", [
+        create_sales_rollups,
+    ], inputs=[rollup_measures, rollup_dimensions, rollups]),
+    # Hybrid search joins its fused results back to vector_store by chunk_id; appends may repeat one
+    Migration(9, "chunk_id index on vector_store", [
+        "CREATE INDEX IF NOT EXISTS vector_store_chunk_id_idx ON vector_store (chunk_id)",
+    ]),
+]
+
+def ensure_migrations_table(cursor):
+    cursor.execute("SELECT to_regclass(%s)", (migrations_table,))
+    if cursor.fetchone()[0] is None:
+        cursor.execute(sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {} (
+                version integer PRIMARY KEY,
+                description text NOT NULL,
+                checksum text NOT NULL,
+                applied_at timestamptz NOT NULL DEFAULT now()
+            )
+        """).format(sql.Identifier(migrations_table)))
+
+def applied_migrations(cursor):
+    """
+    Returns {version: checksum} for the migrations recorded in the database.
+    """
+    cursor.execute(sql.SQL("SELECT version, checksum FROM {}").format(sql.Identifier(migrations_table)))
+    return dict(cursor.fetchall())
+
+def record_migration(target, migration):
+    """
+    Records an applied migration through a cursor or a StatementBatch (both have the method used).
+    """
+    query = sql.SQL("INSERT INTO {} (version, description, checksum) VALUES (%s, %s, %s)").format(sql.Identifier(migrations_table))
+    params = (migration.version, migration.description, migration.checksum)
+    if isinstance(target, StatementBatch):
+        target.add(query, params, "Recording migration {}".format(migration.version))
+    else:
+        target.execute(query, params)
+
+def migrate(conn, target_version=None, schema_migrations=None):
+    """
+    Applies the migrations missing from the database, up to target_version (default: all).
+    Transactional migrations are applied and recorded together in a single transaction.
+    Returns the versions applied; an up-to-date database costs one query.
+    """
+    schema_migrations = sorted(schema_migrations or migrations, key=lambda migration: migration.version)
+    conn.autocommit = False
+    applied_now = []
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (migration_lock_id,))
+        try:
+            ensure_migrations_table(cursor)
+            applied = applied_migrations(cursor)
+            for migration in schema_migrations:
+                if migration.version in applied and applied[migration.version] != migration.checksum:
+                    logger.warning("Migration %d (%s) changed after it was applied; add a new version instead.",
+                                   migration.version, migration.description)
+            pending = [
+                migration for migration in schema_migrations
+                if migration.version not in applied and (target_version is None or migration.version <= target_version)
+            ]
+            if not pending:
+                conn.commit()
+                logger.info("Schema is up to date (version %d).", max(applied) if applied else 0)
+                return applied_now
+
+            batch = StatementBatch(cursor)
+            for migration in pending:
+                logger.info("Applying migration %d: %s", migration.version, migration.description)
+                if migration.transactional:
+                    migration.apply(cursor, batch)
+                    record_migration(batch, migration)
+                else:
+                    # Commit what is batched so far; this one cannot run inside a transaction block
+                    batch.execute()
+                    conn.commit()
+                    conn.autocommit = True
+                    try:
+                        migration.apply(cursor)
+                        record_migration(cursor, migration)
+                    finally:
+                        conn.autocommit = False
+                applied_now.append(migration.version)
+            batch.execute()
+            conn.commit()
+            logger.info("Schema migrated to version %d (%d statements in %d round trips, %d saved).",
+                        applied_now[-1], batch.statements, batch.round_trips, batch.round_trips_saved)
+            return applied_now
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (migration_lock_id,))
+            conn.commit()
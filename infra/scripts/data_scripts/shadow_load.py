@@ -0,0 +1,216 @@
+"""
+Zero-downtime reloads through a shadow table.
+
+The new data is written into an UNLOGGED copy of the table (<table>_shadow), which is then indexed,
+analyzed and converted to LOGGED while readers keep using the current table. A short transaction
+renames the current table to <table>_old and the shadow table into its place; the old version is
+kept so rollback_swap() can switch back.
+
+Indexes and primary key / unique constraints of the live table are rebuilt on the shadow table
+after the load, foreign keys are moved over, and views over the table are re-pointed to the new
+version. Materialized views and declaratively partitioned tables are not supported.
+"""
+import logging
+import re
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+shadow_suffix = "_shadow"
+old_suffix = "_old"
+
+index_definition = re.compile(r"^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ (USING .*)$")
+
+def suffixed(name, suffix):
+    """
+    Adds a suffix to an object name, keeping it inside PostgreSQL's 63 byte identifier limit.
+    """
+    return name[:63 - len(suffix)] + suffix
+
+def base_name(name, suffix):
+    return name[:-len(suffix)] if suffix and name.endswith(suffix) else name
+
+def table_indexes(cursor, table_name):
+    """
+    Returns (index name, index definition, constraint name, constraint type) for each index of a table.
+    """
+    cursor.execute("""
+        SELECT ic.relname, pg_get_indexdef(i.indexrelid), c.conname, c.contype
+        FROM pg_index i
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid AND c.conrelid = i.indrelid AND c.contype IN ('p', 'u')
+        WHERE i.indrelid = %s::regclass
+        ORDER BY c.contype NULLS LAST, ic.relname
+    """, (table_name,))
+    return cursor.fetchall()
+
+def prepare_shadow_table(cursor, table_name):
+    """
+    Creates an empty UNLOGGED shadow table with the columns, defaults and checks of table_name,
+    but without indexes, so the bulk load pays no index maintenance and writes no WAL.
+    Table privileges are copied as well. Returns the shadow table name.
+    """
+    shadow_name = suffixed(table_name, shadow_suffix)
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", (table_name,))
+    if cursor.fetchone()[0] != "r":
+        raise ValueError("Shadow loads need a plain table, {} is partitioned or not a table".format(table_name))
+
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(shadow_name)))
+    cursor.execute(sql.SQL(
+        "CREATE UNLOGGED TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED "
+        "INCLUDING IDENTITY INCLUDING STORAGE INCLUDING COMMENTS)"
+    ).format(sql.Identifier(shadow_name), sql.Identifier(table_name)))
+
+    cursor.execute("""
+        SELECT CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE a.grantee::regrole::text END, a.privilege_type
+        FROM pg_class c, aclexplode(c.relacl) a
+        WHERE c.oid = %s::regclass AND a.grantee <> c.relowner
+    """, (table_name,))
+    for grantee, privilege in cursor.fetchall():
+        grantee_sql = sql.SQL("PUBLIC") if grantee == "PUBLIC" else sql.SQL(grantee)
+        cursor.execute(sql.SQL("GRANT {} ON {} TO {}").format(
+            sql.SQL(privilege), sql.Identifier(shadow_name), grantee_sql))
+
+    logger.info("Shadow table %s created.", shadow_name)
+    return shadow_name
+
+def finalize_shadow_table(cursor, table_name):
+    """
+    Builds the live table's indexes and constraints on the loaded shadow table, runs ANALYZE
+    and converts it to LOGGED. Readers of table_name are not blocked by any of this.
+    """
+    shadow_name = suffixed(table_name, shadow_suffix)
+    shadow = sql.Identifier(shadow_name)
+
+    for index_name, definition, constraint_name, constraint_type in table_indexes(cursor, table_name):
+        match = index_definition.match(definition)
+        if match is None:
+            raise ValueError("Cannot rebuild index {}: {}".format(index_name, definition))
+        shadow_index = suffixed(index_name, shadow_suffix)
+        cursor.execute(sql.SQL("{} {} ON {} {}").format(
+            sql.SQL(match.group(1)), sql.Identifier(shadow_index), shadow, sql.SQL(match.group(2))))
+        if constraint_name:
+            cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {} USING INDEX {}").format(
+                shadow,
+                sql.Identifier(shadow_index),
+                sql.SQL("PRIMARY KEY" if constraint_type == "p" else "UNIQUE"),
+                sql.Identifier(shadow_index)))
+
+    cursor.execute(sql.SQL("ANALYZE {}").format(shadow))
+    cursor.execute(sql.SQL("ALTER TABLE {} SET LOGGED").format(shadow))
+
+    # Foreign keys from the table to others; a logged table may only reference logged tables
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+    """, (table_name,))
+    for constraint_name, definition in cursor.fetchall():
+        cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(
+            shadow, sql.Identifier(constraint_name), sql.SQL(definition)))
+    logger.info("Shadow table %s indexed, analyzed and logged.", shadow_name)
+
+def swap_tables(cursor, table_name, replacement_name, retired_name, lock_timeout="5s"):
+    """
+    Puts replacement_name in place of table_name and keeps the current version as retired_name,
+    dropping any earlier retired_name table. Meant to run in its own short transaction.
+    Returns the foreign keys that were re-created NOT VALID, as (table, constraint) pairs.
+    """
+    table = sql.Identifier(table_name)
+    replacement_suffix = replacement_name[len(table_name):] if replacement_name.startswith(table_name) else shadow_suffix
+    retired_suffix = retired_name[len(table_name):] if retired_name.startswith(table_name) else old_suffix
+
+    cursor.execute("SELECT set_config('lock_timeout', %s, true)", (lock_timeout,))
+    cursor.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(table))
+
+    # Foreign keys from other tables and views keep pointing at the table object, not its name
+    # Partitions carry clones of their parent's foreign keys (conparentid), which follow the parent's
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE confrelid = %s::regclass AND contype = 'f' AND conrelid <> confrelid AND conparentid = 0
+    """, (table_name,))
+    # Shadow copies get their keys when they are finalized
+    foreign_keys = [
+        foreign_key for foreign_key in cursor.fetchall()
+        if not foreign_key[0].endswith((old_suffix, shadow_suffix))
+    ]
+    cursor.execute("""
+        SELECT DISTINCT v.oid::regclass::text, pg_get_viewdef(v.oid)
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.classid = 'pg_rewrite'::regclass AND d.refobjid = %s::regclass AND v.relkind = 'v'
+    """, (table_name,))
+    views = cursor.fetchall()
+
+    # Foreign keys of the table itself move to the replacement, so the retired copy references nothing
+    outgoing_query = "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'"
+    cursor.execute(outgoing_query, (table_name,))
+    outgoing_keys = cursor.fetchall()
+    cursor.execute(outgoing_query, (replacement_name,))
+    replacement_keys = set(constraint_name for constraint_name, _ in cursor.fetchall())
+
+    for referencing_table, constraint_name, _ in foreign_keys:
+        cursor.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(
+            sql.SQL(referencing_table), sql.Identifier(constraint_name)))
+    for constraint_name, _ in outgoing_keys:
+        cursor.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(table, sql.Identifier(constraint_name)))
+
+    # CASCADE only removes foreign keys of shadow copies that still point at it
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(retired_name)))
+    for index_name, _, _, _ in table_indexes(cursor, table_name):
+        cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+            sql.Identifier(index_name), sql.Identifier(suffixed(index_name, retired_suffix))))
+    cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(table, sql.Identifier(retired_name)))
+
+    for index_name, _, _, _ in table_indexes(cursor, replacement_name):
+        cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+            sql.Identifier(index_name), sql.Identifier(base_name(index_name, replacement_suffix))))
+    cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(replacement_name), table))
+
+    for view_name, definition in views:
+        cursor.execute(sql.SQL("CREATE OR REPLACE VIEW {} AS {}").format(sql.SQL(view_name), sql.SQL(definition)))
+    for constraint_name, definition in outgoing_keys:
+        if constraint_name not in replacement_keys:
+            foreign_keys.append((table_name, constraint_name, definition))
+    not_valid = []
+    for referencing_table, constraint_name, definition in foreign_keys:
+        # Partitioned tables cannot take NOT VALID foreign keys, theirs are checked right away
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", (referencing_table,))
+        if cursor.fetchone()[0] == "p":
+            cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(
+                sql.SQL(referencing_table), sql.Identifier(constraint_name), sql.SQL(definition)))
+            continue
+        cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {} NOT VALID").format(
+            sql.SQL(referencing_table), sql.Identifier(constraint_name), sql.SQL(definition)))
+        not_valid.append((referencing_table, constraint_name))
+
+    logger.info("Swapped %s into %s, previous version kept as %s.", replacement_name, table_name, retired_name)
+    return not_valid
+
+def swap_in_shadow_table(cursor, table_name, lock_timeout="5s"):
+    """
+    Swaps the finalized shadow table in and keeps the previous version as <table>_old.
+    """
+    return swap_tables(cursor, table_name, suffixed(table_name, shadow_suffix), suffixed(table_name, old_suffix), lock_timeout)
+
+def rollback_swap(cursor, table_name, lock_timeout="5s"):
+    """
+    Switches back to the version kept as <table>_old; the replaced version becomes <table>_shadow.
+    """
+    return swap_tables(cursor, table_name, suffixed(table_name, old_suffix), suffixed(table_name, shadow_suffix), lock_timeout)
+
+def validate_foreign_keys(cursor, foreign_keys):
+    """
+    Validates foreign keys re-created NOT VALID by a swap. Runs without blocking readers or writers.
+    """
+    for referencing_table, constraint_name in foreign_keys:
+        cursor.execute(sql.SQL("ALTER TABLE {} VALIDATE CONSTRAINT {}").format(
+            sql.SQL(referencing_table), sql.Identifier(constraint_name)))
+
+def drop_shadow_table(cursor, table_name):
+    """
+    Drops a shadow table left by a failed load.
+    """
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(suffixed(table_name, shadow_suffix))))
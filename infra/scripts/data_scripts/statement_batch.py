@@ -0,0 +1,94 @@
+"""
+Sends queued SQL statements to the server in one round trip.
+
+Every cursor.execute() waits for a full network round trip, which adds up for DDL and grant
+scripts against a remote server. StatementBatch renders the queued statements with their
+parameters on the client and sends them as one multi-statement query. Statements that return
+rows or cannot run inside a transaction block (CREATE INDEX CONCURRENTLY, CREATE DATABASE) do not
+belong in a batch.
+
+When a batch fails, PostgreSQL only reports the error, not which statement caused it. The batch
+is then rolled back to its savepoint and replayed one statement at a time to find that statement,
+which is raised as BatchStatementError; the transaction is left failed, as with a single statement.
+"""
+import logging
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+savepoint_name = "statement_batch"
+
+class BatchStatementError(Exception):
+    """
+    A statement of a batch failed; .statement is its SQL, .description its label, .error the database error.
+    """
+    def __init__(self, statement, description, error):
+        self.statement = statement
+        self.description = description
+        self.error = error
+        super().__init__("{} failed: {}".format(description or statement, str(error).strip()))
+
+class StatementBatch:
+    """
+    Queue of statements for one cursor. add() queues, execute() sends the queue in one round trip.
+    statements and round_trips count over the life of the batch.
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.queue = []
+        self.statements = 0
+        self.round_trips = 0
+
+    def add(self, statement, params=None, description=None):
+        """
+        Queues an SQL string or psycopg2.sql object; params are interpolated as by cursor.execute.
+        """
+        self.queue.append((self.cursor.mogrify(statement, params), description))
+
+    def __len__(self):
+        return len(self.queue)
+
+    @property
+    def round_trips_saved(self):
+        return self.statements - self.round_trips
+
+    def execute(self):
+        """
+        Sends the queued statements, in the current transaction. On autocommit connections they
+        run as one implicit transaction: all of them are applied or none.
+        """
+        if not self.queue:
+            return
+        queue, self.queue = self.queue, []
+        conn = self.cursor.connection
+        # A savepoint in the same string marks the start of the batch for error attribution
+        in_transaction = not conn.autocommit
+        body = b";\n".join(statement for statement, _ in queue)
+        if in_transaction:
+            body = "SAVEPOINT {0};\n".format(savepoint_name).encode() + body + ";\nRELEASE SAVEPOINT {0}".format(savepoint_name).encode()
+        try:
+            self.cursor.execute(body)
+        except psycopg2.Error as e:
+            self.round_trips += 1
+            raise self._failed_statement(queue, in_transaction) or e
+        self.round_trips += 1
+        self.statements += len(queue)
+
+    def _failed_statement(self, queue, in_transaction):
+        """
+        Replays the statements one by one up to the one that fails and returns its BatchStatementError.
+        """
+        self.cursor.execute("ROLLBACK TO SAVEPOINT {}".format(savepoint_name) if in_transaction else "BEGIN")
+        try:
+            for statement, description in queue:
+                try:
+                    self.cursor.execute(statement)
+                except psycopg2.Error as e:
+                    text = statement.decode(psycopg2.extensions.encodings[self.cursor.connection.encoding], "replace")
+                    logger.error("%s failed: %s", description or text, str(e).strip())
+                    return BatchStatementError(text, description, e)
+        finally:
+            if not in_transaction:
+                self.cursor.execute("ROLLBACK")
+        return None
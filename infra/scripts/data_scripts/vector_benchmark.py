@@ -0,0 +1,239 @@
+"""
+Benchmark of the HNSW vector index on synthetic data.
+
+A table with the shape of vector_store.content_vector is filled with random unit vectors, either
+uniform or drawn around a number of cluster centres, which is closer to real embeddings. For every
+(m, ef_construction) pair the index is built with build_vector_index and measured (build time,
+size); for every hnsw.ef_search value the queries are run one at a time (recall@k against
+brute-force ground truth, p50/p95/p99 latency) and then from concurrent connections (QPS).
+
+Vectors are generated chunk by chunk from the seed, so the same data is produced again for the
+ground truth without keeping it in memory, and runs with the same settings are comparable.
+"""
+import logging
+import platform
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from psycopg2 import sql
+from binary_copy import BinaryCopyWriter
+from vector_index import build_vector_index
+from vector_storage import pgvector_version, search, vector_text
+
+logger = logging.getLogger(__name__)
+
+benchmark_table = "vector_benchmark"
+benchmark_index = "vector_benchmark_embedding_idx"
+
+def cluster_centres(dimensions, clusters, seed):
+    rng = np.random.default_rng([seed, 0])
+    centres = rng.standard_normal((clusters, dimensions)).astype(np.float32)
+    return centres / np.linalg.norm(centres, axis=1, keepdims=True)
+
+def random_vectors(rng, count, dimensions, centres=None, spread=0.5):
+    """
+    count unit vectors, uniform on the sphere or scattered around randomly chosen centres.
+    """
+    vectors = rng.standard_normal((count, dimensions)).astype(np.float32)
+    if centres is not None:
+        vectors = centres[rng.integers(0, len(centres), count)] + vectors * np.float32(spread / np.sqrt(dimensions))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def vector_chunks(rows, dimensions, clusters=0, seed=0, chunk_size=10000):
+    """
+    Yields (first id, vectors) for the data set; every chunk has its own seed, so this
+    produces the same vectors each time it is called.
+    """
+    centres = cluster_centres(dimensions, clusters, seed) if clusters else None
+    for chunk, start in enumerate(range(0, rows, chunk_size)):
+        rng = np.random.default_rng([seed, 1, chunk])
+        yield start, random_vectors(rng, min(chunk_size, rows - start), dimensions, centres)
+
+def query_vectors(count, dimensions, clusters=0, seed=0):
+    centres = cluster_centres(dimensions, clusters, seed) if clusters else None
+    return random_vectors(np.random.default_rng([seed, 2]), count, dimensions, centres)
+
+def ground_truth(queries, rows, dimensions, clusters, seed, k):
+    """
+    Exact k nearest ids by cosine distance for each query, by brute force over the regenerated data.
+    """
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start, vectors in vector_chunks(rows, dimensions, clusters, seed):
+        # Unit vectors: the highest dot product is the smallest cosine distance
+        scores = np.concatenate([best_scores, queries @ vectors.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + len(vectors)), (len(queries), len(vectors)))], axis=1)
+        keep = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_ids = np.take_along_axis(ids, keep, axis=1)
+    return [set(row) for row in best_ids.tolist()]
+
+def create_benchmark_table(conn, rows, dimensions, clusters, seed, table_name=benchmark_table):
+    """
+    (Re)creates the benchmark table and fills it with binary COPY. Returns the load seconds.
+    """
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table_name)))
+        cursor.execute(sql.SQL("CREATE TABLE {} (id integer PRIMARY KEY, embedding vector({}))").format(
+            sql.Identifier(table_name), sql.Literal(dimensions)))
+        writer = BinaryCopyWriter(cursor, table_name, ["id", "embedding"])
+        for start, vectors in vector_chunks(rows, dimensions, clusters, seed):
+            writer.write(list(zip(range(start, start + len(vectors)), vectors)))
+        cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table_name)))
+    conn.commit()
+    elapsed = time.perf_counter() - started
+    logger.info("Loaded %d vectors of %d dimensions into %s in %.1f s.", rows, dimensions, table_name, elapsed)
+    return elapsed
+
+def set_ef_search(cursor, ef_search):
+    cursor.execute("SELECT set_config('hnsw.ef_search', %s, false)", (str(ef_search),))
+    # On small tables the planner may prefer a sequential scan, which would measure exact search instead
+    cursor.execute("SET enable_seqscan = off")
+
+def run_queries(cursor, query_texts, k, dimensions, table_name):
+    """
+    Runs the queries one after the other; returns the result ids and latencies in seconds.
+    """
+    results = []
+    latencies = []
+    for query_text in query_texts:
+        started = time.perf_counter()
+        rows = search(cursor, query_text, k, "vector", table_name=table_name, column="embedding",
+                      key_column="id", dimensions=dimensions)
+        latencies.append(time.perf_counter() - started)
+        results.append(set(row[0] for row in rows))
+    return results, latencies
+
+def concurrent_qps(connect, query_texts, k, dimensions, ef_search, concurrency, table_name):
+    """
+    Every one of `concurrency` connections runs all queries, starting at a different one.
+    Returns the queries per second over all connections.
+    """
+    connections = [connect() for _ in range(concurrency)]
+    errors = []
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(conn, offset):
+        try:
+            with conn.cursor() as cursor:
+                set_ef_search(cursor, ef_search)
+                barrier.wait()
+                run_queries(cursor, query_texts[offset:] + query_texts[:offset], k, dimensions, table_name)
+        except Exception as e:
+            errors.append(e)
+            barrier.abort()
+
+    threads = [
+        threading.Thread(target=worker, args=(conn, index * len(query_texts) // concurrency), daemon=True)
+        for index, conn in enumerate(connections)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+    finally:
+        for conn in connections:
+            conn.close()
+    if errors:
+        raise errors[0]
+    return concurrency * len(query_texts) / elapsed
+
+def run_benchmark(connect, rows=100000, dimensions=1536, clusters=100, query_count=200, k=10,
+                  m_values=(16,), ef_construction_values=(64,), ef_search_values=(40, 100, 200),
+                  concurrency=4, seed=42, keep_table=False, table_name=benchmark_table):
+    """
+    Loads the synthetic data set and sweeps the index and search parameters.
+    connect is a function returning a new connection. Returns a dict of settings, environment
+    and one result per (m, ef_construction, ef_search), ready to be written as JSON.
+    """
+    started_at = datetime.now(timezone.utc).isoformat()
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW server_version")
+            server_version = cursor.fetchone()[0]
+            extension_version = ".".join(map(str, pgvector_version(cursor)))
+        conn.commit()
+
+        load_seconds = create_benchmark_table(conn, rows, dimensions, clusters, seed, table_name)
+        queries = query_vectors(query_count, dimensions, clusters, seed)
+        started = time.perf_counter()
+        exact = ground_truth(queries, rows, dimensions, clusters, seed, k)
+        logger.info("Ground truth for %d queries computed in %.1f s.", query_count, time.perf_counter() - started)
+        query_texts = [vector_text(query) for query in queries]
+
+        results = []
+        for m in m_values:
+            for ef_construction in ef_construction_values:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(benchmark_index)))
+                conn.commit()
+                build_seconds = build_vector_index(conn, table_name=table_name, column="embedding", index_name=benchmark_index,
+                                                   storage="vector", m=m, ef_construction=ef_construction)
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_relation_size(%s)", (benchmark_index,))
+                    index_bytes = cursor.fetchone()[0]
+                conn.commit()
+
+                for ef_search in ef_search_values:
+                    with conn.cursor() as cursor:
+                        set_ef_search(cursor, ef_search)
+                        # Warm the index into shared buffers before timing
+                        run_queries(cursor, query_texts[:10], k, dimensions, table_name)
+                        found, latencies = run_queries(cursor, query_texts, k, dimensions, table_name)
+                    conn.commit()
+                    recall = sum(len(result & truth) for result, truth in zip(found, exact)) / float(query_count * k)
+                    p50, p95, p99 = np.percentile(np.array(latencies) * 1000.0, [50, 95, 99])
+                    qps = concurrent_qps(connect, query_texts, k, dimensions, ef_search, concurrency, table_name) if concurrency else None
+                    results.append({
+                        "m": m,
+                        "ef_construction": ef_construction,
+                        "ef_search": ef_search,
+                        "build_seconds": round(build_seconds, 3),
+                        "index_bytes": index_bytes,
+                        "recall": round(recall, 4),
+                        "p50_ms": round(float(p50), 3),
+                        "p95_ms": round(float(p95), 3),
+                        "p99_ms": round(float(p99), 3),
+                        "qps": round(qps, 1) if qps else None,
+                    })
+                    logger.info("m=%d ef_construction=%d ef_search=%d: recall@%d %.3f, p50 %.2f ms, p99 %.2f ms, %s QPS.",
+                                m, ef_construction, ef_search, k, recall, p50, p99,
+                                "{:.0f}".format(qps) if qps else "-")
+    finally:
+        if not keep_table:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table_name)))
+            conn.commit()
+        conn.close()
+
+    return {
+        "started_at": started_at,
+        "settings": {
+            "rows": rows,
+            "dimensions": dimensions,
+            "clusters": clusters,
+            "queries": query_count,
+            "k": k,
+            "concurrency": concurrency,
+            "seed": seed,
+        },
+        "environment": {
+            "postgres": server_version,
+            "pgvector": extension_version,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "load_seconds": round(load_seconds, 3),
+        "results": results,
+    }
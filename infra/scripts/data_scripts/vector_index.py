@@ -0,0 +1,185 @@
+"""
+Deferred HNSW index build for vector_store.
+
+Inserting into a table that already has an HNSW index adds every vector to the graph one at a
+time, which is far slower than building the graph once over the loaded data. Bulk ingestion
+therefore drops the index first (drop_vector_index) and builds it afterwards (build_vector_index)
+with a build-sized maintenance_work_mem and parallel maintenance workers. The build reports its
+progress from pg_stat_progress_create_index.
+
+The index follows the storage of the embeddings (see vector_storage.py); set_vector_storage()
+converts vector_store between float32, halfvec and binary-quantized storage.
+"""
+import logging
+import os
+import threading
+import time
+from psycopg2 import sql
+from vector_storage import current_vector_storage, index_target, require_storage_support, vector_column_type
+
+logger = logging.getLogger(__name__)
+
+vector_table = "vector_store"
+vector_column = "content_vector"
+vector_index_name = "vector_store_content_vector_idx"
+# Storage for new indexes when the table does not tell: vector, halfvec or binary
+vector_storage = os.environ.get("PSQL_VECTOR_STORAGE", "vector")
+
+# HNSW build parameters: connections per graph node and candidate list size while building.
+# Higher values give better recall and a slower build.
+hnsw_m = int(os.environ.get("PSQL_HNSW_M", "16"))
+hnsw_ef_construction = int(os.environ.get("PSQL_HNSW_EF_CONSTRUCTION", "64"))
+# The build is much faster when the whole graph fits into maintenance_work_mem
+hnsw_maintenance_work_mem = os.environ.get("PSQL_HNSW_MAINTENANCE_WORK_MEM", "1GB")
+hnsw_parallel_workers = int(os.environ.get("PSQL_HNSW_PARALLEL_WORKERS", "4"))
+
+progress_query = """
+    SELECT phase, blocks_done, blocks_total, tuples_done, tuples_total
+    FROM pg_stat_progress_create_index
+    WHERE pid = %s
+"""
+
+def drop_vector_index(cursor, index_name=vector_index_name, table_name=vector_table, column=vector_column):
+    """
+    Drops the vector index before a bulk load into vector_store.
+    Returns the storage the index was built for, to build the same one afterwards.
+    """
+    storage = current_vector_storage(cursor, table_name, column, index_name)
+    cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(index_name)))
+    logger.info("Index %s dropped for the bulk load.", index_name)
+    return storage
+
+def vector_index_exists(cursor, index_name=vector_index_name):
+    cursor.execute("SELECT to_regclass(%s)", (index_name,))
+    return cursor.fetchone()[0] is not None
+
+def report_build_progress(progress_conn, backend_pid, index_name, stop, interval):
+    """
+    Logs the build phase and tuple/block counts of a running CREATE INDEX until stop is set.
+    """
+    last_phase = None
+    while not stop.wait(interval):
+        try:
+            with progress_conn.cursor() as cursor:
+                cursor.execute(progress_query, (backend_pid,))
+                row = cursor.fetchone()
+            progress_conn.rollback()
+        except Exception as e:
+            logger.warning("Cannot read the build progress of %s: %s", index_name, e)
+            return
+        if row is None:
+            continue
+        phase, blocks_done, blocks_total, tuples_done, tuples_total = row
+        if tuples_total:
+            logger.info("Building %s: %s, %d of %d tuples (%.0f%%).",
+                        index_name, phase, tuples_done, tuples_total, 100.0 * tuples_done / tuples_total)
+        elif blocks_total:
+            logger.info("Building %s: %s, %d of %d blocks (%.0f%%).",
+                        index_name, phase, blocks_done, blocks_total, 100.0 * blocks_done / blocks_total)
+        elif phase != last_phase:
+            logger.info("Building %s: %s.", index_name, phase)
+        last_phase = phase
+
+def build_vector_index(conn, progress_conn=None, table_name=vector_table, column=vector_column,
+                       index_name=vector_index_name, storage=None, m=None, ef_construction=None,
+                       maintenance_work_mem=None, parallel_workers=None, concurrently=False, progress_interval=10):
+    """
+    Builds the HNSW index in one pass over the loaded table and commits it.
+    storage defaults to that of the column (halfvec) or of the existing index, else PSQL_VECTOR_STORAGE.
+    The build settings only apply to this session. With progress_conn, a second connection,
+    the build progress is logged every progress_interval seconds. concurrently=True keeps the
+    table writable during the build, at the cost of a slower build.
+    Returns the elapsed seconds.
+    """
+    m = m or hnsw_m
+    ef_construction = ef_construction or hnsw_ef_construction
+    notices_seen = len(conn.notices)
+
+    with conn.cursor() as cursor:
+        storage = storage or current_vector_storage(cursor, table_name, column, index_name) or vector_storage
+        require_storage_support(cursor, storage)
+        _, dimensions = vector_column_type(cursor, table_name, column)
+        cursor.execute("SELECT set_config('maintenance_work_mem', %s, false)",
+                       (maintenance_work_mem or hnsw_maintenance_work_mem,))
+        cursor.execute("SELECT set_config('max_parallel_maintenance_workers', %s, false)",
+                       (str(hnsw_parallel_workers if parallel_workers is None else parallel_workers),))
+    conn.commit()
+
+    stop = threading.Event()
+    monitor = None
+    if progress_conn is not None:
+        monitor = threading.Thread(
+            target=report_build_progress,
+            args=(progress_conn, conn.get_backend_pid(), index_name, stop, progress_interval),
+            daemon=True,
+        )
+        monitor.start()
+
+    logger.info("Building %s on %s for %s storage (m = %d, ef_construction = %d)...",
+                index_name, table_name, storage, m, ef_construction)
+    started = time.perf_counter()
+    autocommit = conn.autocommit
+    try:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = concurrently or autocommit
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL(
+                "CREATE INDEX {concurrently}IF NOT EXISTS {index} ON {table} USING hnsw ({target}) "
+                "WITH (m = {m}, ef_construction = {ef_construction})"
+            ).format(
+                concurrently=sql.SQL("CONCURRENTLY ") if concurrently else sql.SQL(""),
+                index=sql.Identifier(index_name),
+                table=sql.Identifier(table_name),
+                target=index_target(storage, column, dimensions),
+                m=sql.Literal(m),
+                ef_construction=sql.Literal(ef_construction),
+            ))
+        if not conn.autocommit:
+            conn.commit()
+    except Exception:
+        if not conn.autocommit:
+            conn.rollback()
+        raise
+    finally:
+        conn.autocommit = autocommit
+        stop.set()
+        if monitor is not None:
+            monitor.join()
+        with conn.cursor() as cursor:
+            cursor.execute("RESET maintenance_work_mem")
+            cursor.execute("RESET max_parallel_maintenance_workers")
+        conn.commit()
+
+    elapsed = time.perf_counter() - started
+    # pgvector warns when the graph outgrows maintenance_work_mem and the build slows down
+    for notice in conn.notices[notices_seen:]:
+        logger.warning("While building %s: %s", index_name, notice.strip())
+    logger.info("Index %s built in %.1f s.", index_name, elapsed)
+    return elapsed
+
+def set_vector_storage(conn, storage, progress_conn=None, table_name=vector_table, column=vector_column,
+                       index_name=vector_index_name):
+    """
+    Converts vector_store to the given storage and rebuilds the index for it.
+    Converting to halfvec rounds the stored values to float16, which converting back does not undo.
+    Returns False when the table already has that storage.
+    """
+    with conn.cursor() as cursor:
+        require_storage_support(cursor, storage)
+        if current_vector_storage(cursor, table_name, column, index_name) == storage:
+            logger.info("%s already uses %s storage.", table_name, storage)
+            return False
+        type_name, dimensions = vector_column_type(cursor, table_name, column)
+        drop_vector_index(cursor, index_name, table_name, column)
+        column_type = "halfvec" if storage == "halfvec" else "vector"
+        if type_name != column_type:
+            logger.info("Converting %s.%s from %s to %s...", table_name, column, type_name, column_type)
+            cursor.execute(sql.SQL("ALTER TABLE {table} ALTER COLUMN {column} TYPE {type}({dimensions}) USING {column}::{type}({dimensions})").format(
+                table=sql.Identifier(table_name),
+                column=sql.Identifier(column),
+                type=sql.SQL(column_type),
+                dimensions=sql.Literal(dimensions),
+            ))
+    conn.commit()
+    build_vector_index(conn, progress_conn, table_name, column, index_name, storage)
+    return True
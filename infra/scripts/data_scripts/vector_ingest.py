@@ -0,0 +1,208 @@
+"""
+Chunking and embedding ingestion into vector_store.
+
+Documents (product descriptions from the products table, local text and PDF files) are split
+into overlapping chunks, the chunks are embedded in batches on a thread pool, and each embedded
+batch is written with binary COPY while the next batches are still being embedded. Every document gets
+one row per chunk with its chunk number, character offset and page number.
+"""
+import hashlib
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from binary_copy import BinaryCopyWriter
+
+logger = logging.getLogger(__name__)
+
+vector_store_columns = [
+    "id", "title", "chunk", "chunk_id", "offset", "page_number", "content", "source", "metadata", "chunk_hash",
+    "content_vector",
+]
+
+text_extensions = (".txt", ".md")
+pdf_extensions = (".pdf",)
+
+def chunk_text(text, chunk_size=1000, overlap=200):
+    """
+    Yields (offset, chunk) pairs of at most chunk_size characters, each starting `overlap`
+    characters before the end of the previous one. Chunks end at whitespace where possible.
+    """
+    if not 0 <= overlap < chunk_size:
+        raise ValueError("overlap must be at least 0 and smaller than chunk_size")
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            cut = max(text.rfind(" ", start + chunk_size // 2, end), text.rfind("\n", start + chunk_size // 2, end))
+            if cut > start:
+                end = cut
+        content = text[start:end]
+        stripped = content.lstrip()
+        if stripped.strip():
+            yield start + len(content) - len(stripped), stripped.rstrip()
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+
+def product_documents(conn, batch_rows=1000):
+    """
+    Yields one document per product with its description, read with a server-side cursor.
+    """
+    with conn.cursor(name="vector_ingest_products") as cursor:
+        cursor.itersize = batch_rows
+        cursor.execute("""
+            SELECT id, product_name, category, brand, product_description
+            FROM products
+            WHERE product_description IS NOT NULL
+            ORDER BY id
+        """)
+        for product_id, product_name, category, brand, description in cursor:
+            yield {
+                "id": "product-{}".format(product_id),
+                "title": product_name,
+                "source": "products",
+                "metadata": {"product_id": product_id, "category": category, "brand": brand},
+                "pages": [(1, description)],
+            }
+
+def pdf_pages(file_path):
+    """
+    Returns the text of each page of a PDF file. Needs the optional pypdf package.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ValueError("Reading PDF files needs the pypdf package: pip install pypdf")
+    return [page.extract_text() or "" for page in PdfReader(file_path).pages]
+
+def file_documents(file_paths):
+    """
+    Yields one document per text or PDF file. Text files are split into pages at form feeds.
+    """
+    for file_path in file_paths:
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension in pdf_extensions:
+            pages = pdf_pages(file_path)
+        elif extension in text_extensions:
+            with open(file_path, encoding="utf-8") as f:
+                pages = f.read().split("\f")
+        else:
+            raise ValueError("Unsupported file type '{}' for {}".format(extension, file_path))
+        path = os.path.normpath(file_path)
+        yield {
+            "id": "file-{}".format(path),
+            "title": os.path.basename(path),
+            "source": path,
+            "metadata": {"path": path, "pages": len(pages)},
+            "pages": list(enumerate(pages, start=1)),
+        }
+
+def document_chunks(documents, chunk_size=1000, overlap=200):
+    """
+    Yields one vector_store row, without the vector, per chunk of each document.
+    Chunks are numbered across the pages of a document; chunk_hash covers all the other columns.
+    """
+    for document in documents:
+        metadata = json.dumps(document["metadata"])
+        chunk = 0
+        for page_number, text in document["pages"]:
+            for offset, content in chunk_text(text or "", chunk_size, overlap):
+                row = (
+                    document["id"], document["title"], chunk, "{}-{}".format(document["id"], chunk),
+                    offset, page_number, content, document["source"], metadata,
+                )
+                yield row + (hashlib.sha256(json.dumps(row).encode("utf-8")).hexdigest(),)
+                chunk += 1
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def stored_chunk_hashes(cursor, document_ids):
+    """
+    Returns {chunk_id: chunk_hash} for the rows stored for the given documents.
+    """
+    cursor.execute("SELECT chunk_id, chunk_hash FROM vector_store WHERE id = ANY(%s)", (document_ids,))
+    return dict(cursor.fetchall())
+
+def delete_chunks(cursor, document_ids, chunk_ids):
+    """
+    Deletes stored chunks of the given documents. Only id is indexed (vector_store_id_idx), so the
+    rows are found by their document and then filtered by chunk_id.
+    """
+    cursor.execute("DELETE FROM vector_store WHERE id = ANY(%s) AND chunk_id = ANY(%s)",
+                   (list(document_ids), list(chunk_ids)))
+
+def ingest_documents(conn, documents, embedder, batch_size=64, workers=4, chunk_size=1000, overlap=200, replace=True):
+    """
+    Chunks, embeds and writes the documents in one transaction and returns the number of chunks written.
+    Up to 2 * workers batches are embedded ahead of the batch being written. With replace=True the
+    stored rows of each document are brought up to date: chunks with an unchanged chunk_hash are
+    neither embedded nor written, changed chunks are rewritten and chunks that are gone are deleted.
+    With replace=False every chunk is appended.
+    """
+    content_position = vector_store_columns.index("content")
+    hash_position = vector_store_columns.index("chunk_hash")
+    document_ids = set()
+    stored = {}
+    unchanged = 0
+    pending = deque()
+    try:
+        with conn.cursor() as cursor, ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            # Vectors go to the server as raw float32 bytes, not as text
+            writer = BinaryCopyWriter(cursor, "vector_store", vector_store_columns)
+
+            def write_oldest_batch():
+                rows, replaced_chunk_ids, future = pending.popleft()
+                vectors = future.result()
+                if replaced_chunk_ids:
+                    delete_chunks(cursor, set(row[0] for row in rows), replaced_chunk_ids)
+                writer.write([row + (vector,) for row, vector in zip(rows, vectors)])
+                logger.debug("%d chunks written to vector_store", writer.rows)
+
+            try:
+                for rows in batched(document_chunks(documents, chunk_size, overlap), batch_size):
+                    new_ids = list(set(row[0] for row in rows) - document_ids)
+                    document_ids.update(new_ids)
+                    replaced_chunk_ids = []
+                    if replace:
+                        if new_ids:
+                            stored.update(stored_chunk_hashes(cursor, new_ids))
+                        changed_rows = []
+                        for row in rows:
+                            if row[3] in stored:
+                                if stored.pop(row[3]) == row[hash_position]:
+                                    unchanged += 1
+                                    continue
+                                replaced_chunk_ids.append(row[3])
+                            changed_rows.append(row)
+                        rows = changed_rows
+                    if not rows:
+                        continue
+                    future = executor.submit(embedder.embed, [row[content_position] for row in rows])
+                    pending.append((rows, replaced_chunk_ids, future))
+                    if len(pending) >= 2 * max(workers, 1):
+                        write_oldest_batch()
+                while pending:
+                    write_oldest_batch()
+            finally:
+                for _, _, future in pending:
+                    future.cancel()
+
+            # What is left of the stored chunks no longer exists in the documents
+            if stored:
+                delete_chunks(cursor, document_ids, stored)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info("Ingested %d documents into vector_store: %d chunks written, %d unchanged, %d deleted.",
+                len(document_ids), writer.rows, unchanged, len(stored))
+    return writer.rows
@@ -0,0 +1,226 @@
+"""
+Storage modes for vector_store embeddings and the matching search queries.
+
+- "vector": float32 values and an HNSW index with vector_cosine_ops (4 bytes per dimension).
+- "halfvec": the column is stored as halfvec, float16 values (2 bytes per dimension), and the
+  index uses halfvec_cosine_ops, which halves both the table and the index.
+- "binary": the float32 column stays for re-ranking, but the HNSW index is built over
+  binary_quantize(content_vector)::bit(n) with bit_hamming_ops (1 bit per dimension). Searches
+  fetch rerank_factor * k candidates by Hamming distance and re-rank them by exact cosine distance.
+
+halfvec and binary need pgvector 0.7.0 or later. compare_storage_modes() measures the size and
+recall of every mode on a copy of the stored vectors.
+"""
+import logging
+import time
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+vector_storage_modes = ("vector", "halfvec", "binary")
+
+def pgvector_version(cursor):
+    cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError("The vector extension is not installed")
+    return tuple(int(part) for part in row[0].split(".")[:3])
+
+def quantization_supported(cursor):
+    return pgvector_version(cursor) >= (0, 7, 0)
+
+def require_storage_support(cursor, storage):
+    if storage not in vector_storage_modes:
+        raise ValueError("Unknown vector storage '{}', expected one of {}".format(storage, vector_storage_modes))
+    if storage != "vector" and not quantization_supported(cursor):
+        raise ValueError("{} storage needs pgvector 0.7.0 or later, the database has {}".format(
+            storage, ".".join(map(str, pgvector_version(cursor)))))
+
+def vector_column_type(cursor, table_name, column):
+    """
+    Returns the type name (vector or halfvec) and the dimensions of a vector column.
+    """
+    cursor.execute("""
+        SELECT t.typname, a.atttypmod
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = %s::regclass AND a.attname = %s AND NOT a.attisdropped
+    """, (table_name, column))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError("Column {} not found in {}".format(column, table_name))
+    return row
+
+def current_vector_storage(cursor, table_name, column, index_name):
+    """
+    Storage mode of a vector column, from its type and, for binary quantization, its index.
+    Returns None when that cannot be told (a float32 column without index).
+    """
+    type_name, _ = vector_column_type(cursor, table_name, column)
+    if type_name == "halfvec":
+        return "halfvec"
+    cursor.execute("SELECT pg_get_indexdef(to_regclass(%s))", (index_name,))
+    definition = cursor.fetchone()[0]
+    if definition is None:
+        return None
+    return "binary" if "binary_quantize" in definition else "vector"
+
+def index_target(storage, column, dimensions):
+    """
+    Indexed column or expression with its operator class, for CREATE INDEX ... USING hnsw (...).
+    """
+    if storage == "vector":
+        return sql.SQL("{} vector_cosine_ops").format(sql.Identifier(column))
+    if storage == "halfvec":
+        return sql.SQL("{} halfvec_cosine_ops").format(sql.Identifier(column))
+    if storage == "binary":
+        return sql.SQL("(binary_quantize({})::bit({})) bit_hamming_ops").format(sql.Identifier(column), sql.Literal(dimensions))
+    raise ValueError("Unknown vector storage '{}', expected one of {}".format(storage, vector_storage_modes))
+
+def vector_text(vector):
+    """
+    Text form of a query vector, accepted as vector and halfvec input.
+    """
+    return "[{}]".format(",".join("%.9g" % value for value in vector))
+
+def nearest_query(storage, table_name="vector_store", column="content_vector", key="chunk_id", dimensions=1536, where=None):
+    """
+    Query for (key, cosine distance) of the %(limit)s rows nearest to the %(query)s vector, nearest first.
+    For binary storage, %(candidates)s rows are fetched through the Hamming index and re-ranked by
+    exact cosine distance on the float32 column. key is a column name or an SQL expression;
+    where an optional SQL condition applied during the index scan.
+    """
+    table = sql.Identifier(table_name)
+    column_sql = sql.Identifier(column)
+    key_sql = sql.Identifier(key) if isinstance(key, str) else key
+    where_sql = sql.SQL("WHERE {}").format(where) if where is not None else sql.SQL("")
+
+    if storage == "binary":
+        return sql.SQL("""
+            SELECT key, distance FROM (
+                SELECT key, {column} <=> %(query)s::vector AS distance
+                FROM (
+                    SELECT {key} AS key, {column}
+                    FROM {table}
+                    {where}
+                    ORDER BY binary_quantize({column})::bit({dimensions}) <~> binary_quantize(%(query)s::vector)
+                    LIMIT %(candidates)s
+                ) candidates
+            ) ranked
+            ORDER BY distance
+            LIMIT %(limit)s
+        """).format(key=key_sql, column=column_sql, table=table, where=where_sql, dimensions=sql.Literal(dimensions))
+    if storage in ("vector", "halfvec"):
+        return sql.SQL("""
+            SELECT {key} AS key, {column} <=> %(query)s::{type}({dimensions}) AS distance
+            FROM {table}
+            {where}
+            ORDER BY distance
+            LIMIT %(limit)s
+        """).format(key=key_sql, column=column_sql, table=table, where=where_sql, type=sql.SQL(storage), dimensions=sql.Literal(dimensions))
+    raise ValueError("Unknown vector storage '{}', expected one of {}".format(storage, vector_storage_modes))
+
+def set_candidate_count(cursor, candidates):
+    """
+    An HNSW index scan returns at most hnsw.ef_search rows; raises it for this transaction if needed.
+    """
+    cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(min(max(candidates, 40), 1000)),))
+
+def search(cursor, query_vector, k=10, storage="vector", rerank_factor=4, table_name="vector_store",
+           column="content_vector", key_column="chunk_id", dimensions=1536):
+    """
+    Returns the k nearest (key, cosine distance) pairs for the query vector, nearest first.
+    Binary storage retrieves rerank_factor * k candidates through the Hamming index and
+    re-ranks them by exact cosine distance on the float32 column.
+    """
+    query_text = query_vector if isinstance(query_vector, str) else vector_text(query_vector)
+    if storage == "binary":
+        set_candidate_count(cursor, k * rerank_factor)
+    cursor.execute(nearest_query(storage, table_name, column, key_column, dimensions),
+                   {"query": query_text, "limit": k, "candidates": k * rerank_factor})
+    return cursor.fetchall()
+
+def compare_storage_modes(conn, sample_queries=100, k=10, rerank_factor=4, table_name="vector_store",
+                          column="content_vector", m=16, ef_construction=64):
+    """
+    Builds each storage mode's HNSW index on an unlogged copy of the stored vectors and measures
+    bytes per vector, index size, recall@k against exact float32 search and query time, using
+    sample_queries stored vectors as queries. Returns one dict per mode; the copy is dropped afterwards.
+    """
+    scratch = "{}_storage_eval".format(table_name)
+    results = []
+    with conn.cursor() as cursor:
+        type_name, dimensions = vector_column_type(cursor, table_name, column)
+        if type_name == "halfvec":
+            logger.warning("%s.%s is stored as halfvec; recall is measured against its float16 values.", table_name, column)
+        modes = list(vector_storage_modes) if quantization_supported(cursor) else ["vector"]
+        if len(modes) == 1:
+            logger.warning("pgvector %s has no halfvec or binary quantization (0.7.0+); only the vector mode is measured.",
+                           ".".join(map(str, pgvector_version(cursor))))
+
+        cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(scratch)))
+        cursor.execute(sql.SQL(
+            "CREATE UNLOGGED TABLE {} AS SELECT row_number() OVER () AS key, {}::vector({}) AS v FROM {} WHERE {} IS NOT NULL"
+        ).format(sql.Identifier(scratch), sql.Identifier(column), sql.Literal(dimensions),
+                 sql.Identifier(table_name), sql.Identifier(column)))
+        if "halfvec" in modes:
+            cursor.execute(sql.SQL("ALTER TABLE {} ADD COLUMN h halfvec({})").format(sql.Identifier(scratch), sql.Literal(dimensions)))
+            cursor.execute(sql.SQL("UPDATE {} SET h = v::halfvec").format(sql.Identifier(scratch)))
+        cursor.execute(sql.SQL("SELECT key, v::text FROM {} ORDER BY random() LIMIT %s").format(sql.Identifier(scratch)),
+                       (sample_queries,))
+        queries = cursor.fetchall()
+        conn.commit()
+
+        try:
+            # Exact neighbours by a sequential scan over the float32 values, without the query itself
+            cursor.execute("SET enable_indexscan = off")
+            exact = {}
+            for query_key, query_text in queries:
+                cursor.execute(sql.SQL("SELECT key FROM {} WHERE key <> %s ORDER BY v <=> %s::vector LIMIT %s").format(
+                    sql.Identifier(scratch)), (query_key, query_text, k))
+                exact[query_key] = set(row[0] for row in cursor.fetchall())
+            cursor.execute("RESET enable_indexscan")
+            conn.commit()
+
+            for storage in modes:
+                stored_column = "h" if storage == "halfvec" else "v"
+                index_name = "{}_{}_idx".format(scratch, storage)
+                cursor.execute(sql.SQL("CREATE INDEX {} ON {} USING hnsw ({}) WITH (m = {}, ef_construction = {})").format(
+                    sql.Identifier(index_name), sql.Identifier(scratch), index_target(storage, stored_column, dimensions),
+                    sql.Literal(m), sql.Literal(ef_construction)))
+                stored_value = {
+                    "vector": "v",
+                    "halfvec": "h",
+                    "binary": "binary_quantize(v)::bit({})".format(dimensions),
+                }[storage]
+                cursor.execute(sql.SQL("SELECT avg(pg_column_size({})), pg_relation_size(%s) FROM {}").format(
+                    sql.SQL(stored_value), sql.Identifier(scratch)), (index_name,))
+                bytes_per_vector, index_bytes = cursor.fetchone()
+                conn.commit()
+
+                hits = 0
+                started = time.perf_counter()
+                for query_key, query_text in queries:
+                    # k + 1 results, since the query vector itself is stored too
+                    neighbours = search(cursor, query_text, k + 1, storage, rerank_factor, scratch, stored_column, "key", dimensions)
+                    hits += len(set(key for key, _ in neighbours if key != query_key) & exact[query_key])
+                    conn.commit()
+                elapsed = time.perf_counter() - started
+
+                cursor.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier(index_name)))
+                conn.commit()
+                results.append({
+                    "storage": storage,
+                    "bytes_per_vector": float(bytes_per_vector or 0),
+                    "index_bytes": index_bytes,
+                    "recall": hits / float(max(len(queries) * k, 1)),
+                    "ms_per_query": 1000.0 * elapsed / max(len(queries), 1),
+                })
+                logger.info("%s: %.0f bytes per vector, index %.1f MB, recall@%d %.3f, %.2f ms per query.",
+                            storage, results[-1]["bytes_per_vector"], index_bytes / 1048576.0, k,
+                            results[-1]["recall"], results[-1]["ms_per_query"])
+        finally:
+            conn.rollback()
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(scratch)))
+            conn.commit()
+    return results
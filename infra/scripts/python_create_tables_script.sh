@@ -18,6 +18,14 @@ publicIp=$(curl -s https://api.ipify.org)
 az postgres flexible-server firewall-rule create --resource-group $resourceGroup --name $postgres_server_name --rule-name "AllowScriptIp" --start-ip-address "$publicIp" --end-ip-address "$publicIp"
 
 curl --output "create_psql_tables.py" ${baseUrl}"infra/scripts/data_scripts/create_psql_tables.py"
+curl --output "schema_migrations.py" ${baseUrl}"infra/scripts/data_scripts/schema_migrations.py"
+curl --output "schema_indexes.py" ${baseUrl}"infra/scripts/data_scripts/schema_indexes.py"
+curl --output "date_partitions.py" ${baseUrl}"infra/scripts/data_scripts/date_partitions.py"
+curl --output "connection_factory.py" ${baseUrl}"infra/scripts/data_scripts/connection_factory.py"
+curl --output "key_vault_config.py" ${baseUrl}"infra/scripts/data_scripts/key_vault_config.py"
+curl --output "statement_batch.py" ${baseUrl}"infra/scripts/data_scripts/statement_batch.py"
+curl --output "orders_storage.py" ${baseUrl}"infra/scripts/data_scripts/orders_storage.py"
+curl --output "sales_rollups.py" ${baseUrl}"infra/scripts/data_scripts/sales_rollups.py"
 
 # Download the requirement file
 curl --output "$requirementFile" "$requirementFileUrl"